@@ -0,0 +1,79 @@
+#!/bin/env python3
+"""
+Benchmarks the model on a generated tree of types, alts and targets, using
+the in-memory filesystem backend (or the real filesystem with --os), and
+counts the filesystem operations of each step using RecordingBackend.
+The save step saves the unchanged, freshly loaded tree, and should show
+no operations at all.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_fs.py [--types N] [--alts N] [--targets N] [--os]
+"""
+
+import sys
+import time
+import tempfile
+import argparse
+from pathlib import Path
+
+from confs.confslib import Config
+from confs.fs import OSBackend, MemoryBackend, RecordingBackend
+from confs.session import Session
+
+def build_tree(session, home, num_types, num_alts, num_targets):
+    fs = session.fs
+    for t in range(num_types):
+        for a in range(num_alts):
+            identifier = 'type{}/alt{}'.format(t, a)
+            session.create(identifier)
+            for n in range(num_targets):
+                session.add(identifier, 'target{}'.format(n), Path(home, 'type{}'.format(t), 'target{}'.format(n)),
+                            is_file=True)
+        fs.mkdir(Path(home, 'type{}'.format(t)), exist_ok=True)
+
+def step(name, recorder, func):
+    recorder.reset()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print('{:<10} {:>9.1f} ms {:>8} ops {:>7} writes'.format(name, elapsed * 1000, len(recorder.ops), recorder.writes))
+    top = ', '.join('{} {}'.format(op, n) for op, n in recorder.counts.most_common(5))
+    print('{:<10} {}'.format('', top))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--types', type=int, default=200)
+    parser.add_argument('--alts', type=int, default=3)
+    parser.add_argument('--targets', type=int, default=5)
+    parser.add_argument('--os', action='store_true', help='Use the real filesystem (in a temporary directory)')
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory() if args.os else None
+    root = Path(tmp.name) if tmp else Path('/bench')
+    backend = OSBackend() if args.os else MemoryBackend()
+    recorder = RecordingBackend(backend)
+    confs_path, home = Path(root, 'confs'), Path(root, 'home')
+    backend.mkdir(confs_path, parents=True)
+    backend.mkdir(home, parents=True)
+
+    config = Config(confs_path=confs_path, fs=recorder)
+    print('{} backend, {} types x {} alts x {} targets'.format(
+        backend.name, args.types, args.alts, args.targets))
+
+    session = Session(config=config, hooks=False)
+    identifiers = ['type{}/alt1'.format(t) for t in range(args.types)]
+    step('create', recorder, lambda: build_tree(session, home, args.types, args.alts, args.targets))
+    step('load', recorder, lambda: Session(config=config, hooks=False).load())
+    loaded = Session(config=config, hooks=False).load()
+    # Nothing changed, so saving must not touch the filesystem at all
+    step('save', recorder, lambda: [conf.save() for conf in loaded])
+    step('enable', recorder, lambda: [session.enable('type{}/alt2'.format(t)) for t in range(args.types)])
+    step('install', recorder, lambda: [session.install(i) for i in identifiers])
+    step('show', recorder, lambda: session.show())
+    step('uninstall', recorder, lambda: [session.uninstall('type{}'.format(t)) for t in range(args.types)])
+
+    if tmp:
+        tmp.cleanup()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/bin/env python3
+"""
+Benchmarks `confs grep` on a generated tree of small text files: the
+first search (building the trigram index), a search with the index up
+to date, and a search after changing a single file, compared to reading
+and matching every file as a scan without the index would.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_grep.py [--alts N] [--files N] [--lines N] [--runs N]
+"""
+
+import os
+import re
+import time
+import random
+import tempfile
+import argparse
+
+from confs.confslib import Config
+from confs import search
+
+WORDS = 5000
+PATTERN = 'needle_in_a_haystack'
+
+def build_tree(root, num_alts, num_files, num_lines):
+    rand = random.Random(0)
+    words = [''.join(rand.choice('abcdefghijklmnopqrstuvwxyz_') for _ in range(rand.randint(3, 9)))
+             for _ in range(WORDS)]
+    paths = []
+    for a in range(num_alts):
+        alt = os.path.join(root, 'type{}'.format(a // 4), 'alt{}'.format(a % 4))
+        os.makedirs(os.path.join(alt, 'targets'))
+        for f in range(num_files):
+            path = os.path.join(alt, 'target{}'.format(f % 3), 'file{}'.format(f))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as fh:
+                for _ in range(num_lines):
+                    fh.write(' '.join(rand.choice(words) for _ in range(6)) + '\n')
+            paths.append(path)
+    for t in range((num_alts + 3) // 4):
+        os.symlink('alt0', os.path.join(root, 'type{}'.format(t), 'enabled'))
+    return paths
+
+def scan(paths, pattern):
+    """Returns the number of matching lines, reading every file."""
+    regex = re.compile(pattern)
+    count = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            count += sum(1 for line in f.read().decode().splitlines() if regex.search(line))
+    return count
+
+def timed(func, runs):
+    """Returns (result, minimum wall time of func in ms)."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--alts', type=int, default=200)
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--lines', type=int, default=40)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_tree(tmp, args.alts, args.files, args.lines)
+        with open(paths[len(paths) // 2], 'a') as f:
+            f.write(PATTERN + '\n')
+        size = sum(os.path.getsize(path) for path in paths)
+        config = Config(confs_path=tmp)
+
+        def grep():
+            err, matches = search.search(config, PATTERN)
+            assert not err, err
+            return len(matches)
+
+        print('{} files, {:.1f} MiB, min of {} runs'.format(len(paths), size / 1024 / 1024, args.runs))
+        found, elapsed = timed(grep, 1)
+        print('{:<24} {:>8.1f} ms  {} matches'.format('first search', elapsed, found))
+        found, elapsed = timed(grep, args.runs)
+        print('{:<24} {:>8.1f} ms  {} matches'.format('indexed search', elapsed, found))
+
+        def changed():
+            with open(paths[0], 'a') as f:
+                f.write('changed\n')
+            return grep()
+        found, elapsed = timed(changed, args.runs)
+        print('{:<24} {:>8.1f} ms  {} matches'.format('one file changed', elapsed, found))
+        found, elapsed = timed(lambda: scan(paths, PATTERN), args.runs)
+        print('{:<24} {:>8.1f} ms  {} matches'.format('scan of every file', elapsed, found))
+        print('{:<24} {:>8.1f} KiB'.format('index size', os.path.getsize(search.index_path(config)) / 1024))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/bin/env python3
+"""
+Compares the system calls of installing, checking and uninstalling
+symlinked targets by absolute path (the path based code of Target) and
+relative to their opened destination directories (confs.linker), on a
+generated tree whose destinations are spread over a deep ~/.config.
+
+The calls are counted by wrapping the functions of the os module the
+backend ends up in, along with the path components the kernel has to
+look up for them: every component of an absolute path, against a single
+one for a name relative to an opened directory.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_linker.py [--dirs N] [--targets N] [--depth N] [--runs N]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+from pathlib import Path
+from collections import Counter
+
+from confs.confslib import Config
+from confs.linker import Linker
+from confs.session import Session
+
+SYSCALLS = ['stat', 'lstat', 'readlink', 'symlink', 'unlink', 'open', 'close', 'getcwd']
+
+class Counting:
+    """Counts the calls of SYSCALLS, and the path components they look up, while active."""
+    def __init__(self):
+        self.calls = Counter()
+        self.lookups = 0
+        self.originals = {}
+
+    def __enter__(self):
+        for name in SYSCALLS:
+            self.originals[name] = getattr(os, name)
+            setattr(os, name, self.wrap(name, self.originals[name]))
+        return self
+
+    def __exit__(self, *exc):
+        for name, func in self.originals.items():
+            setattr(os, name, func)
+
+    def wrap(self, name, func):
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            if args and isinstance(args[0], (str, os.PathLike)):
+                path = os.fspath(args[0])
+                relative = kwargs.get('dir_fd') is not None or not path.startswith('/')
+                self.lookups += 1 if relative else len([p for p in path.split('/') if p])
+            return func(*args, **kwargs)
+        return counted
+
+def build_tree(root, num_dirs, num_targets, depth):
+    """Returns the config and the alt of a type with num_targets targets in each of num_dirs directories."""
+    confs_path = Path(root, 'confs')
+    confs_path.mkdir()
+    config = Config(confs_path=confs_path)
+    session = Session(config=config, hooks=False)
+    session.create('bench/alt')
+    base = Path(root, 'home', '.config', *['level{}'.format(d) for d in range(depth)])
+    for d in range(num_dirs):
+        dest_dir = Path(base, 'app{}'.format(d))
+        dest_dir.mkdir(parents=True)
+        for n in range(num_targets):
+            session.add('bench/alt', 'app{}-file{}'.format(d, n), Path(dest_dir, 'file{}'.format(n)), is_file=True)
+    session.release()
+    conf = Session(config=config, hooks=False).load('bench')
+    return config, [alt for alt in conf.alts if alt.name == 'alt'][0]
+
+def steps(targets):
+    # Without appending to the change feed, which costs the same either way
+    return [('install', lambda: [t._install() for t in targets]),
+            ('reinstall', lambda: [t._install() for t in targets]),
+            ('check', lambda: [t.is_installed() for t in targets]),
+            ('uninstall', lambda: [t._uninstall() for t in targets])]
+
+def run(config, targets, linked, runs):
+    """
+    Returns ({step: (seconds, Counting)} of the best of runs, (calls, lookups)
+    of opening the directories), with a Linker if linked.
+    """
+    results = {}
+    for _ in range(runs):
+        counting = Counting()
+        with counting:
+            linker = Linker(config, targets) if linked else None
+            opening = sum(counting.calls.values()), counting.lookups
+        config.linker = linker
+        try:
+            for name, func in steps(targets):
+                counting = Counting()
+                with counting:
+                    start = time.perf_counter()
+                    func()
+                    elapsed = time.perf_counter() - start
+                if name not in results or elapsed < results[name][0]:
+                    results[name] = (elapsed, counting)
+        finally:
+            config.linker = None
+            if linker:
+                linker.close()
+    return results, opening
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dirs', type=int, default=50, help='Destination directories')
+    parser.add_argument('--targets', type=int, default=10, help='Targets per destination directory')
+    parser.add_argument('--depth', type=int, default=6, help='Directories between ~/.config and a destination directory')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        config, alt = build_tree(root, args.dirs, args.targets, args.depth)
+        targets = alt.targets
+        print('{} targets in {} directories, {} components deep'.format(
+            len(targets), args.dirs, len(Path(targets[0].target).parts) - 1))
+        paths, _ = run(config, targets, False, args.runs)
+        dirfds, opening = run(config, targets, True, args.runs)
+        print('{:<10} {:>10} {:>9} {:>9}   {:>10} {:>9} {:>9}'.format(
+            '', 'path ms', 'calls', 'lookups', 'dirfd ms', 'calls', 'lookups'))
+        print('{:<10} {:>10} {:>9} {:>9}   {:>10} {:>9} {:>9}'.format('open', '', '', '', '', *opening))
+        for name, _ in steps(targets):
+            (p_time, p), (d_time, d) = paths[name], dirfds[name]
+            print('{:<10} {:>10.1f} {:>9} {:>9}   {:>10.1f} {:>9} {:>9}'.format(
+                name, p_time * 1000, sum(p.calls.values()), p.lookups, d_time * 1000, sum(d.calls.values()), d.lookups))
+            print('{:<10} {:<32} {}'.format('', ', '.join('{} {}'.format(c, n) for c, n in p.calls.most_common(4)),
+                                            ', '.join('{} {}'.format(c, n) for c, n in d.calls.most_common(4))))
+
+if __name__ == '__main__':
+    sys.exit(main())
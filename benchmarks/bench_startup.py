@@ -0,0 +1,95 @@
+#!/bin/env python3
+"""
+Benchmarks the startup of the confs command line: the wall time of a run
+of a few commands on a generated tree (the minimum of several runs, as
+startup times are noisy), compared to a bare python interpreter, and the
+modules costing the most import time (from `python -X importtime`).
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_startup.py [--types N] [--runs N] [--top N]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+import subprocess
+from pathlib import Path
+
+from confs.confslib import Config
+from confs.session import Session
+
+ENTRY = 'from confs.__main__ import main; main()'
+COMMANDS = [
+    ['examples'],
+    ['show', 'type0'],
+    ['show'],
+    ['which', 'type0/alt0'],
+    ['query', '-f', 'identifier', 'type'],
+]
+
+def build_tree(session, home, num_types):
+    for t in range(num_types):
+        for a in range(2):
+            identifier = 'type{}/alt{}'.format(t, a)
+            session.create(identifier)
+            session.add(identifier, 'target', Path(home, 'type{}'.format(t)), is_file=True)
+
+def run(argv, env, runs):
+    """Returns the minimum wall time of argv in ms."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def import_times(argv, env):
+    """Returns (total, [(self us, module)]) of the imports of argv, by their own import time."""
+    proc = subprocess.run(argv[:1] + ['-X', 'importtime'] + argv[1:], env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        modules.append((int(own), name.strip()))
+    return sum(us for us, _ in modules), sorted(modules, reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--types', type=int, default=50)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--top', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        confs_path, home = Path(tmp, 'confs'), Path(tmp, 'home')
+        home.mkdir()
+        config = Config(confs_path=confs_path)
+        config.fs.mkdir(confs_path)
+        session = Session(config)
+        build_tree(session, home, args.types)
+        # The runs would otherwise wait for the locks of the session
+        session.release()
+
+        env = dict(os.environ, HOME=str(home))
+        env['PYTHONPATH'] = os.pathsep.join([str(Path(__file__).absolute().parent.parent / 'src'),
+                                             env.get('PYTHONPATH', '')]).rstrip(os.pathsep)
+        base = [sys.executable, '-c', ENTRY, '--path', str(confs_path)]
+        bare = run([sys.executable, '-c', 'pass'], env, args.runs)
+        print('{} types, min of {} runs'.format(args.types, args.runs))
+        print('{:<28} {:>7.1f} ms'.format('python -c pass', bare))
+        for command in COMMANDS:
+            elapsed = run(base + command, env, args.runs)
+            print('{:<28} {:>7.1f} ms {:>+7.1f} ms'.format(' '.join(command), elapsed, elapsed - bare))
+
+        total, modules = import_times(base + COMMANDS[1], env)
+        print('\nimports of `{}`: {:.1f} ms'.format(' '.join(COMMANDS[1]), total / 1000))
+        for us, name in modules[:args.top]:
+            print('  {:<26} {:>7.1f} ms'.format(name, us / 1000))
+
+if __name__ == '__main__':
+    main()
@@ -13,69 +13,53 @@ Options:
 Commands:
   config (get <key> | set <key> <value> | show)
   add <identifier> <target_name> <target_dest>
+  compile [<identifiers>...]
   create <identifier>
   delete <identifier> NOT IMPLEMENTED
   enable <identifier>
   install <identifier> [<targets>...]
   migrate <identifier> <paths>...
+  mode <identifier> <target_name> [<mode>]
+  pack [-u] <identifiers>... | --older-than <days>
+  parents <identifier> [<parents>...]
+  query [<expression>...]
+  relocate [-r|-a] [--from <old-path>] <new-path>
   show [<identifiers>...]
+  sync <identifier> [<targets>...]
   uninstall <typename> [<targets>...]
+  which <paths>...
+  grep <pattern> [<identifiers>...]
+  exec <identifier> -- <command>...
+  recover [--forward] [<typenames>...]
+  events [--since <seq>] [--follow]
+  hook (bash | zsh | fish)
+  export [<identifiers>...]
+  import [<identifiers>...]
   tree
   examples
+  completion (bash | zsh | fish)
 
 See confs(1) for more details.
 """
 
-from docopt import docopt
-
-from confs.common import fatal, verbose
+import sys
 
 def main():
-    args = docopt(__doc__,
-                  version='confs 0.1',
-                  options_first=True)
-    verbose('global arguments:')
-    verbose(args)
-    verbose('command arguments:')
-
-    argv = [args['<command>']] + args['<args>']
-    verbose(argv)
-
-    cmd = args['<command>']
-    cargs = args['<args>']
+    # Shell completion runs on every keypress, so it is
+    # dispatched before the command table and the model are imported.
+    if len(sys.argv) > 1 and sys.argv[1] == '__complete':
+        from confs.confs_complete import complete_cmd
+        complete_cmd(sys.argv[2:])
+        return
+    # As is the shell integration switching alts by directory, see confs.pins
+    if len(sys.argv) > 1 and sys.argv[1] == '__pin':
+        from confs.confs_hook import pin_cmd
+        pin_cmd(sys.argv[2:])
+        return
 
-    if cmd == 'add':
-        from confs.confs_add import add_cmd
-        add_cmd(cargs)
-    elif cmd == 'config':
-        from confs.confs_config import config_cmd
-        config_cmd(cargs)
-    elif cmd == 'create':
-        from confs.confs_create import create_cmd
-        create_cmd(cargs)
-    elif cmd == 'enable':
-        from confs.confs_enable import enable_cmd
-        enable_cmd(cargs)
-    elif cmd == 'install':
-        from confs.confs_install import install_cmd
-        install_cmd(cargs)
-    elif cmd == 'migrate':
-        from confs.confs_migrate import migrate_cmd
-        migrate_cmd(cargs)
-    elif cmd == 'show':
-        from confs.confs_show import show_cmd
-        show_cmd(cargs)
-    elif cmd == 'tree':
-        from confs.confs_other import tree_cmd
-        tree_cmd(cargs)
-    elif cmd == 'uninstall':
-        from confs.confs_uninstall import uninstall_cmd
-        uninstall_cmd(cargs)
-    elif cmd == 'examples':
-        from confs.confs_other import examples_cmd
-        examples_cmd(cargs)
-    else:
-        fatal('Unknown command `{}`'.format(args['<command>']))
+    # Parsed once, using the command table compiled from the usages
+    from confs import cli
+    cli.dispatch(sys.argv[1:])
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,182 @@
+#!/bin/env python3
+"""
+Compiles alts into a standalone POSIX shell script installing them, for
+machines (eg. CI runners and containers) where installing Python and
+confs just to run `confs install` costs more than the install itself.
+
+The script enables each alt, creates the missing parent directories of
+all destinations using a single `mkdir -p`, and links each target only
+if the destination does not already resolve to its content, so a second
+run does not fork at all. That check uses `[ a -ef b ]`, which the test
+builtin of bash, dash, ksh, zsh and busybox has, but POSIX only requires
+since POSIX.1-2024: without it, the script compares the symlink with the
+output of `ls -ld` instead (forking once per target). Paths inside the
+confs path and the home directory are written relative to $CONFS and
+$HOME, so the script works on a fresh clone of the confs path at another
+location:
+
+    CONFS=~/dotfiles sh bootstrap.sh
+
+Stow targets are laid out as `confs install` would on an empty home
+directory, except that their destinations are always directories, as
+they are usually shared with other applications. Materialized targets
+are copied, only if their destination is missing.
+"""
+
+import os
+import time
+import shlex
+from pathlib import Path
+
+from confs import index
+from confs.confslib import InvOperErr
+from confs.materialize import is_dir
+
+HEADER = '''#!/bin/sh
+# Generated by `confs compile` from {confs_path} on {date}, installs:
+#   {identifiers}
+# Set CONFS to the location of the confs path, if moved.
+CONFS=${{CONFS:-{default}}}
+status=0
+
+if [ / -ef / ] 2>/dev/null; then
+    same() {{ [ "$2" -ef "$1" ]; }}
+else
+    # A test without -ef: POSIX ls -l shows a symlink as `path -> contents`,
+    # matched with $1 quoted on its own, so a * ? or [ in it is literal
+    same() {{
+        [ -L "$2" ] || return 1
+        case "$(ls -ld "$2")" in *' -> '"$1") return 0;; esac
+        return 1
+    }}
+fi
+
+link() {{
+    same "$1" "$2" && return 0
+    if [ -e "$2" ] && [ ! -L "$2" ]; then
+        echo "confs: \\`$2' exists and is not a symlink, skipped" >&2
+        status=1
+        return 0
+    fi
+    ln -sfn "$1" "$2" || status=1
+}}
+
+copy() {{
+    [ -e "$2" ] || [ -L "$2" ] || cp -R "$1" "$2" || status=1
+}}
+
+mkdirs() {{
+    for dir; do
+        [ -d "$dir" ] || {{ mkdir -p "$@" || status=1; return; }}
+    done
+}}
+'''
+
+class Script:
+    """The lines of a bootstrap script, quoting paths relative to $CONFS and $HOME."""
+    def __init__(self, config):
+        self.confs_path = os.path.abspath(str(config.confs_path))
+        self.home = os.path.expanduser('~')
+        self.dirs = []       # The parent directories to create, in order
+        self.enables = []    # The lines enabling the alts
+        self.lines = []      # The lines installing the targets
+
+    def quote(self, path) -> str:
+        path = os.path.abspath(str(path))
+        for var, root in (('$CONFS', self.confs_path), ('$HOME', self.home)):
+            if path == root:
+                return '"{}"'.format(var)
+            if path.startswith(root + os.sep):
+                return '"{}"{}'.format(var, shlex.quote(path[len(root):]))
+        return shlex.quote(path)
+
+    def mkdir(self, path):
+        path = os.path.abspath(str(path))
+        if path not in self.dirs and path != self.home:
+            self.dirs.append(path)
+
+    def link(self, src, dst):
+        self.mkdir(os.path.dirname(os.path.abspath(str(dst))))
+        self.lines.append('link {} {}'.format(self.quote(src), self.quote(dst)))
+
+    def copy(self, src, dst):
+        self.mkdir(os.path.dirname(os.path.abspath(str(dst))))
+        self.lines.append('copy {} {}'.format(self.quote(src), self.quote(dst)))
+
+    def render(self, identifiers) -> str:
+        out = [HEADER.format(confs_path=self.confs_path, date=time.strftime('%Y-%m-%d %H:%M:%S'),
+                             identifiers=' '.join(identifiers), default=shlex.quote(self.confs_path))]
+        out += self.enables
+        # Only the deepest directories, as `mkdir -p` creates their parents
+        dirs = [d for d in self.dirs if not any(o.startswith(d + os.sep) for o in self.dirs)]
+        if dirs:
+            out.append('mkdirs {}'.format(' '.join(self.quote(d) for d in dirs)))
+        out += self.lines
+        out.append('exit $status')
+        return '\n'.join(out) + '\n'
+
+def stow_layout(fs, dst: str, sources, stowed, script, top=False):
+    """
+    Adds the links merging sources (content paths) and the stow targets
+    of stowed (destination -> content paths) at dst into script, as one
+    link if only a single source has dst (unless top), else a directory.
+    Returns an error if a file is in more than one source.
+    """
+    sources = sources + stowed.get(dst, [])
+    nested = [d for d in stowed if d.startswith(dst + os.sep)]
+    if len(sources) == 1 and not nested and not (top and is_dir(fs, sources[0])):
+        script.link(sources[0], dst)
+        return None
+    if not all(is_dir(fs, src) for src in sources):
+        return InvOperErr('Stow targets `{}` conflict at `{}`'.format('`, `'.join(map(str, sources)), dst))
+    script.mkdir(dst)
+    children = {name: [] for name in set(d[len(dst) + 1:].split(os.sep)[0] for d in nested)}
+    for src in sources:
+        for name in fs.listdir(src):
+            children.setdefault(name, []).append(Path(src, name))
+    for name, child_sources in sorted(children.items()):
+        err = stow_layout(fs, os.path.join(dst, name), child_sources, stowed, script)
+        if err:
+            return err
+    return None
+
+def compile_script(session, identifiers):
+    """
+    Returns (err, script) installing the alts of identifiers (the enabled
+    alt for a typename), or of all types if identifiers is empty.
+    """
+    config = session.config
+    fs = config.fs
+    if not identifiers:
+        identifiers = [conf.name for conf in session.load() if conf.enabled_alt]
+    script = Script(config)
+    stowed = {} # Destination -> content paths of stow targets
+    for identifier in identifiers:
+        conf, alt = session.get(identifier, alt_optional=True)
+        if not alt:
+            if not conf.enabled_alt:
+                return InvOperErr('Conf type `{}` has no enabled alt!'.format(conf.name)), None
+            alt = conf.enabled_alt
+        enabled_path = Path(conf.path, config.enabled_link_name)
+        script.enables.append('link {} {}'.format(script.quote(Path(alt.path).absolute()),
+                                                  script.quote(Path(enabled_path).absolute())))
+        for target in sorted(alt.targets, key=lambda t: t.name):
+            content_path = target.content_path().absolute()
+            if target.mode == 'secret':
+                # The key never ends up in a script, install the secrets with confs
+                return InvOperErr('Target `{}` of `{}/{}` is a secret, it cannot be bootstrapped'.format(
+                    target.name, conf.name, alt.name)), None
+            elif target.mode == 'stow':
+                stowed.setdefault(index.normpath(target.target), []).append(content_path)
+            elif target.is_materialized():
+                script.copy(content_path, target.target)
+            else:
+                script.link(content_path, target.target)
+
+    # Stow targets inside the destination of another are merged into it
+    for dst in sorted(stowed):
+        if not any(dst.startswith(other + os.sep) for other in stowed):
+            err = stow_layout(fs, dst, [], stowed, script, top=True)
+            if err:
+                return err, None
+    return None, script.render(identifiers)
@@ -0,0 +1,294 @@
+#!/bin/env python3
+"""
+Single pass argument parsing from a precompiled command table.
+
+The usage of each command is still documented (and defined) by the
+docopt usage in the docstring of its module or function, but instead
+of parsing the usages with docopt on every run (once for the command
+and once more by the command itself), the usages are compiled ahead of
+time into the command table in confs.commands: the options and the
+docopt pattern of each command, as plain tuples. At run time the
+arguments are matched against the pattern of the command, without
+importing docopt or the modules of other commands, yielding the same
+dict of arguments docopt would.
+
+Anything the table cannot handle (--help, --version, invalid or
+unknown arguments) falls back to docopt itself, which prints the usage
+or the error as before.
+
+After changing the usage of a command, regenerate the table with:
+
+    PYTHONPATH=src python -m confs.cli [--check]
+"""
+
+import sys
+
+MAIN = '__main__' # The entry of the main usage (the global options) in the command table
+
+def parse_argv(argv, options, options_first=False):
+    """
+    Splits argv into (positionals, options) as docopt would, where options
+    is a list of (name, value). Returns None for unknown or invalid options.
+    """
+    pos = []
+    opts = []
+    i = 0
+    while i < len(argv):
+        token = argv[i]
+        if token == '--':
+            # Kept, as usages may require it
+            pos.extend(argv[i:])
+            break
+        if token.startswith('--'):
+            name, eq, value = token.partition('=')
+            matches = [o for o in options if o[1] == name] or \
+                      [o for o in options if o[1] and o[1].startswith(name)]
+            if len(matches) != 1:
+                return None
+            short, long, argcount, _ = matches[0]
+            if argcount:
+                if not eq:
+                    i += 1
+                    if i >= len(argv) or argv[i] == '--':
+                        return None
+                    value = argv[i]
+                opts.append((long, value))
+            elif eq:
+                return None
+            else:
+                opts.append((long, True))
+        elif token.startswith('-') and token != '-':
+            rest = token[1:]
+            while rest:
+                matches = [o for o in options if o[0] == '-' + rest[0]]
+                rest = rest[1:]
+                if len(matches) != 1:
+                    return None
+                short, long, argcount, _ = matches[0]
+                if argcount:
+                    if not rest:
+                        i += 1
+                        if i >= len(argv) or argv[i] == '--':
+                            return None
+                        rest = argv[i]
+                    opts.append((long or short, rest))
+                    rest = ''
+                else:
+                    opts.append((long or short, True))
+        elif options_first:
+            pos.extend(argv[i:])
+            break
+        else:
+            pos.append(token)
+        i += 1
+    return pos, opts
+
+def _collect(collected, name, default, value):
+    """Returns collected with value added as docopt does: counted, appended or set."""
+    if type(default) is int:
+        value = 1
+    elif type(default) is list:
+        value = [value] if isinstance(value, str) else value
+    else:
+        return collected + ((name, value),)
+    for i, (n, v) in enumerate(collected):
+        if n == name:
+            return collected[:i] + ((name, v + value),) + collected[i + 1:]
+    return collected + ((name, value),)
+
+def match(node, pos, opts, collected):
+    """
+    Matches the pattern node against the positionals pos and options opts,
+    returning (matched, pos, opts, collected) with what is left, like docopt.
+    """
+    kind = node[0]
+    if kind == 'argument' or kind == 'command':
+        if not pos or (kind == 'command' and pos[0] != node[1]):
+            return False, pos, opts, collected
+        value = True if kind == 'command' else pos[0]
+        return True, pos[1:], opts, _collect(collected, node[1], node[2], value)
+    if kind == 'option':
+        for i, (name, value) in enumerate(opts):
+            if name == node[1]:
+                return True, pos, opts[:i] + opts[i + 1:], _collect(collected, node[1], node[2], value)
+        return False, pos, opts, collected
+
+    children = node[1]
+    if kind == 'required':
+        state = (pos, opts, collected)
+        for child in children:
+            matched, *state = match(child, *state)
+            if not matched:
+                return False, pos, opts, collected
+        return (True,) + tuple(state)
+    if kind == 'optional' or kind == 'options':
+        state = (pos, opts, collected)
+        for child in children:
+            _, *state = match(child, *state)
+        return (True,) + tuple(state)
+    if kind == 'more':
+        state = (pos, opts, collected)
+        times = 0
+        while True:
+            matched, *next_state = match(children[0], *state)
+            if not matched or next_state[:2] == list(state[:2]):
+                break
+            state = tuple(next_state)
+            times += 1
+        if not times:
+            return False, pos, opts, collected
+        return (True,) + tuple(state)
+    if kind == 'either':
+        outcomes = [outcome for outcome in (match(child, pos, opts, collected) for child in children) if outcome[0]]
+        if not outcomes:
+            return False, pos, opts, collected
+        return min(outcomes, key=lambda o: len(o[1]) + len(o[2]))
+    raise ValueError('Invalid pattern node `{}`'.format(kind))
+
+def leaves(node):
+    if node[0] in ('argument', 'command', 'option'):
+        yield node
+    else:
+        for child in node[1]:
+            yield from leaves(child)
+
+def parse(entry, argv):
+    """Returns the dict of arguments of argv for the command table entry, or None if they do not match."""
+    options, pattern, options_first = entry[2], entry[3], entry[4]
+    parsed = parse_argv(argv, options, options_first=options_first)
+    if parsed is None:
+        return None
+    pos, opts = parsed
+    matched, pos, opts, collected = match(pattern, tuple(pos), tuple(opts), ())
+    if not matched or pos or opts:
+        return None
+    args = {}
+    for leaf in leaves(pattern):
+        default = leaf[2]
+        args[leaf[1]] = list(default) if type(default) is list else default
+    args.update(collected)
+    return args
+
+def usage(module, func):
+    """Returns the docopt usage of the command func of module."""
+    doc = getattr(module, func).__doc__
+    return doc if doc and 'usage:' in doc.lower() else module.__doc__
+
+def dispatch(argv):
+    """Parses argv and runs the command, falling back to docopt where the table does not apply."""
+    from confs.commands import COMMANDS
+    main = COMMANDS[MAIN]
+    parsed = parse_argv(argv, main[2], options_first=True)
+    command = parsed[0][0] if parsed and parsed[0] else None
+    if command is None:
+        # Prints the help, version or usage
+        from docopt import docopt
+        import confs.__main__
+        docopt(confs.__main__.__doc__, argv, version='confs 0.1', options_first=True)
+        return
+    if command not in COMMANDS or command == MAIN:
+        from confs.common import fatal
+        fatal('Unknown command `{}`'.format(command))
+
+    entry = COMMANDS[command]
+    module = __import__(entry[0], fromlist=[entry[1]])
+    args = parse(entry, argv)
+    if args is None:
+        from docopt import docopt
+        args = docopt(usage(module, entry[1]), argv, options_first=entry[4])
+    getattr(module, entry[1])(args)
+
+# Generation of the command table
+
+GENERATED_HEADER = '''#!/bin/env python3
+"""
+The command table, compiled from the docopt usages of the commands by
+confs.cli. Generated, do not edit: run `PYTHONPATH=src python -m confs.cli`.
+"""
+
+# Command -> (module, function, options as (short, long, argcount, default), pattern, options_first)
+'''
+
+# Command -> (module, function)
+SOURCES = {
+    MAIN:         ('confs.__main__', 'main'),
+    'add':        ('confs.confs_add', 'add_cmd'),
+    'compile':    ('confs.confs_compile', 'compile_cmd'),
+    'completion': ('confs.confs_complete', 'completion_cmd'),
+    'config':     ('confs.confs_config', 'config_cmd'),
+    'create':     ('confs.confs_create', 'create_cmd'),
+    'enable':     ('confs.confs_enable', 'enable_cmd'),
+    'events':     ('confs.confs_events', 'events_cmd'),
+    'examples':   ('confs.confs_other', 'examples_cmd'),
+    'exec':       ('confs.confs_exec', 'exec_cmd'),
+    'export':     ('confs.confs_export', 'export_cmd'),
+    'grep':       ('confs.confs_grep', 'grep_cmd'),
+    'hook':       ('confs.confs_hook', 'hook_cmd'),
+    'import':     ('confs.confs_import', 'import_cmd'),
+    'install':    ('confs.confs_install', 'install_cmd'),
+    'migrate':    ('confs.confs_migrate', 'migrate_cmd'),
+    'mode':       ('confs.confs_mode', 'mode_cmd'),
+    'pack':       ('confs.confs_pack', 'pack_cmd'),
+    'parents':    ('confs.confs_parents', 'parents_cmd'),
+    'query':      ('confs.confs_query', 'query_cmd'),
+    'recover':    ('confs.confs_recover', 'recover_cmd'),
+    'relocate':   ('confs.confs_relocate', 'relocate_cmd'),
+    'show':       ('confs.confs_show', 'show_cmd'),
+    'sync':       ('confs.confs_sync', 'sync_cmd'),
+    'tree':       ('confs.confs_other', 'tree_cmd'),
+    'uninstall':  ('confs.confs_uninstall', 'uninstall_cmd'),
+    'which':      ('confs.confs_which', 'which_cmd'),
+}
+
+OPTIONS_FIRST = {'config'} # Commands parsed with options_first, see docopt
+
+def serialize(node):
+    """Returns the docopt pattern node as nested tuples."""
+    import docopt
+    if isinstance(node, docopt.Command):
+        return ('command', node.name, node.value)
+    if isinstance(node, docopt.Argument):
+        return ('argument', node.name, node.value)
+    if isinstance(node, docopt.Option):
+        return ('option', node.name, node.value)
+    for cls, kind in ((docopt.AnyOptions, 'options'), (docopt.Optional, 'optional'),
+                      (docopt.Required, 'required'), (docopt.OneOrMore, 'more'), (docopt.Either, 'either')):
+        if isinstance(node, cls):
+            return (kind, [serialize(child) for child in node.children])
+    raise ValueError('Unsupported pattern `{}`'.format(node))
+
+def compile_usage(doc):
+    """Returns (options, pattern) of the docopt usage doc, as docopt() prepares them."""
+    import docopt
+    options = docopt.parse_defaults(doc)
+    pattern = docopt.parse_pattern(docopt.formal_usage(docopt.printable_usage(doc)), options)
+    pattern_options = set(pattern.flat(docopt.Option))
+    for any_options in pattern.flat(docopt.AnyOptions):
+        any_options.children = sorted(set(docopt.parse_defaults(doc)) - pattern_options, key=lambda o: o.name)
+    pattern = pattern.fix()
+    return [(o.short, o.long, o.argcount, o.value) for o in options], serialize(pattern)
+
+def generate() -> str:
+    """Returns the source of confs.commands."""
+    import importlib
+    from pprint import pformat
+    table = {}
+    for command, (module_name, func) in SOURCES.items():
+        module = importlib.import_module(module_name)
+        doc = module.__doc__ if command == MAIN else usage(module, func)
+        options, pattern = compile_usage(doc)
+        table[command] = (module_name, func, options, pattern, command in OPTIONS_FIRST)
+    return GENERATED_HEADER + 'COMMANDS = {}\n'.format(pformat(table, width=120))
+
+if __name__ == '__main__':
+    import os
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'commands.py')
+    source = generate()
+    if '--check' in sys.argv[1:]:
+        with open(path) as f:
+            if f.read() != source:
+                print('{} is out of date'.format(path), file=sys.stderr)
+                sys.exit(1)
+    else:
+        with open(path, 'w') as f:
+            f.write(source)
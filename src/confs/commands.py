@@ -0,0 +1,549 @@
+#!/bin/env python3
+"""
+The command table, compiled from the docopt usages of the commands by
+confs.cli. Generated, do not edit: run `PYTHONPATH=src python -m confs.cli`.
+"""
+
+# Command -> (module, function, options as (short, long, argcount, default), pattern, options_first)
+COMMANDS = {'__main__': ('confs.__main__',
+              'main',
+              [('-v', '--verbose', 0, False),
+               ('-p', '--pretty', 0, False),
+               ('-t', '--terse', 0, False),
+               (None, '--path', 1, None)],
+              ('required',
+               [('required',
+                 [('optional',
+                   [('options',
+                     [('option', '--path', None),
+                      ('option', '--pretty', False),
+                      ('option', '--terse', False),
+                      ('option', '--verbose', False)])]),
+                  ('argument', '<command>', None),
+                  ('optional', [('more', [('argument', '<args>', [])])])])]),
+              False),
+ 'add': ('confs.confs_add',
+         'add_cmd',
+         [('-v', '--verbose', 0, False),
+          ('-p', '--pretty', 0, False),
+          ('-t', '--terse', 0, False),
+          (None, '--path', 1, None),
+          ('-f', '--is-file', 0, False),
+          ('-m', '--mode', 1, 'symlink')],
+         ('required',
+          [('required',
+            [('optional',
+              [('options',
+                [('option', '--is-file', False),
+                 ('option', '--path', None),
+                 ('option', '--pretty', False),
+                 ('option', '--terse', False),
+                 ('option', '--verbose', False)])]),
+             ('command', 'add', False),
+             ('optional', [('option', '--mode', 'symlink')]),
+             ('argument', '<identifier>', None),
+             ('argument', '<target_name>', None),
+             ('argument', '<target_dest>', None)])]),
+         False),
+ 'compile': ('confs.confs_compile',
+             'compile_cmd',
+             [('-v', '--verbose', 0, False),
+              ('-p', '--pretty', 0, False),
+              ('-t', '--terse', 0, False),
+              (None, '--path', 1, None),
+              ('-o', '--output', 1, None)],
+             ('required',
+              [('required',
+                [('optional',
+                  [('options',
+                    [('option', '--path', None),
+                     ('option', '--pretty', False),
+                     ('option', '--terse', False),
+                     ('option', '--verbose', False)])]),
+                 ('command', 'compile', False),
+                 ('optional', [('option', '--output', None)]),
+                 ('optional', [('more', [('argument', '<identifiers>', [])])])])]),
+             False),
+ 'completion': ('confs.confs_complete',
+                'completion_cmd',
+                [('-v', '--verbose', 0, False),
+                 ('-p', '--pretty', 0, False),
+                 ('-t', '--terse', 0, False),
+                 (None, '--path', 1, None)],
+                ('required',
+                 [('required',
+                   [('optional',
+                     [('options',
+                       [('option', '--path', None),
+                        ('option', '--pretty', False),
+                        ('option', '--terse', False),
+                        ('option', '--verbose', False)])]),
+                    ('command', 'completion', False),
+                    ('required',
+                     [('either',
+                       [('command', 'bash', False), ('command', 'zsh', False), ('command', 'fish', False)])])])]),
+                False),
+ 'config': ('confs.confs_config',
+            'config_cmd',
+            [('-v', '--verbose', 0, False), ('-p', '--pretty', 0, False), ('-t', '--terse', 0, False)],
+            ('required',
+             [('required',
+               [('optional',
+                 [('options',
+                   [('option', '--pretty', False), ('option', '--terse', False), ('option', '--verbose', False)])]),
+                ('command', 'config', False),
+                ('required',
+                 [('either',
+                   [('required', [('command', 'get', False), ('argument', '<key>', None)]),
+                    ('required',
+                     [('command', 'set', False), ('argument', '<key>', None), ('argument', '<value>', None)]),
+                    ('command', 'show', False)])])])]),
+            True),
+ 'create': ('confs.confs_create',
+            'create_cmd',
+            [('-v', '--verbose', 0, False),
+             ('-p', '--pretty', 0, False),
+             ('-t', '--terse', 0, False),
+             (None, '--path', 1, None)],
+            ('required',
+             [('required',
+               [('optional',
+                 [('options',
+                   [('option', '--path', None),
+                    ('option', '--pretty', False),
+                    ('option', '--terse', False),
+                    ('option', '--verbose', False)])]),
+                ('command', 'create', False),
+                ('argument', '<identifier>', None)])]),
+            False),
+ 'enable': ('confs.confs_enable',
+            'enable_cmd',
+            [('-v', '--verbose', 0, False),
+             ('-p', '--pretty', 0, False),
+             ('-t', '--terse', 0, False),
+             (None, '--path', 1, None),
+             (None, '--no-hooks', 0, False)],
+            ('required',
+             [('required',
+               [('optional',
+                 [('options',
+                   [('option', '--path', None),
+                    ('option', '--pretty', False),
+                    ('option', '--terse', False),
+                    ('option', '--verbose', False)])]),
+                ('command', 'enable', False),
+                ('optional', [('option', '--no-hooks', False)]),
+                ('argument', '<identifier>', None)])]),
+            False),
+ 'events': ('confs.confs_events',
+            'events_cmd',
+            [('-v', '--verbose', 0, False),
+             ('-p', '--pretty', 0, False),
+             ('-t', '--terse', 0, False),
+             (None, '--path', 1, None),
+             ('-s', '--since', 1, '0'),
+             ('-f', '--follow', 0, False)],
+            ('required',
+             [('required',
+               [('optional',
+                 [('options',
+                   [('option', '--path', None),
+                    ('option', '--pretty', False),
+                    ('option', '--terse', False),
+                    ('option', '--verbose', False)])]),
+                ('command', 'events', False),
+                ('optional', [('option', '--since', '0')]),
+                ('optional', [('option', '--follow', False)])])]),
+            False),
+ 'examples': ('confs.confs_other',
+              'examples_cmd',
+              [('-v', '--verbose', 0, False), ('-p', '--pretty', 0, False), ('-t', '--terse', 0, False)],
+              ('required',
+               [('required',
+                 [('optional',
+                   [('options',
+                     [('option', '--pretty', False), ('option', '--terse', False), ('option', '--verbose', False)])]),
+                  ('command', 'examples', False)])]),
+              False),
+ 'exec': ('confs.confs_exec',
+          'exec_cmd',
+          [('-v', '--verbose', 0, False),
+           ('-p', '--pretty', 0, False),
+           ('-t', '--terse', 0, False),
+           (None, '--path', 1, None),
+           ('-c', '--clean', 0, False)],
+          ('required',
+           [('required',
+             [('optional',
+               [('options',
+                 [('option', '--path', None),
+                  ('option', '--pretty', False),
+                  ('option', '--terse', False),
+                  ('option', '--verbose', False)])]),
+              ('command', 'exec', False),
+              ('optional', [('option', '--clean', False)]),
+              ('argument', '<identifier>', None),
+              ('command', '--', False),
+              ('more', [('argument', '<command>', [])])])]),
+          False),
+ 'export': ('confs.confs_export',
+            'export_cmd',
+            [('-v', '--verbose', 0, False),
+             ('-p', '--pretty', 0, False),
+             ('-t', '--terse', 0, False),
+             (None, '--path', 1, None),
+             ('-z', '--gzip', 0, False),
+             ('-j', '--bzip2', 0, False),
+             ('-J', '--xz', 0, False),
+             ('-o', '--output', 1, None),
+             (None, '--since', 1, None),
+             (None, '--manifest', 1, None)],
+            ('required',
+             [('required',
+               [('optional',
+                 [('options',
+                   [('option', '--path', None),
+                    ('option', '--pretty', False),
+                    ('option', '--terse', False),
+                    ('option', '--verbose', False)])]),
+                ('command', 'export', False),
+                ('optional',
+                 [('either', [('option', '--gzip', False), ('option', '--bzip2', False), ('option', '--xz', False)])]),
+                ('optional', [('option', '--output', None)]),
+                ('optional', [('either', [('option', '--since', None), ('option', '--manifest', None)])]),
+                ('optional', [('more', [('argument', '<identifiers>', [])])])])]),
+            False),
+ 'grep': ('confs.confs_grep',
+          'grep_cmd',
+          [('-v', '--verbose', 0, False),
+           ('-p', '--pretty', 0, False),
+           ('-t', '--terse', 0, False),
+           (None, '--path', 1, None),
+           ('-i', '--ignore-case', 0, False),
+           ('-F', '--fixed-strings', 0, False),
+           ('-l', '--files-with-matches', 0, False)],
+          ('required',
+           [('required',
+             [('optional',
+               [('options',
+                 [('option', '--path', None),
+                  ('option', '--pretty', False),
+                  ('option', '--terse', False),
+                  ('option', '--verbose', False)])]),
+              ('command', 'grep', False),
+              ('optional', [('option', '--ignore-case', False)]),
+              ('optional', [('option', '--fixed-strings', False)]),
+              ('optional', [('option', '--files-with-matches', False)]),
+              ('argument', '<pattern>', None),
+              ('optional', [('more', [('argument', '<identifiers>', [])])])])]),
+          False),
+ 'hook': ('confs.confs_hook',
+          'hook_cmd',
+          [('-v', '--verbose', 0, False),
+           ('-p', '--pretty', 0, False),
+           ('-t', '--terse', 0, False),
+           (None, '--path', 1, None)],
+          ('required',
+           [('required',
+             [('optional',
+               [('options',
+                 [('option', '--path', None),
+                  ('option', '--pretty', False),
+                  ('option', '--terse', False),
+                  ('option', '--verbose', False)])]),
+              ('command', 'hook', False),
+              ('required',
+               [('either', [('command', 'bash', False), ('command', 'zsh', False), ('command', 'fish', False)])])])]),
+          False),
+ 'import': ('confs.confs_import',
+            'import_cmd',
+            [('-v', '--verbose', 0, False),
+             ('-p', '--pretty', 0, False),
+             ('-t', '--terse', 0, False),
+             (None, '--path', 1, None),
+             ('-i', '--input', 1, None),
+             ('-f', '--force', 0, False)],
+            ('required',
+             [('required',
+               [('optional',
+                 [('options',
+                   [('option', '--path', None),
+                    ('option', '--pretty', False),
+                    ('option', '--terse', False),
+                    ('option', '--verbose', False)])]),
+                ('command', 'import', False),
+                ('optional', [('option', '--force', False)]),
+                ('optional', [('option', '--input', None)]),
+                ('optional', [('more', [('argument', '<identifiers>', [])])])])]),
+            False),
+ 'install': ('confs.confs_install',
+             'install_cmd',
+             [('-v', '--verbose', 0, False),
+              ('-p', '--pretty', 0, False),
+              ('-t', '--terse', 0, False),
+              (None, '--path', 1, None),
+              (None, '--no-hooks', 0, False),
+              ('-f', '--force', 0, False)],
+             ('required',
+              [('required',
+                [('optional',
+                  [('options',
+                    [('option', '--path', None),
+                     ('option', '--pretty', False),
+                     ('option', '--terse', False),
+                     ('option', '--verbose', False)])]),
+                 ('command', 'install', False),
+                 ('optional', [('option', '--no-hooks', False)]),
+                 ('optional', [('option', '--force', False)]),
+                 ('argument', '<identifier>', None),
+                 ('optional', [('more', [('argument', '<targets>', [])])])])]),
+             False),
+ 'migrate': ('confs.confs_migrate',
+             'migrate_cmd',
+             [('-v', '--verbose', 0, False),
+              ('-p', '--pretty', 0, False),
+              ('-t', '--terse', 0, False),
+              (None, '--path', 1, None),
+              ('-j', '--jobs', 1, None),
+              (None, '--from', 1, None)],
+             ('required',
+              [('required',
+                [('optional',
+                  [('options',
+                    [('option', '--path', None),
+                     ('option', '--pretty', False),
+                     ('option', '--terse', False),
+                     ('option', '--verbose', False)])]),
+                 ('command', 'migrate', False),
+                 ('optional', [('option', '--jobs', None)]),
+                 ('optional', [('option', '--from', None)]),
+                 ('argument', '<identifier>', None),
+                 ('optional', [('more', [('argument', '<paths>', [])])])])]),
+             False),
+ 'mode': ('confs.confs_mode',
+          'mode_cmd',
+          [('-v', '--verbose', 0, False),
+           ('-p', '--pretty', 0, False),
+           ('-t', '--terse', 0, False),
+           (None, '--path', 1, None)],
+          ('required',
+           [('required',
+             [('optional',
+               [('options',
+                 [('option', '--path', None),
+                  ('option', '--pretty', False),
+                  ('option', '--terse', False),
+                  ('option', '--verbose', False)])]),
+              ('command', 'mode', False),
+              ('argument', '<identifier>', None),
+              ('argument', '<target_name>', None),
+              ('optional', [('argument', '<mode>', None)])])]),
+          False),
+ 'pack': ('confs.confs_pack',
+          'pack_cmd',
+          [('-v', '--verbose', 0, False),
+           ('-p', '--pretty', 0, False),
+           ('-t', '--terse', 0, False),
+           (None, '--path', 1, None),
+           ('-u', '--unpack', 0, False),
+           (None, '--older-than', 1, None),
+           ('-n', '--dry-run', 0, False)],
+          ('required',
+           [('either',
+             [('required',
+               [('optional',
+                 [('options',
+                   [('option', '--path', None),
+                    ('option', '--pretty', False),
+                    ('option', '--terse', False),
+                    ('option', '--verbose', False)])]),
+                ('command', 'pack', False),
+                ('optional', [('option', '--unpack', False)]),
+                ('more', [('argument', '<identifiers>', [])])]),
+              ('required',
+               [('optional',
+                 [('options',
+                   [('option', '--path', None),
+                    ('option', '--pretty', False),
+                    ('option', '--terse', False),
+                    ('option', '--verbose', False)])]),
+                ('command', 'pack', False),
+                ('option', '--older-than', None),
+                ('optional', [('option', '--dry-run', False)])])])]),
+          False),
+ 'parents': ('confs.confs_parents',
+             'parents_cmd',
+             [('-v', '--verbose', 0, False),
+              ('-p', '--pretty', 0, False),
+              ('-t', '--terse', 0, False),
+              (None, '--path', 1, None),
+              ('-c', '--clear', 0, False)],
+             ('required',
+              [('required',
+                [('optional',
+                  [('options',
+                    [('option', '--path', None),
+                     ('option', '--pretty', False),
+                     ('option', '--terse', False),
+                     ('option', '--verbose', False)])]),
+                 ('command', 'parents', False),
+                 ('optional', [('option', '--clear', False)]),
+                 ('argument', '<identifier>', None),
+                 ('optional', [('more', [('argument', '<parents>', [])])])])]),
+             False),
+ 'query': ('confs.confs_query',
+           'query_cmd',
+           [('-v', '--verbose', 0, False),
+            ('-p', '--pretty', 0, False),
+            ('-t', '--terse', 0, False),
+            (None, '--path', 1, None),
+            ('-j', '--json', 0, False),
+            ('-s', '--select', 1, None),
+            ('-l', '--level', 1, None)],
+           ('required',
+            [('required',
+              [('optional',
+                [('options',
+                  [('option', '--path', None),
+                   ('option', '--pretty', False),
+                   ('option', '--terse', False),
+                   ('option', '--verbose', False)])]),
+               ('command', 'query', False),
+               ('optional', [('option', '--json', False)]),
+               ('optional', [('option', '--select', None)]),
+               ('optional', [('option', '--level', None)]),
+               ('optional', [('more', [('argument', '<expression>', [])])])])]),
+           False),
+ 'recover': ('confs.confs_recover',
+             'recover_cmd',
+             [('-v', '--verbose', 0, False),
+              ('-p', '--pretty', 0, False),
+              ('-t', '--terse', 0, False),
+              (None, '--path', 1, None),
+              ('-f', '--forward', 0, False)],
+             ('required',
+              [('required',
+                [('optional',
+                  [('options',
+                    [('option', '--path', None),
+                     ('option', '--pretty', False),
+                     ('option', '--terse', False),
+                     ('option', '--verbose', False)])]),
+                 ('command', 'recover', False),
+                 ('optional', [('option', '--forward', False)]),
+                 ('optional', [('more', [('argument', '<typenames>', [])])])])]),
+             False),
+ 'relocate': ('confs.confs_relocate',
+              'relocate_cmd',
+              [('-v', '--verbose', 0, False),
+               ('-p', '--pretty', 0, False),
+               ('-t', '--terse', 0, False),
+               (None, '--path', 1, None),
+               ('-r', '--relative', 0, False),
+               ('-a', '--absolute', 0, False),
+               ('-j', '--jobs', 1, None),
+               (None, '--from', 1, None)],
+              ('required',
+               [('required',
+                 [('optional',
+                   [('options',
+                     [('option', '--path', None),
+                      ('option', '--pretty', False),
+                      ('option', '--terse', False),
+                      ('option', '--verbose', False)])]),
+                  ('command', 'relocate', False),
+                  ('optional', [('either', [('option', '--relative', False), ('option', '--absolute', False)])]),
+                  ('optional', [('option', '--jobs', None)]),
+                  ('optional', [('option', '--from', None)]),
+                  ('argument', '<new-path>', None)])]),
+              False),
+ 'show': ('confs.confs_show',
+          'show_cmd',
+          [('-v', '--verbose', 0, False),
+           ('-p', '--pretty', 0, False),
+           ('-t', '--terse', 0, False),
+           (None, '--path', 1, None)],
+          ('required',
+           [('required',
+             [('optional',
+               [('options',
+                 [('option', '--path', None),
+                  ('option', '--pretty', False),
+                  ('option', '--terse', False),
+                  ('option', '--verbose', False)])]),
+              ('command', 'show', False),
+              ('optional', [('more', [('argument', '<identifiers>', [])])])])]),
+          False),
+ 'sync': ('confs.confs_sync',
+          'sync_cmd',
+          [('-v', '--verbose', 0, False),
+           ('-p', '--pretty', 0, False),
+           ('-t', '--terse', 0, False),
+           (None, '--path', 1, None)],
+          ('required',
+           [('required',
+             [('optional',
+               [('options',
+                 [('option', '--path', None),
+                  ('option', '--pretty', False),
+                  ('option', '--terse', False),
+                  ('option', '--verbose', False)])]),
+              ('command', 'sync', False),
+              ('argument', '<identifier>', None),
+              ('optional', [('more', [('argument', '<targets>', [])])])])]),
+          False),
+ 'tree': ('confs.confs_other',
+          'tree_cmd',
+          [('-v', '--verbose', 0, False),
+           ('-p', '--pretty', 0, False),
+           ('-t', '--terse', 0, False),
+           (None, '--path', 1, None)],
+          ('required',
+           [('required',
+             [('optional',
+               [('options',
+                 [('option', '--path', None),
+                  ('option', '--pretty', False),
+                  ('option', '--terse', False),
+                  ('option', '--verbose', False)])]),
+              ('command', 'tree', False)])]),
+          False),
+ 'uninstall': ('confs.confs_uninstall',
+               'uninstall_cmd',
+               [('-v', '--verbose', 0, False),
+                ('-p', '--pretty', 0, False),
+                ('-t', '--terse', 0, False),
+                (None, '--path', 1, None),
+                (None, '--no-hooks', 0, False),
+                ('-f', '--force', 0, False)],
+               ('required',
+                [('required',
+                  [('optional',
+                    [('options',
+                      [('option', '--path', None),
+                       ('option', '--pretty', False),
+                       ('option', '--terse', False),
+                       ('option', '--verbose', False)])]),
+                   ('command', 'uninstall', False),
+                   ('optional', [('option', '--no-hooks', False)]),
+                   ('optional', [('option', '--force', False)]),
+                   ('argument', '<typename>', None),
+                   ('optional', [('more', [('argument', '<targets>', [])])])])]),
+               False),
+ 'which': ('confs.confs_which',
+           'which_cmd',
+           [('-v', '--verbose', 0, False),
+            ('-p', '--pretty', 0, False),
+            ('-t', '--terse', 0, False),
+            (None, '--path', 1, None)],
+           ('required',
+            [('required',
+              [('optional',
+                [('options',
+                  [('option', '--path', None),
+                   ('option', '--pretty', False),
+                   ('option', '--terse', False),
+                   ('option', '--verbose', False)])]),
+               ('command', 'which', False),
+               ('more', [('argument', '<paths>', [])])])]),
+           False)}
@@ -2,8 +2,7 @@
 
 from pathlib import Path
 import sys
-
-from confs.confslib import ConfType, Config
+import time
 
 from functools import wraps, partial
 
@@ -18,15 +17,13 @@ Options:
 
     if takes_path:
         optionals_str += """
-        --path <path>   Set custom confs path
+        --path <path>   Set custom confs path, or a union of paths separated by :
         """
 
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            wrapper.__doc__ += optionals_str
-            return func(*args, **kwargs)
-        return wrapper
+        # Appended once, as the command table is compiled from the usage (see confs.cli)
+        func.__doc__ += optionals_str
+        return func
     return decorator
 
 def is_interactive():
@@ -56,16 +53,44 @@ class ArgFlags:
             ArgFlags.pretty = ArgFlags.interactive
     
 def config_from_options(args):
+    from confs.confslib import Config
     ArgFlags.from_args(args)
     config = Config()
     if '--path' in args and args['--path']:
-        config.confs_path = args['--path']
-    else:
-        config.confs_path = '/home/jbr/.confs/'
+        config.set_path(args['--path'])
+    err = config.load_settings()
+    if err:
+        fatal('Unable to load settings: {}'.format(err))
     return config
 
+_locks = {} # confs_path -> Locks held by commands not using a Session
+
+def lock_conf(name, config):
+    """
+    Takes the shared lock of the type name until the process exits, see
+    confs.locks, rolling back a write of it interrupted half way first.
+    """
+    from confs.locks import Locks
+    from confs import journal
+    locks = _locks.setdefault(str(config.confs_path), Locks(config))
+    held = locks.held.get(name)
+    interrupted = not (held and held.exclusive) and journal.exists(config, name)
+    err, _ = locks.acquire(name, exclusive=interrupted)
+    if err:
+        fatal('Unable to load `{}`: {}'.format(name, err))
+    if interrupted and journal.exists(config, name):
+        errs, recovered = journal.recover(config, name)
+        description = recovered.description if recovered else name
+        if errs:
+            log('Could not roll back the interrupted `{}`, see `confs recover`: {}'.format(
+                description, '; '.join(str(e) for e in errs)), warning=True)
+        else:
+            log('Rolled back the interrupted `{}`'.format(description), warning=True)
+
 def load_conf(name, config, ignore_error=True):
+    from confs.confslib import ConfType
     p = Path(config.confs_path, name)
+    lock_conf(p.stem, config)
     err, conf = ConfType.from_conf_path(path=p, config=config)
     if err:
         if ignore_error:
@@ -74,9 +99,16 @@ def load_conf(name, config, ignore_error=True):
     return conf
     
 def load_confs(config):
+    from confs.confslib import ConfType
     confs = []
-    for p in Path(config.confs_path).iterdir():
+    if config.lower_paths:
+        from confs import union
+        paths = [Path(config.confs_path, name) for name in union.typenames(config)]
+    else:
+        paths = config.fs.iterdir(config.confs_path)
+    for p in paths:
         if p.stem not in config.excluded_conf_types:
+            lock_conf(p.stem, config)
             err, conf = ConfType.from_conf_path(path=p, config=config)
             if err:
                 fatal('Unable to load confs: {}'.format(err))
@@ -84,6 +116,63 @@ def load_confs(config):
     verbose('Loaded {} confs from `{}`'.format(len(confs), config.confs_path))
     return confs
 
+def run_hooks(hooks):
+    """Runs the hooks queued in hooks, reporting the outcome and timing of each."""
+    start = time.monotonic()
+    results = hooks.run()
+    if not results:
+        return results
+    wall_time = time.monotonic() - start
+
+    for r in results:
+        name = '{}` of `{}'.format(r.hook.path.name, ' '.join(r.hook.identifiers))
+        if r.error:
+            pprint('Hook `{}` could not be run: {}'.format(name, r.error), warning=True)
+        elif r.timed_out:
+            pprint('Hook `{}` timed out after {:.2f}s'.format(name, r.duration), warning=True)
+        elif r.returncode != 0:
+            pprint('Hook `{}` failed with exit code {} after {:.2f}s'.format(name, r.returncode, r.duration), warning=True)
+        else:
+            pprint('Ran hook `{}` in {:.2f}s'.format(name, r.duration), success=True)
+        if r.output and (not r.ok or ArgFlags.verbose):
+            print(r.output, end='' if r.output.endswith('\n') else '\n', file=sys.stderr)
+
+    verbose('Ran {} hooks in {:.2f}s ({:.2f}s if run sequentially)'.format(
+        len(results), wall_time, sum(r.duration for r in results)))
+    return results
+
+def ask(question):
+    """Asks a yes/no question, answering no when not interactive."""
+    if not ArgFlags.interactive or not sys.stdin.isatty():
+        return False
+    try:
+        return input('{} [y/N] '.format(question)).strip().lower() in ('y', 'yes')
+    except EOFError:
+        return False
+
+def resolve_drift(target, force=False):
+    """
+    Offers to sync the in place edits of a materialized target back
+    into its alt. Returns True if the installed copy may be replaced.
+    """
+    changes = target.drift()
+    if not changes:
+        return True
+    identifier = '{}/{}'.format(target.alt.path.parent.name, target.alt.name)
+    pprint('The installed copy of `{}/{}` at `{}` was modified in place:'.format(
+        identifier, target.name, target.target), warning=True)
+    for rel, change in changes:
+        pprint('    {:<9} {}'.format(change, rel), warning=True)
+    if force:
+        return True
+    if ask('Sync the changes back into `{}`?'.format(identifier)):
+        err = target.sync_back()
+        if err:
+            fatal('Unable to sync `{}/{}`: {}'.format(identifier, target.name, err))
+        pprint('Synced `{}` back into `{}`'.format(target.target, identifier), success=True)
+        return True
+    return False
+
 def split_identifier(identifier, alt_optional=False):
     """
     Splits an identifier into (typename, altname), where
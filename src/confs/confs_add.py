@@ -1,7 +1,7 @@
 #!/bin/env python3
 
 """
-Usage: confs [options] add <identifier> <target_name> <target_dest>
+Usage: confs [options] add [--mode <mode>] <identifier> <target_name> <target_dest>
 
 Options:
   -v, --verbose                 Verbose output
@@ -10,6 +10,9 @@ Options:
   --path <path>                 Set custom confs path
   -f, --is-file                 Create a file instead of a directory
                                   as the targets content. Useful for rc files.
+  -m, --mode <mode>             How to install the target: symlink, copy,
+                                  hardlink, reflink, stow or secret
+                                  [default: symlink]
 Description:
   Adds a new target named <target_name> which installs to <target_dest>,
   to the alt identified by <identifier>.
@@ -18,36 +21,27 @@ Description:
 import os
 import sys
 from pathlib import Path
-from docopt import docopt
 
-from confs.confslib import *
-import confs.confslib
+from confs.session import Session, ConfsError
+from confs.materialize import MODES
 
 from confs.common import *
 
 def add_cmd(args):
-    args = docopt(__doc__)
     config = config_from_options(args)
     verbose(args)
 
+    if args['--mode'] not in MODES:
+        fatal('Invalid mode `{}`, expected one of: {}'.format(args['--mode'], ', '.join(MODES)))
+
     typename, altname = split_identifier(args['<identifier>'])
     verbose('typename:', typename, 'altname:', altname)
 
-    conf = load_conf(typename, config)
-    err, alt = conf.get_alt_by_name(altname)
-    if err:
-        fatal('Unable to get `{}`: {}'.format(args['<identifier>'], err))
-
-    # Add link to targets directory
-    err = alt.add_target(args['<target_name>'], Path(args['<target_dest>']).absolute())
-    if err:
-        fatal('Unable to add target `{}` to `{}`: {}'.format(args['<target_name>'], args['<identifier>'], err))
-
-    contents_path = Path(alt.path, args['<target_name>']).absolute()
-    # Create file/directory
-    if args['--is-file']:
-        contents_path.touch()
-    else:
-        contents_path.mkdir()
+    session = Session(config)
+    try:
+        session.add(args['<identifier>'], args['<target_name>'], args['<target_dest>'],
+                    is_file=args['--is-file'], mode=args['--mode'])
+    except ConfsError as e:
+        fatal('Unable to add target `{}` to `{}`: {}'.format(args['<target_name>'], args['<identifier>'], e))
 
     pprint('Added type `{}` to alt `{}`'.format(typename, altname), success=True)
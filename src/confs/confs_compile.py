@@ -0,0 +1,57 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] compile [-o <file>] [<identifiers>...]
+
+Writes a standalone POSIX shell script which installs <identifiers>
+(the enabled alt for a typename, all types if none are given) without
+confs or Python, eg. to bootstrap CI runners and containers.
+
+The script only links destinations which do not already point to their
+content, so running it again is cheap. Paths inside the confs path are
+relative to $CONFS, which defaults to the current confs path, and paths
+inside the home directory are relative to $HOME.
+
+Options:
+  -v, --verbose         Verbose output
+  -p, --pretty          Pretty output (formatted output)
+  -t, --terse           Terse output (machine readable)
+  --path <path>         Set custom confs path
+  -o, --output <file>   Write the script to <file> (executable), instead
+                          of stdout
+
+Examples:
+  confs compile -o bootstrap.sh
+  confs compile vim tmux/work | ssh host 'CONFS=~/dotfiles sh'
+"""
+
+import os
+import sys
+
+from confs import bootstrap
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def compile_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    session = Session(config, hooks=False)
+    try:
+        err, script = bootstrap.compile_script(session, args['<identifiers>'])
+    except ConfsError as e:
+        fatal('Unable to compile `{}`: {}'.format(' '.join(args['<identifiers>']), e))
+    if err:
+        fatal('Unable to compile `{}`: {}'.format(' '.join(args['<identifiers>']), err))
+
+    if not args['--output']:
+        sys.stdout.write(script)
+        return
+    try:
+        with open(args['--output'], 'w') as f:
+            f.write(script)
+        os.chmod(args['--output'], 0o755)
+    except OSError as e:
+        fatal('Unable to write `{}`: {}'.format(args['--output'], e))
+    pprint('Wrote `{}`'.format(args['--output']), success=True)
@@ -0,0 +1,221 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] completion (bash | zsh | fish)
+
+Prints the completion script for the given shell. The scripts call
+the internal `confs __complete` command, which answers from the cached
+listing of types, alts and targets instead of loading the confs tree.
+
+Options:
+  -v, --verbose         Verbose output
+  -p, --pretty          Pretty output (formatted output)
+  -t, --terse           Terse output (machine readable)
+  --path <path>         Set custom confs path
+
+Examples:
+  eval "$(confs completion bash)"      # in ~/.bashrc
+  source <(confs completion zsh)       # in ~/.zshrc, after compinit
+  confs completion fish | source       # in ~/.config/fish/config.fish
+"""
+
+import os
+import sys
+
+from confs import index
+
+# The kinds of the positional arguments of each command. A kind ending
+# in '...' is repeated, None is left to the shell (filename completion).
+COMMANDS = {
+    'add':        ['alt', None, None],
+    'completion': ['shell'],
+    'compile':    ['identifier...'],
+    'config':     ['config'],
+    'create':     ['type'],
+    'delete':     ['identifier'],
+    'enable':     ['alt'],
+    'events':     [],
+    'examples':   [],
+    'exec':       ['alt', None],
+    'export':     ['identifier...'],
+    'grep':       [None, 'identifier...'],
+    'hook':       ['shell'],
+    'import':     ['identifier...'],
+    'install':    ['identifier', 'target...'],
+    'migrate':    ['alt', None],
+    'mode':       ['alt', 'target', 'mode'],
+    'pack':       ['alt...'],
+    'parents':    ['alt', 'alt...'],
+    'query':      ['field...'],
+    'recover':    ['type...'],
+    'relocate':   [None],
+    'show':       ['identifier...'],
+    'sync':       ['identifier', 'target...'],
+    'tree':       [],
+    'uninstall':  ['type', 'enabled_target...'],
+    'which':      [None],
+}
+
+GLOBAL_OPTIONS = ['--verbose', '--pretty', '--terse', '--path']
+
+BASH_SCRIPT = r'''_confs() {
+    local IFS=$'\n'
+    COMPREPLY=($(confs __complete -- "${COMP_WORDS[@]:1:COMP_CWORD}" 2>/dev/null))
+    if [[ ${#COMPREPLY[@]} -eq 1 && ${COMPREPLY[0]} == */ ]]; then
+        compopt -o nospace
+    fi
+}
+complete -o default -F _confs confs
+'''
+
+ZSH_SCRIPT = r'''_confs() {
+    local -a candidates
+    candidates=("${(@f)$(confs __complete -- "${(@)words[2,CURRENT]}" 2>/dev/null)}")
+    candidates=(${candidates:#})
+    if (( ${#candidates} )); then
+        compadd -S '' -- ${(M)candidates:#*/}
+        compadd -- ${candidates:#*/}
+    else
+        _files
+    fi
+}
+compdef _confs confs
+'''
+
+FISH_SCRIPT = r'''function __confs_complete
+    set -l tokens (commandline -opc) (commandline -ct)
+    confs __complete -- $tokens[2..-1] 2>/dev/null
+end
+complete -c confs -a '(__confs_complete)'
+'''
+
+SCRIPTS = {'bash': BASH_SCRIPT, 'zsh': ZSH_SCRIPT, 'fish': FISH_SCRIPT}
+
+def load_listing(confs_path):
+    """Returns the cached listing, only loading confslib if it has to be rebuilt."""
+    listing = index.read(confs_path) if os.pathsep not in confs_path else None
+    if listing is None:
+        from confs.confslib import Config
+        listing = index.load(Config(confs_path=confs_path))
+    return listing
+
+def complete_identifier(listing, cur, with_types=True):
+    """Completes type/alt identifiers, and type names if with_types."""
+    if '/' in cur:
+        typename, altprefix = cur.split('/', 1)
+        return ['{}/{}'.format(typename, a) for a in listing.alts(typename) if a.startswith(altprefix)]
+    types = [t for t in listing.types() if t.startswith(cur)]
+    if with_types:
+        return types + [t + '/' for t in types]
+    return [t + '/' for t in types]
+
+def complete_arg(kind, args, cur, confs_path):
+    if kind == 'shell':
+        return [s for s in sorted(SCRIPTS) if s.startswith(cur)]
+    elif kind == 'mode':
+        return [m for m in ['copy', 'hardlink', 'reflink', 'secret', 'stow', 'symlink'] if m.startswith(cur)]
+    elif kind == 'field':
+        from confs.query import FIELDS
+        return [f for f in FIELDS if f.startswith(cur)]
+    elif kind == 'config':
+        return [c for c in ['get', 'set', 'show'] if c.startswith(cur)] if not args else []
+
+    listing = load_listing(confs_path)
+    if kind == 'type':
+        return [t for t in listing.types() if t.startswith(cur)]
+    elif kind == 'alt':
+        return complete_identifier(listing, cur, with_types=False)
+    elif kind == 'identifier':
+        return complete_identifier(listing, cur)
+    elif kind in ('target', 'enabled_target'):
+        typename, _, altname = args[0].partition('/')
+        if not altname:
+            altname = listing.enabled_alt(typename)
+        return [t for t in listing.targets(typename, altname)
+                if t.startswith(cur) and t not in args[1:]]
+    return []
+
+def value_options(command=None):
+    """
+    Returns the set of the options (eg. --mode and -m) taking a value of
+    command, or of confs itself, from the command table (see confs.cli).
+    """
+    from confs.commands import COMMANDS as TABLE
+    entry = TABLE.get(command) or TABLE['__main__']
+    options = entry[2] + (TABLE['__main__'][2] if command else [])
+    return set(name for short, long, argcount, _ in options if argcount for name in (short, long) if name)
+
+def takes_value(word, options) -> bool:
+    """Returns True if the next word is the value of the option word, eg. `-j` or `-fj` but not `-j4`."""
+    if word in options:
+        return True
+    if word.startswith('--') or len(word) < 2:
+        return False
+    # A bundle of short options, the first one taking a value takes the rest of it
+    for i, letter in enumerate(word[1:], 1):
+        if '-' + letter in options:
+            return i == len(word) - 1
+    return False
+
+def complete(words):
+    """
+    Returns the completion candidates for words, the arguments
+    following `confs`, where the last word is the one being completed.
+    """
+    done, cur = words[:-1], words[-1] if words else ''
+    confs_path = os.path.join(os.path.expanduser('~'), '.confs')
+
+    # Separate the positional arguments from the options and their values
+    positionals = []
+    options = value_options()
+    value_of = None
+    for word in done:
+        if value_of:
+            if value_of == '--path':
+                confs_path = word
+            value_of = None
+        elif word.startswith('--path='):
+            confs_path = word.split('=', 1)[1]
+        elif word.startswith('-') and word != '-':
+            if takes_value(word, options):
+                value_of = word
+        else:
+            positionals.append(word)
+            if len(positionals) == 1:
+                options = value_options(word)
+    if value_of:
+        return [] # The value of an option, left to the shell
+
+    if cur.startswith('-'):
+        return [o for o in GLOBAL_OPTIONS if o.startswith(cur)]
+    if not positionals:
+        return [c for c in sorted(COMMANDS) if c.startswith(cur)]
+
+    cmd, args = positionals[0], positionals[1:]
+    kinds = COMMANDS.get(cmd, [])
+    if len(args) < len(kinds):
+        kind = kinds[len(args)]
+    elif kinds and kinds[-1] and kinds[-1].endswith('...'):
+        kind = kinds[-1]
+    else:
+        kind = None
+    if not kind:
+        return []
+    return complete_arg(kind.rstrip('.'), args, cur, confs_path)
+
+def complete_cmd(argv):
+    """Entry point of `confs __complete [--] <words>...`."""
+    if argv and argv[0] == '--':
+        argv = argv[1:]
+    try:
+        candidates = complete(argv)
+    except OSError:
+        # Completion must never print errors into the command line
+        candidates = []
+    if candidates:
+        print('\n'.join(candidates))
+
+def completion_cmd(args):
+    for shell, script in SCRIPTS.items():
+        if args[shell]:
+            sys.stdout.write(script)
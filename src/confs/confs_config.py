@@ -2,7 +2,6 @@
 import os
 import sys
 from pathlib import Path
-from docopt import docopt
 
 from confs.confslib import *
 import confs.confslib
@@ -14,7 +13,6 @@ def config_cmd(args):
     """
     Usage: confs [options] config (get <key> | set <key> <value> | show)
     """
-    args = docopt(config_cmd.__doc__, options_first=True)
     config = config_from_options(args)
     if args['get']:
         print(config.get(args['<key>']))
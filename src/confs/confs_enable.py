@@ -3,24 +3,25 @@
 import os
 import sys
 from pathlib import Path
-from docopt import docopt
 
-from confs.confslib import *
-import confs.confslib
+from confs.session import Session, ConfsError
 
 from confs.common import *
 
-@takesoptionals()
+@takesoptionals(takes_path=True)
 def enable_cmd(args):
-    """Usage: confs [options] enable <identifier>"""
-    args = docopt(enable_cmd.__doc__)
+    """Usage: confs [options] enable [--no-hooks] <identifier>"""
     config = config_from_options(args)
     print(args)
 
     typename, altname = split_identifier(args['<identifier>'])
 
-    conf = load_conf(typename, config)
-    err = conf.enable_alt_by_name(altname, write_now=True)
-    if err:
-        fatal('Unable to enable `{}`: {}'.format(args['<name>'], err))
+    session = Session(config, hooks=not args['--no-hooks'])
+    try:
+        session.enable(args['<identifier>'])
+    except ConfsError as e:
+        fatal('Unable to enable `{}`: {}'.format(args['<identifier>'], e))
     pprint('Enabled alt `{}` for type `{}`'.format(altname, typename), success=True)
+    # Hooks may run confs themselves
+    session.release()
+    run_hooks(session.hooks)
@@ -0,0 +1,56 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] events [-s <seq>] [-f]
+
+Prints the events of the change feed after the sequence number <seq>
+(by default all of them), as a line of JSON each: the types enabled,
+the alts saved and the targets installed and uninstalled, by any
+confs command or session, each with its sequence number. With --follow,
+keeps printing new events as they are appended, watching only the log
+of the feed.
+
+A consumer keeps the sequence number of the last event it read, to
+ask for the events after it. The feed is compacted as it grows, keeping
+the last event of each type, alt and target, so reading it from the
+start yields the current state.
+
+Options:
+  -v, --verbose                Verbose output
+  -p, --pretty                 Pretty output (formatted output)
+  -t, --terse                  Terse output (machine readable)
+  --path <path>                Set custom confs path
+  -s, --since <seq>            Only print the events after <seq> [default: 0]
+  -f, --follow                 Keep printing new events as they are appended
+
+Examples:
+  confs events
+  confs events --since 42 --follow
+"""
+
+import sys
+import json
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def events_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    try:
+        since = int(args['--since'])
+    except ValueError:
+        fatal('Invalid sequence number `{}`'.format(args['--since']))
+
+    session = Session(config, hooks=False)
+    try:
+        events = session.events(since=since, follow=args['--follow'])
+        for event in events:
+            print(json.dumps(event, sort_keys=True), flush=True)
+    except ConfsError as e:
+        fatal('Unable to read the events: {}'.format(e))
+    except KeyboardInterrupt:
+        # The usual way to stop following
+        pass
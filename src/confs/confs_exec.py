@@ -0,0 +1,67 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] exec [--clean] <identifier> -- <command>...
+
+Runs <command> with the alt <identifier> overlaid over the home
+directory, without installing it: HOME (and the XDG base directories
+inside it) point to a symlink farm mirroring the home directory, where
+the destinations of the targets of the alt point to its content. Other
+shells keep using the installed alt.
+
+The overlay is built on tmpfs (in $XDG_RUNTIME_DIR) and reused by later
+runs of the same alt, as long as its targets and the mirrored
+directories are unchanged. The command sees the alt in $CONFS_EXEC.
+
+Options:
+  -v, --verbose             Verbose output
+  -p, --pretty              Pretty output (formatted output)
+  -t, --terse               Terse output (machine readable)
+  --path <path>             Set custom confs path
+  -c, --clean               Remove the overlay after the command exits,
+                              instead of replacing this process with it
+
+Examples:
+  confs exec vim/testing -- vim ~/.vimrc
+  confs exec --clean tmux/work -- tmux -L work
+"""
+
+import os
+import sys
+import subprocess
+
+from confs import overlay
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def exec_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    identifier = args['<identifier>']
+    session = Session(config, hooks=False)
+    try:
+        result = session.overlay(identifier)
+    except ConfsError as e:
+        fatal('Unable to overlay `{}`: {}'.format(identifier, e))
+    session.release()
+    for dest in result.skipped:
+        log('Skipping target dest `{}`, it is outside of the home directory'.format(dest), warning=True)
+    verbose('{} the overlay at `{}`'.format('Reusing' if result.reused else 'Built', result.path))
+
+    command = args['<command>']
+    env = result.env(os.environ)
+    if not args['--clean']:
+        try:
+            os.execvpe(command[0], command, env)
+        except OSError as e:
+            fatal('Unable to run `{}`: {}'.format(command[0], e))
+
+    try:
+        status = subprocess.call(command, env=env)
+    except OSError as e:
+        overlay.remove(result)
+        fatal('Unable to run `{}`: {}'.format(command[0], e))
+    overlay.remove(result)
+    sys.exit(status)
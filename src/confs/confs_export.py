@@ -0,0 +1,219 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] export [-z | -j | -J] [-o <file>] [--since <time> | --manifest <file>] [<identifiers>...]
+
+Writes the types or alts identified by <identifiers> (or the whole
+confs tree) as a tar stream to standard output, or to <file>.
+
+Target destinations inside $HOME are stored relative to it (as ~/...)
+and `enabled` links are stored as the name of the alt, so the archive
+can be imported by another user or into another confs path.
+
+Options:
+  -v, --verbose                 Verbose output
+  -p, --pretty                  Pretty output (formatted output)
+  -t, --terse                   Terse output (machine readable)
+  --path <path>                 Set custom confs path
+  -z, --gzip                    Compress using gzip
+  -j, --bzip2                   Compress using bzip2
+  -J, --xz                      Compress using xz
+  -o, --output <file>           Write to <file> instead of standard output
+  --since <time>                Only include alts with content changed since
+                                  <time> (unix time or YYYY-MM-DD[THH:MM[:SS]])
+  --manifest <file>             Only include alts changed since the export
+                                  which last wrote the manifest <file>.
+                                  The manifest is updated after the export.
+
+Description:
+  Incremental exports never record deletions. Import them using
+  `confs import --force` on top of a full import.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import tarfile
+from datetime import datetime
+from pathlib import Path
+
+from confs.confslib import *
+
+from confs.common import *
+
+HOME_PREFIX = '~/'
+
+def home_relative(dest, home):
+    """Returns dest as ~/... if it is inside home, else unchanged."""
+    dest = str(dest)
+    home = home.rstrip('/') + '/'
+    if dest.startswith(home):
+        return HOME_PREFIX + dest[len(home):]
+    return dest
+
+def walk_alt(config, alt_path):
+    """
+    Yields (path, relpath) of all entries below alt_path, parents
+    before children, without following symlinks.
+    """
+    for dirpath, dirnames, filenames in os.walk(str(alt_path)):
+        if dirpath == str(alt_path):
+            dirnames[:] = [d for d in dirnames if d not in config.excluded_altfiles]
+            filenames = [f for f in filenames if f not in config.excluded_altfiles]
+        dirnames.sort()
+        for name in sorted(filenames) + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+            path = os.path.join(dirpath, name)
+            yield path, os.path.relpath(path, str(alt_path))
+        for name in dirnames:
+            path = os.path.join(dirpath, name)
+            if not os.path.islink(path):
+                yield path, os.path.relpath(path, str(alt_path))
+
+def alt_signature(config, alt_path):
+    """
+    Returns a signature of the content of an alt, based on the
+    names, sizes, mtimes and link destinations of its entries.
+    """
+    h = hashlib.sha1()
+    for path, relpath in walk_alt(config, alt_path):
+        st = os.lstat(path)
+        link = os.readlink(path) if os.path.islink(path) else ''
+        h.update('{}\0{}\0{}\0{}\n'.format(relpath, st.st_size, st.st_mtime_ns, link).encode())
+    return h.hexdigest()
+
+def changed_since(config, alt_path, since):
+    """Returns True if any entry of the alt (or the alt itself) changed after since."""
+    if os.lstat(str(alt_path)).st_mtime > since:
+        return True
+    for path, _ in walk_alt(config, alt_path):
+        if os.lstat(path).st_mtime > since:
+            return True
+    return False
+
+def parse_since(value):
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        fatal('Invalid time `{}`, expected unix time or YYYY-MM-DD[THH:MM[:SS]]'.format(value))
+
+def add_alt(tar, config, alt, home):
+    """Adds the alt to tar, rewriting target destinations relative to home."""
+    typename = alt.path.parent.name
+    arc_root = '{}/{}'.format(typename, alt.path.name)
+    tar.add(str(alt.path), arcname=arc_root, recursive=False)
+
+    targets_dir = os.path.join(str(alt.path), config.targets_dir_name)
+    for path, relpath in walk_alt(config, alt.path):
+        info = tar.gettarinfo(path, arcname='{}/{}'.format(arc_root, relpath))
+        if info.issym() and os.path.dirname(path) == targets_dir:
+            info.linkname = home_relative(info.linkname, home)
+        if info.isreg():
+            with open(path, 'rb') as f:
+                tar.addfile(info, f)
+        else:
+            tar.addfile(info)
+
+def add_enabled_link(tar, config, conf):
+    """Adds the enabled symlink of conf, pointing to the name of the alt."""
+    info = tarfile.TarInfo('{}/{}'.format(conf.path.name, config.enabled_link_name))
+    info.type = tarfile.SYMTYPE
+    info.linkname = conf.enabled_alt.path.name
+    info.mtime = int(time.time())
+    info.mode = 0o777
+    tar.addfile(info)
+
+def add_type_hooks(tar, config, conf):
+    """Adds the hooks directory of conf, if any."""
+    hooks_path = Path(conf.path, config.hooks_dir_name)
+    if hooks_path.is_dir():
+        tar.add(str(hooks_path), arcname='{}/{}'.format(conf.path.name, config.hooks_dir_name))
+
+def select(config, identifiers):
+    """Returns a list of (conf, [alts], whole_type) to export."""
+    if not identifiers:
+        return [(conf, conf.alts, True) for conf in load_confs(config)]
+
+    selected = []
+    for identifier in identifiers:
+        typename, altname = split_identifier(identifier, alt_optional=True)
+        conf = load_conf(typename, config, ignore_error=False)
+        if altname:
+            err, alt = conf.get_alt_by_name(altname)
+            if err:
+                fatal('Unable to get `{}`: {}'.format(identifier, err))
+            selected.append((conf, [alt], False))
+        else:
+            selected.append((conf, conf.alts, True))
+    return selected
+
+def export_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    mode = 'w|'
+    if args['--gzip']:
+        mode = 'w|gz'
+    elif args['--bzip2']:
+        mode = 'w|bz2'
+    elif args['--xz']:
+        mode = 'w|xz'
+
+    output = args['--output']
+    if (not output or output == '-') and sys.stdout.isatty():
+        fatal('Refusing to write an archive to a terminal, use -o <file> or a redirect')
+
+    since = parse_since(args['--since']) if args['--since'] else None
+    manifest_path = args['--manifest']
+    old_manifest = {}
+    if manifest_path and Path(manifest_path).exists():
+        with open(manifest_path) as f:
+            old_manifest = json.load(f)
+    new_manifest = {}
+
+    home = str(Path.home())
+    selected = select(config, args['<identifiers>'])
+
+    out = open(output, 'wb') if output and output != '-' else sys.stdout.buffer
+    num_alts = 0
+    try:
+        with tarfile.open(fileobj=out, mode=mode, format=tarfile.PAX_FORMAT) as tar:
+            for conf, alts, whole_type in selected:
+                if whole_type:
+                    tar.add(str(conf.path), arcname=conf.path.name, recursive=False)
+                    if conf.enabled_alt:
+                        add_enabled_link(tar, config, conf)
+                    add_type_hooks(tar, config, conf)
+                for alt in alts:
+                    identifier = '{}/{}'.format(conf.name, alt.name)
+                    if since is not None and not changed_since(config, alt.path, since):
+                        verbose('Skipping unchanged `{}`'.format(identifier))
+                        continue
+                    if manifest_path:
+                        new_manifest[identifier] = alt_signature(config, alt.path)
+                        if old_manifest.get(identifier) == new_manifest[identifier]:
+                            verbose('Skipping unchanged `{}`'.format(identifier))
+                            continue
+                    add_alt(tar, config, alt, home)
+                    verbose('Exported `{}`'.format(identifier))
+                    num_alts += 1
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        else:
+            out.flush()
+
+    if manifest_path:
+        # Keep entries of alts not part of this export
+        old_manifest.update(new_manifest)
+        tmp_path = '{}.tmp'.format(manifest_path)
+        with open(tmp_path, 'w') as f:
+            json.dump(old_manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+
+    log('Exported {} alts'.format(num_alts))
@@ -0,0 +1,59 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] grep [-i] [-F] [-l] <pattern> [<identifiers>...]
+
+Searches the content of all alts (or of the types and alts of
+<identifiers>) for lines matching the regular expression <pattern>,
+printing them as type/alt/file:line:text, where file starts with the
+name of the target.
+
+Uses a trigram index of the content kept in the cache directory, which
+is brought up to date before each search by reading only the files
+changed since. Binary files, and the targets, metadata and hooks of the
+alts, are not searched.
+
+Exits with 1 if no line matches.
+
+Options:
+  -v, --verbose                Verbose output
+  -p, --pretty                 Pretty output (formatted output)
+  -t, --terse                  Terse output (machine readable)
+  --path <path>                Set custom confs path
+  -i, --ignore-case            Match case insensitively
+  -F, --fixed-strings          Match <pattern> as a fixed string
+  -l, --files-with-matches     Only print the files containing a match
+
+Examples:
+  confs grep 'set number'
+  confs grep -i -l colorscheme vim
+  confs grep -F '$HOME' zsh/work bash
+"""
+
+import os
+import sys
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def grep_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    session = Session(config, hooks=False)
+    try:
+        matches = session.grep(args['<pattern>'], identifiers=args['<identifiers>'],
+                               ignore_case=args['--ignore-case'], fixed=args['--fixed-strings'],
+                               files_only=args['--files-with-matches'])
+    except ConfsError as e:
+        fatal('Unable to search for `{}`: {}'.format(args['<pattern>'], e))
+
+    for match in matches:
+        name = os.path.join(match.typename, match.altname, match.rel)
+        if args['--files-with-matches']:
+            print(name)
+        else:
+            print('{}:{}:{}'.format(name, match.line_number, match.line))
+    if not matches:
+        sys.exit(1)
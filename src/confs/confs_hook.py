@@ -0,0 +1,152 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] hook (bash | zsh | fish)
+
+Prints the shell integration switching alts by directory, from the
+`.confs` pin files naming the alts (type/alt, one per line) to use in
+a directory and below it, eg. ~/work/.confs:
+
+    git/work
+    editorconfig/work
+
+Before each prompt, the integration looks for the nearest pin file
+above the current directory using shell builtins only (once per
+directory), and only when it differs from the last one (or was edited,
+in bash and zsh) runs the internal `confs __pin` command. It installs
+the pinned alts not enabled yet, and puts back the alts of the types
+no longer pinned, returning without loading the tree when nothing
+changed.
+
+Options:
+  -v, --verbose         Verbose output
+  -p, --pretty          Pretty output (formatted output)
+  -t, --terse           Terse output (machine readable)
+  --path <path>         Set custom confs path
+
+Examples:
+  eval "$(confs hook bash)"      # in ~/.bashrc
+  eval "$(confs hook zsh)"       # in ~/.zshrc
+  confs hook fish | source       # in ~/.config/fish/config.fish
+"""
+
+import os
+import sys
+import shlex
+
+from confs import pins
+
+# {path} is the confs path and {state} the applied pins, quoted
+POSIX_FUNCTION = r'''_confs_pin_hook() {
+    local dir pin
+    if [[ "$PWD" != "$_confs_pwd" ]]; then
+        _confs_pwd="$PWD"
+        _confs_found=
+        dir="$PWD"
+        while [[ -n "$dir" ]]; do
+            if [[ -f "$dir/.confs" ]]; then
+                _confs_found="$dir/.confs"
+                break
+            fi
+            dir="${dir%/*}"
+        done
+        if [[ -z "$_confs_found" && -f /.confs ]]; then
+            _confs_found=/.confs
+        fi
+    fi
+    pin="$_confs_found"
+    if [[ "$pin" != "$_confs_pin" || ( -n "$pin" && "$pin" -nt {state} ) ]]; then
+        _confs_pin="$pin"
+        command confs __pin {path} "$pin"
+    fi
+}
+_confs_pin=$'\x01'
+'''
+
+BASH_SCRIPT = POSIX_FUNCTION + r'''if [[ ";$PROMPT_COMMAND;" != *";_confs_pin_hook;"* ]]; then
+    PROMPT_COMMAND="_confs_pin_hook${PROMPT_COMMAND:+;$PROMPT_COMMAND}"
+fi
+'''
+
+ZSH_SCRIPT = POSIX_FUNCTION + r'''autoload -Uz add-zsh-hook
+add-zsh-hook precmd _confs_pin_hook
+'''
+
+FISH_SCRIPT = r'''function __confs_pin_hook --on-event fish_prompt
+    if test "$PWD" != "$__confs_pwd"
+        set -g __confs_pwd $PWD
+        set -g __confs_found ''
+        set -l dir $PWD
+        while test -n "$dir"
+            if test -f "$dir/.confs"
+                set -g __confs_found "$dir/.confs"
+                break
+            end
+            set dir (string replace -r '/[^/]*$' '' -- $dir)
+        end
+        if test -z "$__confs_found" -a -f /.confs
+            set -g __confs_found /.confs
+        end
+    end
+    if test "$__confs_found" != "$__confs_pin"
+        set -g __confs_pin $__confs_found
+        command confs __pin {path} "$__confs_pin"
+    end
+end
+set -g __confs_pin \x01
+'''
+
+SCRIPTS = {'bash': BASH_SCRIPT, 'zsh': ZSH_SCRIPT, 'fish': FISH_SCRIPT}
+
+def hook_cmd(args):
+    from confs.common import config_from_options
+    config = config_from_options(args)
+    path = args['--path'] or str(config.confs_path)
+    state = pins.state_path(os.path.abspath(str(config.confs_path)))
+    for shell, script in SCRIPTS.items():
+        if args[shell]:
+            # Not format(), the scripts are full of braces
+            sys.stdout.write(script.replace('{path}', shlex.quote(path)).replace('{state}', shlex.quote(str(state))))
+
+def pin_cmd(argv):
+    """Entry point of `confs __pin <path> [<pin file>]`, run by the shell integration."""
+    if not argv:
+        print('Usage: confs __pin <path> [<pin file>]', file=sys.stderr)
+        sys.exit(1)
+    path, pin = argv[0], argv[1] if len(argv) > 1 else ''
+    confs_path = path.split(os.pathsep)[0]
+    state = pins.load_state(confs_path)
+    try:
+        mtime = os.stat(pin).st_mtime_ns if pin else None
+    except OSError:
+        pin, mtime = '', None
+    if state.get('pin') == pin and state.get('mtime') == mtime:
+        return
+
+    errors, pinned = pins.read(pin)
+    for error in errors:
+        print('confs: `{}`: {}'.format(pin, error), file=sys.stderr)
+    if pins.applied(confs_path, pinned, state):
+        pins.save_state(confs_path, dict(state, pin=pin, mtime=mtime))
+        return
+
+    # Only loaded when switching
+    from confs.common import log, run_hooks
+    from confs.confslib import Config
+    from confs.session import Session, ConfsError
+    config = Config()
+    config.set_path(path)
+    err = config.load_settings()
+    if err:
+        log('confs: unable to load settings: {}'.format(err), warning=True)
+        sys.exit(1)
+    try:
+        session = Session(config)
+    except ConfsError as e:
+        log('confs: {}'.format(e), warning=True)
+        sys.exit(1)
+    state = pins.apply(session, pinned, state, log=lambda message, warning=False: log('confs: {}'.format(message), warning=warning))
+    pins.save_state(confs_path, dict(state, pin=pin, mtime=mtime))
+    # Hooks may run confs themselves
+    session.release()
+    run_hooks(session.hooks)
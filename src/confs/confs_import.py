@@ -0,0 +1,144 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] import [--force] [-i <file>] [<identifiers>...]
+
+Reads a tar stream written by `confs export` from standard input, or
+from <file>, and extracts the types and alts in it, or only those
+identified by <identifiers>, into the confs path. Compression is
+detected automatically.
+
+Options:
+  -v, --verbose                 Verbose output
+  -p, --pretty                  Pretty output (formatted output)
+  -t, --terse                   Terse output (machine readable)
+  --path <path>                 Set custom confs path
+  -i, --input <file>            Read from <file> instead of standard input
+  -f, --force                   Overwrite existing alts and enabled links,
+                                  needed to apply incremental exports.
+
+Description:
+  Target destinations stored relative to $HOME (as ~/...) are rewritten
+  to the $HOME of the importing user. Nothing is installed, use
+  `confs install` afterwards.
+"""
+
+import os
+import sys
+import shutil
+import tarfile
+from pathlib import Path
+
+from confs.confslib import *
+from confs import index
+
+from confs.common import *
+
+from confs.confs_export import HOME_PREFIX
+
+def member_parts(config, member):
+    """
+    Returns the path components of member, or None if
+    the member is not a valid part of a confs tree.
+    """
+    parts = [p for p in member.name.split('/') if p and p != '.']
+    if not parts or member.name.startswith('/') or '..' in parts:
+        return None
+    if parts[0] in config.excluded_conf_types:
+        return None
+    if not (member.isreg() or member.isdir() or member.issym()):
+        return None
+    return parts
+
+def is_selected(parts, selection):
+    if not selection:
+        return True
+    for typename, altname in selection:
+        if parts[0] == typename and (not altname or (len(parts) > 1 and parts[1] == altname)):
+            return True
+    return False
+
+def remove_path(path):
+    if os.path.islink(path) or not os.path.isdir(path):
+        os.unlink(path)
+    else:
+        shutil.rmtree(path)
+
+def import_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    selection = [split_identifier(i, alt_optional=True) for i in args['<identifiers>']]
+    confs_path = os.path.realpath(str(config.confs_path))
+    home = str(Path.home())
+
+    infile = args['--input']
+    stream = open(infile, 'rb') if infile and infile != '-' else sys.stdin.buffer
+
+    skipped_alts = set()
+    imported_alts = set()
+    try:
+        with tarfile.open(fileobj=stream, mode='r|*') as tar:
+            for member in tar:
+                parts = member_parts(config, member)
+                if parts is None:
+                    log('Skipping invalid archive member `{}`'.format(member.name), warning=True)
+                    continue
+                if not is_selected(parts, selection):
+                    continue
+
+                dest = os.path.join(confs_path, *parts)
+                # Never write through a symlink created by an earlier member
+                real_parent = os.path.realpath(os.path.dirname(dest))
+                if os.path.commonpath([confs_path, real_parent]) != confs_path:
+                    log('Skipping `{}`, it is outside of the confs path'.format(member.name), warning=True)
+                    continue
+
+                if len(parts) == 2 and parts[1] == config.enabled_link_name:
+                    if os.path.lexists(dest):
+                        if not args['--force']:
+                            verbose('Keeping existing enabled link of `{}`'.format(parts[0]))
+                            continue
+                        os.unlink(dest)
+                    # Stored as the name of the alt, but confs uses absolute links
+                    os.symlink(os.path.join(confs_path, parts[0], member.linkname), dest)
+                    continue
+
+                if len(parts) >= 2 and parts[1] != config.hooks_dir_name:
+                    identifier = '{}/{}'.format(parts[0], parts[1])
+                    if identifier in skipped_alts:
+                        continue
+                    if len(parts) == 2 and os.path.lexists(dest):
+                        if not args['--force']:
+                            log('Skipping `{}`, it already exists (use --force to overwrite)'
+                                .format(identifier), warning=True)
+                            skipped_alts.add(identifier)
+                            continue
+                    imported_alts.add(identifier)
+
+                if member.isdir():
+                    os.makedirs(dest, exist_ok=True)
+                    continue
+
+                if os.path.lexists(dest):
+                    remove_path(dest)
+                if member.issym():
+                    linkname = member.linkname
+                    is_target = len(parts) == 4 and parts[2] == config.targets_dir_name
+                    if is_target and linkname.startswith(HOME_PREFIX):
+                        linkname = os.path.join(home, linkname[len(HOME_PREFIX):])
+                    os.symlink(linkname, dest)
+                else:
+                    with tar.extractfile(member) as src, open(dest, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.chmod(dest, member.mode & 0o7777)
+                    os.utime(dest, (member.mtime, member.mtime))
+    except tarfile.TarError as e:
+        fatal('Unable to read archive: {}'.format(e))
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    index.invalidate(config)
+    for identifier in sorted(imported_alts):
+        pprint('Imported `{}`'.format(identifier), success=True)
@@ -1,13 +1,18 @@
 #!/bin/env python3
 
 """
-Usage: confs [options] migrate <identifier> <paths>...
+Usage: confs [options] migrate [-j <jobs>] [--from <file>] <identifier> [<paths>...]
 
 Options:
   -v, --verbose                 Verbose output
   -p, --pretty                  Pretty output (formatted output)
   -t, --terse                   Terse output (machine readable)
   --path <path>                 Set custom confs path          
+  -j, --jobs <jobs>             The number of paths to move in parallel
+  --from <file>                 Also migrate the paths (or glob patterns)
+                                  listed in <file>, one per line. Empty lines
+                                  and lines starting with # are ignored.
+                                  Use - to read from standard input.
 
 Description:
    Moves ("migrates") a file/directory to a new target with the same name.
@@ -15,68 +20,55 @@ Description:
    then moving from <migrate_path> to the new targets content path, followed
    by creating the symlink from <migrate_path> back to the content path 
   (eg. by using confs install ...).
+
+   <paths> may be glob patterns (quote them to keep the shell from
+   expanding them), eg. '~/.config/i3*'. All paths are checked before
+   anything is moved, and if moving any of them fails, all of them are
+   moved back.
 """
 
 import os
 import sys
 from pathlib import Path
-from docopt import docopt
 
-from confs.confslib import *
-import confs.confslib
+from confs.session import Session, ConfsError
 
 from confs.common import *
 
+def read_path_list(filename):
+    """Returns the paths listed in filename (- for standard input)."""
+    try:
+        f = sys.stdin if filename == '-' else open(filename)
+    except OSError as e:
+        fatal('Unable to read `{}`: {}'.format(filename, e))
+    with f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
 def migrate_cmd(args):
-    args = docopt(__doc__)
     config = config_from_options(args)
     print(args)
     
     typename, altname = split_identifier(args['<identifier>'])
     print('typename:', typename, 'altname:', altname)
 
-    conf = load_conf(typename, config, ignore_error=False)
-    err, alt = conf.get_alt_by_name(altname)
-    if err:
-        fatal('Unable to get `{}`: {}'.format(args['<identifier>'], err))
-
-    
-    print('Migrating: {}'.format(args['<paths>']))
-    
-    mpaths = [Path(p).absolute() for p in args['<paths>']]
-    for mpath in mpaths:
-        target_name = mpath.stem
-        target_dest = mpath
-        contents_path = Path(alt.path, target_name).absolute()
-
-        err, target = alt.add_target(target_name, target_dest)
-        if err:
-            fatal('Unable to add (migrate) target `{}` from `{}`: {}'.format(target_name, target_dest, err))
-
-        # Move file/dir at mpath to the contents path
-        migrate_path = Path(mpath).absolute()
-        migrate_path.rename(contents_path)
-
-        # Create the symlink (install)
-        err = target.install()
-        resetErr = None
-        if err:
-            resetErr = err
-
-        if not resetErr:
-          err = alt.save()
-          if err:
-              resetErr = err
+    paths = list(args['<paths>'])
+    if args['--from']:
+        paths += read_path_list(args['--from'])
+    if not paths:
+        fatal('Nothing to migrate, give <paths> or --from <file>')
+    jobs = None
+    if args['--jobs']:
+        try:
+            jobs = max(1, int(args['--jobs']))
+        except ValueError:
+            fatal('Invalid number of jobs `{}`'.format(args['--jobs']))
+    print('Migrating: {}'.format(paths))
 
-        if resetErr:
-            # Reset changes
-            # Move files back to original path
-            migrate_path.rename(Path(mpath).absolute())
-            # Delete target
-            inner_err = alt.delete_target(targetname, write_now=True)
-            if inner_err:
-                fatal('Unable to delete target {} during resetting of changes from error: {}, {}'.format(targetname, inner_err, err))
-            return 
-            fatal('Unable to save (migrated) target `{}` from `{}`: {}'.format(target_name, target_dest, err))
-        else:
-            pprint('Migrated `{}` to `{}`'.format(mpath, args['<identifier>']), success=True)
+    session = Session(config)
+    try:
+        result = session.migrate(args['<identifier>'], paths, jobs=jobs)
+    except ConfsError as e:
+        fatal('Unable to migrate to `{}`, nothing was migrated: {}'.format(args['<identifier>'], e))
+    for path in result.done:
+        pprint('Migrated `{}` to `{}`'.format(path, args['<identifier>']), success=True)
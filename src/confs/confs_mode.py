@@ -0,0 +1,60 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] mode <identifier> <target_name> [<mode>]
+
+Shows or sets how the target <target_name> of the alt <identifier>
+is installed:
+
+  symlink   Symlink the destination to the content (the default)
+  copy      Copy the content to the destination
+  hardlink  Hardlink the files of the content, copying across filesystems
+  reflink   Clone the files of the content (copy-on-write), falling back
+              to copying if the filesystem does not support it
+  stow      Symlink each entry of the content inside the destination,
+              so targets of several types can share a directory
+  secret    Encrypt the content in the tree, and symlink the destination
+              to a decrypted copy in a private tmpfs cache
+
+Installed copies are tracked by a manifest, so re-installs only copy
+changed files, and edits made to the installed copy can be copied back
+using `confs sync`.
+
+Stowed directories only needed by one target are folded into a single
+symlink, and unfolded into a directory of symlinks when another stow
+target is installed into them. Only stow targets may share destinations.
+
+Setting the secret mode encrypts the content in place with the key of
+`~/.config/confs/secret.key` (created if missing, keep a copy of it
+somewhere safe), leaving it decrypts it back. The decrypted copies are
+kept by destination and the hash of their ciphertext, so installing a
+secret again does not decrypt it, and are removed when it is uninstalled.
+
+Options:
+  -v, --verbose         Verbose output
+  -p, --pretty          Pretty output (formatted output)
+  -t, --terse           Terse output (machine readable)
+  --path <path>         Set custom confs path
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def mode_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    session = Session(config)
+    try:
+        if not args['<mode>']:
+            print(session.get_target(args['<identifier>'], args['<target_name>']).mode)
+            return
+        session.set_mode(args['<identifier>'], args['<target_name>'], args['<mode>'])
+    except ConfsError as e:
+        fatal('Unable to set the mode of `{}/{}`: {}'.format(args['<identifier>'], args['<target_name>'], e))
+    pprint('Set the mode of `{}/{}` to {}'.format(args['<identifier>'], args['<target_name>'], args['<mode>']), success=True)
@@ -1,18 +1,17 @@
 #!/bin/env python3
 
-from docopt import docopt
-
 from confs.common import takesoptionals, config_from_options
 
 @takesoptionals(takes_path=True)
 def tree_cmd(args):
     """Usage: confs [options] tree"""
-    args = docopt(tree_cmd.__doc__)
     config = config_from_options(args)
     import subprocess
     subprocess.run(['tree', '-a', '-L', '4', config.confs_path])
 
+@takesoptionals()
 def examples_cmd(args):
+    """Usage: confs [options] examples"""
     examples = """# Adding vim configs to be managed by confs:
 # Create conf type named 'vim'.
 $ confs create vim
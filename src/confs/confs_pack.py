@@ -0,0 +1,69 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] pack [--unpack] <identifiers>...
+       confs [options] pack --older-than <days> [--dry-run]
+
+Packs the content of the inactive alts <identifiers> into a single
+compressed archive in each alt. Packed alts are still listed by `show`
+and `query`, and are unpacked when they are enabled or installed.
+
+With --older-than, packs all inactive alts which were not enabled or
+installed (or, if never, not changed) for <days> days, eg. from cron.
+Alts which other alts inherit from are never packed.
+
+Options:
+  -v, --verbose             Verbose output
+  -p, --pretty              Pretty output (formatted output)
+  -t, --terse               Terse output (machine readable)
+  --path <path>             Set custom confs path
+  -u, --unpack              Unpack the alts instead
+  --older-than <days>       Pack the alts unused for <days> days
+  -n, --dry-run             Only show the alts which would be packed
+
+Examples:
+  confs pack vim/old tmux/laptop
+  confs pack --unpack vim/old
+  confs pack --older-than 90
+"""
+
+import sys
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def pack_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    session = Session(config, hooks=False)
+    identifiers = args['<identifiers>']
+    if args['--older-than'] is not None:
+        try:
+            days = float(args['--older-than'])
+        except ValueError:
+            fatal('Invalid number of days `{}`'.format(args['--older-than']))
+        try:
+            identifiers = session.unused(days)
+        except ConfsError as e:
+            fatal('Unable to find unused alts: {}'.format(e))
+        if args['--dry-run']:
+            for identifier in identifiers:
+                print(identifier)
+            return
+
+    failed = False
+    for identifier in identifiers:
+        try:
+            if args['--unpack']:
+                session.unpack(identifier)
+                pprint('Unpacked `{}`'.format(identifier), success=True)
+            else:
+                session.pack(identifier)
+                pprint('Packed `{}`'.format(identifier), success=True)
+        except ConfsError as e:
+            log('Unable to {} `{}`: {}'.format('unpack' if args['--unpack'] else 'pack', identifier, e), warning=True)
+            failed = True
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,53 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] parents [--clear] <identifier> [<parents>...]
+
+Shows or sets the alts the alt <identifier> inherits from. <parents>
+are alts of the same type, or <typename>/<altname> of another type,
+and the first listed takes precedence.
+
+A layered alt has the targets of its parents, and the content of each
+target is taken from the first of the alt and its parents containing
+it, so the alt only has to contain the files it changes. Adding a
+target to the alt overrides the one it inherits.
+
+Options:
+  -v, --verbose         Verbose output
+  -p, --pretty          Pretty output (formatted output)
+  -t, --terse           Terse output (machine readable)
+  --path <path>         Set custom confs path
+  -c, --clear           Remove all parents
+
+Examples:
+  confs parents vim/work stable             # vim/work inherits from vim/stable
+  confs parents vim/work                    # Shows the parents of vim/work
+  confs parents --clear vim/work
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def parents_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    session = Session(config)
+    try:
+        if not args['<parents>'] and not args['--clear']:
+            conf, alt = session.get(args['<identifier>'])
+            for parent in alt.parents:
+                print(parent)
+            return
+        alt = session.set_parents(args['<identifier>'], args['<parents>'])
+    except ConfsError as e:
+        fatal('Unable to set the parents of `{}`: {}'.format(args['<identifier>'], e))
+    if alt.parents:
+        pprint('Set the parents of `{}` to {}'.format(args['<identifier>'], ', '.join(alt.parents)), success=True)
+    else:
+        pprint('Removed the parents of `{}`'.format(args['<identifier>']), success=True)
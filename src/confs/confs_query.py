@@ -0,0 +1,82 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] query [-j] [-s <fields>] [-l <level>] [<expression>...]
+
+Lists the types, alts or targets matching <expression>, one row each.
+The words of <expression> are joined, so it may be quoted as a whole
+or given as several arguments.
+
+Options:
+  -v, --verbose                 Verbose output
+  -p, --pretty                  Pretty output (formatted output)
+  -t, --terse                   Terse output (machine readable)
+  --path <path>                 Set custom confs path
+  -j, --json                    Output one JSON object per line
+  -s, --select <fields>         Comma separated fields to output
+  -l, --level <level>           List types, alts or targets, by default
+                                  the deepest level of the fields used
+
+Fields:
+  type          The name of the type                     (type)
+  enabled_alt   The enabled alt of the type, if any      (type)
+  num_alts      The number of alts of the type           (type)
+  alt           The name of the alt                      (alt)
+  enabled       Whether the alt is enabled               (alt)
+  num_targets   The number of targets of the alt         (alt)
+  path          The path of the alt                      (alt)
+  packed        Whether the content of the alt is packed (alt)
+  target        The name of the target                   (target)
+  dest          The destination of the target            (target)
+  mode          How the target is installed              (target)
+  installed     Whether the target is installed          (target)
+  missing       Whether the content of the target is missing (target)
+  modified      Whether the installed copy was edited    (target)
+
+Expressions:
+  A predicate is a boolean field, or a field, an operator and a value.
+  The operators are = != ^= (prefix) $= (suffix) *= (contains) ~= (glob)
+  and < <= > >=. The prefix of path and dest compares whole components:
+  dest^=~/.vim matches ~/.vim/vimrc but not ~/.vimrc, while the other
+  fields compare strings (type^=vi matches vim). Predicates are combined
+  using and (the default), or, not and parentheses. Values starting with
+  ~/ are expanded to the home directory.
+
+Examples:
+  confs query not installed                # Targets not installed
+  confs query 'not enabled_alt'            # Types without an enabled alt
+  confs query 'dest^=~/.config' -s dest    # Destinations below ~/.config
+  confs query enabled and missing          # Enabled targets without content
+  confs query -l alt 'num_targets=0' -j    # Empty alts, as JSON lines
+"""
+
+import sys
+import json
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def query_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    expression = ' '.join(args['<expression>'])
+    select = [f.strip() for f in args['--select'].split(',') if f.strip()] if args['--select'] else None
+
+    session = Session(config, hooks=False)
+    try:
+        rows = session.query(expression, select=select, level=args['--level'])
+        if args['--json']:
+            for row in rows:
+                print(json.dumps(row))
+        elif ArgFlags.pretty:
+            # Aligning the columns needs all rows
+            rows = list(rows)
+            if rows:
+                print_rows(rows=[list(row.values()) for row in rows], spacing=2, header=list(rows[0]))
+        else:
+            for row in rows:
+                print('\t'.join(str(v) for v in row.values()))
+    except ConfsError as e:
+        fatal('Unable to query `{}`: {}'.format(expression, e))
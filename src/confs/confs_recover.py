@@ -0,0 +1,63 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] recover [-f] [<typenames>...]
+
+Recovers the writes (eg. an install) of all types, or of <typenames>,
+which were interrupted half way by the death of their process, from
+the journal each write keeps until it is complete.
+
+An interrupted write is rolled back by default: the steps it made are
+undone, newest first. With --forward, its remaining steps are applied
+instead, completing it. Either way only the paths in the journal are
+touched. Commands writing or reading a type roll back an interrupted
+write of it by themselves, so this is mostly needed to roll forward.
+
+A step which cannot be recovered (eg. as its path was changed by hand
+since) is reported, and the journal is kept to recover again once it
+was fixed.
+
+Options:
+  -v, --verbose                Verbose output
+  -p, --pretty                 Pretty output (formatted output)
+  -t, --terse                  Terse output (machine readable)
+  --path <path>                Set custom confs path
+  -f, --forward                Complete the interrupted writes instead of rolling them back
+
+Examples:
+  confs recover
+  confs recover --forward vim
+"""
+
+import os
+import sys
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def recover_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    session = Session(config, hooks=False)
+    try:
+        recovered = session.recover(args['<typenames>'], forward=args['--forward'])
+    except ConfsError as e:
+        fatal('Unable to recover: {}'.format(e))
+
+    if not recovered:
+        pprint('No interrupted writes to recover')
+        return
+    failed = False
+    for typename, description, errs in recovered:
+        if errs:
+            failed = True
+            log('Could not recover `{}`:'.format(description), warning=True)
+            for err in errs:
+                log('    {}'.format(err), warning=True)
+        else:
+            pprint('Rolled {} `{}`'.format('forward' if args['--forward'] else 'back', description), success=True)
+    session.release()
+    if failed:
+        sys.exit(1)
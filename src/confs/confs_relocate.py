@@ -0,0 +1,72 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] relocate [-r|-a] [-j <jobs>] [--from <old-path>] <new-path>
+
+Moves the confs path to <new-path> and rewrites all symlinks pointing
+into its old location: the `enabled` symlinks and other symlinks inside
+the tree, and the installed symlinks of the targets.
+
+If the tree was already moved or copied (eg. to another filesystem or
+user), use --from to only rewrite the links, with <new-path> being its
+current location.
+
+Options:
+  -v, --verbose             Verbose output
+  -p, --pretty              Pretty output (formatted output)
+  -t, --terse               Terse output (machine readable)
+  --path <path>             Set custom confs path
+  -r, --relative            Rewrite the links relative to their directory,
+                              and create relative links from now on
+  -a, --absolute            Rewrite the links as absolute paths, and create
+                              absolute links from now on
+  -j, --jobs <jobs>         The number of links to rewrite in parallel
+  --from <old-path>         The tree was already moved from <old-path>
+
+Examples:
+  confs relocate ~/dotfiles/confs
+  confs relocate --relative ~/.confs2
+  confs relocate --from /home/olduser/.confs ~/.confs
+"""
+
+import sys
+
+from confs import relocate
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def relocate_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    jobs = None
+    if args['--jobs']:
+        try:
+            jobs = int(args['--jobs'])
+        except ValueError:
+            jobs = 0
+        if jobs < 1:
+            fatal('Invalid number of jobs `{}`, expected a positive number'.format(args['--jobs']))
+
+    relative = None
+    if args['--relative'] or args['--absolute']:
+        relative = bool(args['--relative'])
+
+    session = Session(config, hooks=False)
+    try:
+        err, result = relocate.relocate(session, args['<new-path>'], old_path=args['--from'],
+                                        relative=relative, jobs=jobs)
+    except ConfsError as e:
+        fatal('Unable to relocate to `{}`: {}'.format(args['<new-path>'], e))
+    if err:
+        fatal('Unable to relocate to `{}`: {}'.format(args['<new-path>'], err))
+
+    for link, err in result.failed:
+        log('{}'.format(err), warning=True)
+    if result.moved:
+        verbose('Moved `{}` to `{}`'.format(result.old_path, result.new_path))
+    pprint('Relocated `{}` to `{}`, rewrote {} links in the tree and {} installed links'.format(
+        result.old_path, result.new_path, result.internal, result.installed), success=not result.failed)
+    if result.failed:
+        sys.exit(1)
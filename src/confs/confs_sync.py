@@ -0,0 +1,40 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] sync <identifier> [<targets>...]
+
+Copies the changes made in place to the installed copies of all, or
+only the specified, materialized targets (see `confs mode`) back into
+the content of the alt identified by <identifier>, which defaults to
+the enabled alt if only a typename is given.
+
+Options:
+  -v, --verbose         Verbose output
+  -p, --pretty          Pretty output (formatted output)
+  -t, --terse           Terse output (machine readable)
+  --path <path>         Set custom confs path
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def sync_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    session = Session(config)
+    try:
+        synced = session.sync(args['<identifier>'], args['<targets>'])
+    except ConfsError as e:
+        fatal('Unable to sync `{}`: {}'.format(args['<identifier>'], e))
+
+    for name, changes in synced.items():
+        for rel, change in changes:
+            verbose('{} {}'.format(change, rel))
+        pprint('Synced {} changed files of target `{}` into `{}`'.format(
+            len(changes), name, args['<identifier>']), success=True)
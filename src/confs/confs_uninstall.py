@@ -1,70 +1,54 @@
 #!/bin/env python3
 
 """
-Usage: confs [options] uninstall <typename> [<targets>...]
+Usage: confs [options] uninstall [--no-hooks] [--force] <typename> [<targets>...]
 
 Uninstalls all, or only the specified targets, of the 
-enabled alt for <typename>.
+enabled alt for <typename>, then runs its post-uninstall hooks.
 
 Options:
   -v, --verbose         Verbose output
   -p, --pretty          Pretty output (formatted output)
   -t, --terse           Terse output (machine readable)
   --path <path>         Set custom confs path          
+  --no-hooks            Do not run any hooks
+  -f, --force           Remove installed copies (see `confs mode`)
+                          even if they were modified in place
 """
 
 import os
 import sys
 from pathlib import Path
-from docopt import docopt
 
-from confs.confslib import *
-import confs.confslib
+from confs.session import Session, ConfsError, NotFoundError
 
 from confs.common import *
 
 def uninstall_cmd(args):
-    args = docopt(__doc__)
     config = config_from_options(args)
     verbose(args)
-    
-    conf = load_conf(args['<typename>'], config)
-    # Uninstall the previous targets (if any)
-    # NOTE: Currently uninstals regardless of whether
-    # its also the one to be installed.
-    if not conf:
-        pprint('Conf type `{}` does not exist!'.format(args['<typename>']), warning=True)
-        return
-    elif not conf.enabled_alt:
-        pprint('Conf type `{}` is not installd!'.format(conf.name), warning=True)
-        return
-        
-    def uninstall_target(target):
-      if not target.is_installed():
-          verbose('Skipping target `{}`, not installed!'.format(target.name))
-          return
 
-      err = target.uninstall()
-      if err:
-          pprint('Uninstallation of target `{}` failed. Skipping.', warning=True)
-      verbose('Uninstalled target: `{}`'.format(target.name))
-      
-    # Uninstall the desired targets
-    if args['<targets>']:
-        # Make sure all the specified targets exists.
-        missing = []
-        targetnames = [target.name for target in conf.enabled_alt.targets]
-        for targetname in args['<targets>']:
-            if targetname not in targetnames:
-                missing.append(targetname)
-        if len(missing) > 0:
-            fatal('Was unable to find targets for alt `{}`: {}'.format(conf.enabled_alt.name, targetnames))
-        # Do the uninstall
-        for target in conf.enabled_alt.targets:
-            if target.name in args['<targets>']:
-                uninstall_target(target)
-    else:
-        for target in conf.enabled_alt.targets:
-            uninstall_target(target)
+    session = Session(config, hooks=not args['--no-hooks'])
+    try:
+        result = session.uninstall(args['<typename>'], args['<targets>'],
+                                   force=args['--force'], on_drift=resolve_drift)
+    except NotFoundError as e:
+        if e.identifier == args['<typename>']:
+            pprint('Conf type `{}` does not exist!'.format(args['<typename>']), warning=True)
+            return
+        fatal('Was unable to find targets: {}'.format(e))
+    except ConfsError as e:
+        pprint('{}'.format(e), warning=True)
+        return
 
-    pprint('Uninstalled `{}/{}`'.format(conf.enabled_alt.name, args['<typename>']), success=True)
+    for name in result.skipped:
+        verbose('Skipping target `{}`, not installed!'.format(name))
+    for name, err in result.failed.items():
+        pprint('Uninstallation of target `{}` failed: {}. Skipping.'.format(name, err), warning=True)
+    for name in result.done:
+        verbose('Uninstalled target: `{}`'.format(name))
+
+    pprint('Uninstalled `{}`'.format(result.identifier), success=True)
+    # Hooks may run confs themselves
+    session.release()
+    run_hooks(session.hooks)
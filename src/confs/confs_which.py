@@ -0,0 +1,53 @@
+#!/bin/env python3
+
+"""
+Usage: confs [options] which <paths>...
+
+Shows which type/alt/target owns each of <paths>: the targets with the
+longest destination equal to or containing the path, or the target
+whose content contains it. Answered from the cached reverse index of
+destinations, without loading the tree.
+
+Exits with 1 if any of <paths> is not owned by a target.
+
+Options:
+  -v, --verbose         Verbose output
+  -p, --pretty          Pretty output (formatted output)
+  -t, --terse           Terse output (machine readable)
+  --path <path>         Set custom confs path
+
+Examples:
+  confs which ~/.config/nvim/init.lua
+  confs which ~/.confs/vim/default/vimrc
+"""
+
+import sys
+
+from confs.session import Session, ConfsError
+
+from confs.common import *
+
+def which_cmd(args):
+    config = config_from_options(args)
+    verbose(args)
+
+    session = Session(config, hooks=False)
+    not_found = False
+    for path in args['<paths>']:
+        try:
+            owners = session.which(path)
+        except ConfsError as e:
+            fatal('Unable to look up `{}`: {}'.format(path, e))
+        if not owners:
+            log('`{}` is not owned by any target'.format(path))
+            not_found = True
+            continue
+
+        rows = [['{}/{}'.format(o['type'], o['alt']), o['target'], o['dest'], o['kind'],
+                 'enabled' if o['enabled'] else ''] for o in owners]
+        if len(args['<paths>']) > 1:
+            pprint('{}:'.format(path), header=True)
+        print_rows(rows=rows, spacing=2, header=['Alt', 'Target', 'Dest', 'Kind', 'Enabled'],
+                   enabled_rows=[i for i, o in enumerate(owners) if o['enabled']])
+    if not_found:
+        sys.exit(1)
@@ -33,8 +33,10 @@
 """
 import sys
 import os
-import argparse
 from pathlib import Path
+
+from confs import index
+from confs.fs import OSBackend
     
 class Err:
     """Class used to represent Go-like errors."""
@@ -69,28 +71,81 @@ class InvAltNameErr(Err):
     pass
 class InvTargetNameErr(Err):
     pass
+class DriftErr(Err):
+    pass
+class InvQueryErr(Err):
+    pass
+class DestConflictErr(Err):
+    pass
+class LockErr(Err):
+    pass
+
+def log(fargs, *args, **kwargs):
+    # Imported here, as confs.common imports this module
+    from confs.common import log
+    log(fargs, *args, **kwargs)
+
+def verbose(fargs, *args, **kwargs):
+    from confs.common import verbose
+    verbose(fargs, *args, **kwargs)
 
 class Config:
     confs_path = Path(Path.home(), '.confs') # The path to store the configs in
-    enabled_link_name = 'enabled'            # The name to use for the 'enabled' symlink
-    targets_dir_name = 'targets'             # The directory containing targets
-    excluded_conf_types = ['.git']           # ConfType names to exclude
-    excluded_alts = ['.git', enabled_link_name] # Alt names to exclude
+    lower_paths = []                         # The lower repositories of a union, by precedence, see confs.union
+    enabled_link_name = index.ENABLED_LINK_NAME # The name to use for the 'enabled' symlink
+    targets_dir_name = index.TARGETS_DIR_NAME # The directory containing targets
+    cache_dir_name = index.CACHE_DIR_NAME    # The directory containing caches (eg. the listing)
+    state_dir_name = index.STATE_DIR_NAME    # The directory containing state (eg. manifests)
+    hooks_dir_name = 'hooks'                 # The directory containing type and alt hooks
+    alt_meta_name = index.ALT_META_NAME      # The file containing alt metadata (eg. target modes)
+    pack_name = 'content.tar.xz'             # The archive of the content of a packed alt, see confs.pack
+    excluded_conf_types = ['.git', cache_dir_name, state_dir_name] # ConfType names to exclude
+    excluded_alts = ['.git', enabled_link_name, hooks_dir_name] # Alt names to exclude
     excluded_altfiles = ['.git']    # Alt filenames to exclude
     
+    hook_timeout = 30  # Seconds before a hook is killed
+    hook_jobs = 8      # The maximum number of hooks to run in parallel
+    jobs = 8           # The maximum number of parallel file operations (eg. migrate)
+    lock_timeout = 30  # Seconds to wait for the lock of a type, see confs.locks
+    relative_links = False # Write relative symlinks, so the tree can be moved (see confs relocate)
+    secret_key = None      # The key file of secret targets, by default ~/.config/confs/secret.key (see confs.secret)
+    secret_cache = None    # The decrypt cache of secret targets, by default in $XDG_RUNTIME_DIR or /dev/shm
+    settings_name = 'settings.json' # The file (in the state directory) storing settings of the tree
+    settings = ('relative_links', 'secret_key', 'secret_cache') # The attributes stored in the settings file
+
+    fs = OSBackend()   # The filesystem backend used for all access to the tree, see confs.fs
+
     use_colors = True
     
     def __init__(self, confs_path=confs_path, excluded_conf_types=excluded_conf_types, 
                  excluded_alts=excluded_alts, excluded_altfiles=excluded_altfiles, 
                  enabled_link_name=enabled_link_name, targets_dir_name=targets_dir_name,
-                 use_colors=use_colors):
-        self.confs_path = confs_path
+                 cache_dir_name=cache_dir_name, state_dir_name=state_dir_name,
+                 hooks_dir_name=hooks_dir_name, alt_meta_name=alt_meta_name, pack_name=pack_name, hook_timeout=hook_timeout, hook_jobs=hook_jobs, jobs=jobs, lock_timeout=lock_timeout, relative_links=relative_links, secret_key=secret_key, secret_cache=secret_cache, use_colors=use_colors, fs=fs):
+        self.set_path(confs_path)
         self.excluded_conf_types = excluded_conf_types
         self.excluded_alts = excluded_alts
         self.excluded_altfiles = excluded_altfiles
         self.enabled_link_name = enabled_link_name
         self.targets_dir_name = targets_dir_name
+        self.cache_dir_name = cache_dir_name
+        self.state_dir_name = state_dir_name
+        self.hooks_dir_name = hooks_dir_name
+        self.alt_meta_name = alt_meta_name
+        self.pack_name = pack_name
+        self.hook_timeout = hook_timeout
+        self.hook_jobs = hook_jobs
+        self.jobs = jobs
+        self.lock_timeout = lock_timeout
+        self.relative_links = relative_links
+        self.secret_key = secret_key
+        self.secret_cache = secret_cache
         self.use_colors = use_colors
+        self.fs = fs
+        self.dests = None  # The reverse index of destinations once loaded, see index.load_dests()
+        self.linker = None # The open destination directories of the targets of a batch, see confs.linker
+        self.layers = None # The resolved layers of layered alts once loaded, see layers.load_cache()
+        self.repo_listings = {} # Lower repository -> (listing, stamp) once validated, see confs.union
         
     
     def getall(self):
@@ -114,15 +169,76 @@ class Config:
         except AttributeError:
             return False
         return True
-        
+
+    def set_path(self, value):
+        """
+        Sets confs_path, and the lower repositories of a union if value is a
+        list of paths or a string of paths separated by os.pathsep.
+        """
+        if isinstance(value, str) and os.pathsep in value:
+            value = value.split(os.pathsep)
+        if isinstance(value, (list, tuple)):
+            paths = [Path(p) for p in value if str(p)]
+            self.confs_path, self.lower_paths = paths[0], paths[1:]
+        else:
+            self.confs_path, self.lower_paths = value, []
+
+    def repos(self) -> list:
+        """Returns the paths of the repositories of the tree by precedence, confs_path first."""
+        return [Path(self.confs_path)] + list(self.lower_paths)
+
+    def settings_path(self) -> Path:
+        return Path(self.confs_path, self.state_dir_name, self.settings_name)
+
+    def load_settings(self) -> Err:
+        """Applies the settings stored in the tree (eg. by confs relocate), if any."""
+        try:
+            text = self.fs.read_text(self.settings_path())
+            import json
+            settings = json.loads(text)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            return IncDataErr('Invalid settings `{}`: {}'.format(self.settings_path(), e))
+        for key in self.settings:
+            if key in settings:
+                setattr(self, key, settings[key])
+        return None
+
+    def save_settings(self) -> Err:
+        """Stores the settings of the config in the tree."""
+        import json
+        path = self.settings_path()
+        try:
+            self.fs.mkdir(path.parent, parents=True, exist_ok=True)
+            self.fs.write_text(path, json.dumps({key: getattr(self, key) for key in self.settings},
+                                                indent=1, sort_keys=True))
+        except OSError as e:
+            return IncDataErr('Could not write settings `{}`: {}'.format(path, e))
+        return None
+
+def link_to(config, link_path, target) -> Path:
+    """
+    Returns the path a symlink at link_path should contain to point to
+    target: relative to the directory of the link if config.relative_links.
+    """
+    target = os.path.abspath(str(target))
+    if config.relative_links:
+        return Path(os.path.relpath(target, os.path.dirname(os.path.abspath(str(link_path)))))
+    return Path(target)
+
 
 class ConfType:
-    def __init__(self, name: str, enabled_alt=None, alts=[], config: Config = Config(), path=None):
+    def __init__(self, name: str, enabled_alt=None, alts=None, config: Config = Config(), path=None):
         self.name = name                # The name of the type (eg. vim)
         self.enabled_alt = enabled_alt  # The Alt instance that is the enabled alternative
-        self.alts = alts                # The list of Alt instances which this ConfType contains
+        self.alts = alts if alts is not None else [] # The list of Alt instances which this ConfType contains
         self.config = config            # The config options used
         self.path = path                # The path to the current ConfType
+
+        # The state on disk as of the last load or save, so save() only writes changes
+        self.saved = False              # True if the type directory exists
+        self.saved_enabled = None       # The name of the alt the enabled symlink points to
     
     def __repr__(self):
         return '<ConfType name="{}" alts="{}" enabled_alt="{}">'.format(self.name, self.alts, self.enabled_alt) 
@@ -132,7 +248,7 @@ class ConfType:
         Returns True if the ConfType itself exists 
         in the filesystem, else False.
         """
-        return self.path.exists() if self.path else False
+        return self.config.fs.exists(self.path) if self.path else False
     
     def get_alt_by_name(self, altname: str):
         for alt in self.alts:
@@ -172,34 +288,51 @@ class ConfType:
         return None, alt
         
 
+    def is_dirty(self) -> bool:
+        """Returns True if the type differs from what was last loaded or saved."""
+        enabled = self.enabled_alt.name if self.enabled_alt else None
+        return not self.saved or enabled != self.saved_enabled or any(alt.is_dirty() for alt in self.alts)
+
     def save(self) -> Err:
         """
         Save the ConfType by creating the necessary 
-        directories, files and links.
+        directories, files and links. Only what changed since
+        the type was loaded or last saved is written.
         """
         if self.name in self.config.excluded_conf_types:
             return InvTypenameErr('Type name `{}` invalid (in excluded list)'.format(self.name))
+        if not self.is_dirty():
+            return None
+
+        fs = self.config.fs
 
         # Create the config type directory itself if needed
-        if not self.exists():
+        if not self.saved and not self.exists():
             if not self.path:
                 self.path = Path(self.config.confs_path, self.name)
             try:
-                self.path.mkdir()
+                fs.mkdir(self.path)
             except PermissionError as pe:
-                return PermErr('Permission error for `{}`: `{}``'.format(self.name, pe))
+                return MkdirErr('Permission error for `{}`: `{}``'.format(self.name, pe))
+        self.saved = True
 
-        # Save all alts
+        # Save the new and changed alts
         for alt in self.alts:
+            if not alt.is_dirty():
+                continue
             err = alt.save()
             if err:
                 return err
-            
+
+        enabled = self.enabled_alt.name if self.enabled_alt else None
+        if enabled == self.saved_enabled:
+            return None
+
         # Update the enabled symlink, potentially removing it
         enabled_path = Path(self.path, self.config.enabled_link_name).absolute()
-        enabled_target = Path(self.path, enabled_path.resolve().stem).absolute() if enabled_path.is_symlink() else None
+        enabled_target = Path(self.path, fs.resolve(enabled_path).stem).absolute() if fs.is_symlink(enabled_path) else None
         
-        if enabled_path.exists() and not enabled_target:
+        if fs.exists(enabled_path) and not enabled_target:
             # It exists, but is not a symlink. Error.
             return ExpSymlinkErr('`{}` is not a symlink!'.format(enabled_path))
 
@@ -209,31 +342,39 @@ class ConfType:
             
         if new_enabled_target != enabled_target:
             # Target has changed.
-            if enabled_path and enabled_path.exists():
+            if enabled_path and fs.lexists(enabled_path):
                 # Unlink if it exists
-                enabled_path.unlink()
+                fs.unlink(enabled_path)
             if new_enabled_target:
                 # Only symlink if not None
-                enabled_path.symlink_to(new_enabled_target)
+                fs.symlink(enabled_path, link_to(self.config, enabled_path, new_enabled_target))
+        from confs import events
+        events.append(self.config, 'enable', type=self.name, alt=enabled, previous=self.saved_enabled)
+        self.saved_enabled = enabled
+        index.invalidate(self.config)
         return None
         
     @staticmethod
-    def from_conf_path(path: Path, config: Config = Config()):
+    def load_alts(path: Path, config: Config = Config(), require_enabled=True):
         """
-        Returns a ConfType instances 
-        instantiated from a filesystem path.
+        Returns (err, alts, enabled) of the type directory at path, where enabled
+        is the name of the alt its enabled symlink points to, or None if missing
+        (which is an error if require_enabled).
         """
+        fs = config.fs
         enabled_path = Path(path, config.enabled_link_name)
-        if not enabled_path.exists():
-            return (MkLinkErr('Enabled symlink not found: `{}`'.format(enabled_path)), None)
-        elif not enabled_path.is_symlink():
-            return (ExpSymlinkErr('Enabled-file is not a symlink: `{}`'.format(enabled_path)), None)
-        enabled_resolved_stem = enabled_path.resolve().stem
-        
+        enabled = None
+        if not fs.exists(enabled_path):
+            if require_enabled:
+                return (MkLinkErr('Enabled symlink not found: `{}`'.format(enabled_path)), None, None)
+        elif not fs.is_symlink(enabled_path):
+            return (ExpSymlinkErr('Enabled-file is not a symlink: `{}`'.format(enabled_path)), None, None)
+        else:
+            enabled = fs.resolve(enabled_path).stem
+
         alts = []
-        enabled_alt = None
-        for p in path.iterdir():
-            if not p.is_dir():
+        for p in fs.iterdir(path):
+            if not fs.is_dir(p):
                 log('Skipping alt `{}`, as it is not a directory!'.format(p.stem))
                 continue
             if p.stem in config.excluded_alts:
@@ -242,35 +383,96 @@ class ConfType:
 
             err, alt = Alt.from_alt_path(p, config=config)
             if err:
-                return (Err('Alt `{}` at `{}` is invalid: `{}`, skipping!'.format(p.stem, p, err)), None)
-            else:
-                if p.stem == enabled_resolved_stem:
-                    enabled_alt = alt
-                alts.append(alt)
-        return (None, ConfType(path.stem, enabled_alt=enabled_alt, alts=alts, config=config, path=path))
+                return (Err('Alt `{}` at `{}` is invalid: `{}`, skipping!'.format(p.stem, p, err)), None, None)
+            alts.append(alt)
+        return (None, alts, enabled)
+
+    @staticmethod
+    def from_alts(name: str, alts: list, enabled: str, config: Config = Config(), path=None):
+        """Returns (err, ConfType) of the loaded alts, resolving their layers."""
+        # Layered alts inherit from the (already loaded) alts of the type
+        from confs import layers
+        siblings = {alt.name: alt for alt in alts}
+        for alt in alts:
+            err = layers.resolve(alt, siblings)
+            if err:
+                return (Err('Alt `{}` at `{}` is invalid: `{}`, skipping!'.format(alt.name, alt.path, err)), None)
+        enabled_alt = siblings.get(enabled) if enabled else None
+        conf = ConfType(name, enabled_alt=enabled_alt, alts=alts, config=config, path=path)
+        conf.saved = True
+        conf.saved_enabled = enabled
+        return (None, conf)
+
+    @staticmethod
+    def from_conf_path(path: Path, config: Config = Config()):
+        """
+        Returns a ConfType instances 
+        instantiated from a filesystem path.
+        """
+        if config.lower_paths:
+            # Merged from all repositories containing the type
+            from confs import union
+            return union.load_type(config, path.stem)
+        err, alts, enabled = ConfType.load_alts(path, config)
+        if err:
+            return (err, None)
+        return ConfType.from_alts(path.stem, alts, enabled, config=config, path=path)
 
 class Alt:
-    def __init__(self, name: str, conf_type=None, contents=[], missing_contents=[], targets=[], config: Config = Config(), path=None, **kwargs):
+    def __init__(self, name: str, conf_type=None, contents=None, missing_contents=None, targets=None, config: Config = Config(), path=None, **kwargs):
         self.name = name      # The alt name
         self.config = config  # The config to use
-        self.contents = contents
-        self.missing_contents = missing_contents
-        self.targets = targets
+        self.contents = contents if contents is not None else []
+        self.missing_contents = missing_contents if missing_contents is not None else []
+        self.targets = targets if targets is not None else []
         self.conf_type = conf_type
         self.path = path
+        self.meta = {}        # The metadata loaded from the alt_meta_name file
+        self.parents = []     # The alts this alt inherits from, as altname or typename/altname
+        self.last_used = None # The unix time the alt was last enabled or installed, if known
+        self.packed = False   # True if the content is packed into an archive, see confs.pack
+
+        # The state on disk as of the last load or save, so save() only writes changes
+        self.saved = False           # True if the alt and targets directories exist
+        self.saved_targets = set()   # The names of the targets with a symlink in the targets directory
         
     def __repr__(self):
         return '<Alt name="{}" contents="{}" missing_contents="{}" conf_type="{}" targets="{}">'.format(
             self.name, self.contents, self.missing_contents, self.conf_type, self.targets
         )
     
-    def add_target(self, name: str, target: Path):
-        """Adds a new target to the alt"""
+    @property
+    def typename(self) -> str:
+        """The name of the type of the alt."""
+        return self.conf_type.name if self.conf_type else Path(self.path).parent.stem
+
+    @property
+    def read_only(self) -> bool:
+        """True if the alt is in a lower repository of a union, which is never written to (see confs.union)."""
+        if not self.config.lower_paths or not self.path:
+            return False
+        return index.normpath(Path(self.path).parent.parent) != index.normpath(self.config.confs_path)
+
+    def add_target(self, name: str, target: Path, write_now=True, mode='symlink'):
+        """
+        Adds a new target to the alt, unless its destination conflicts with
+        another target. If write_now == False, the target is only written
+        by the next call to self.save().
+        """
+        conflicts = index.load_dests(self.config).conflicts(target, self.typename, self.name, name, mode=mode)
+        if conflicts:
+            dest, owner = conflicts[0]
+            return DestConflictErr('Destination `{}` conflicts with `{}` of `{}`'.format(
+                target, dest, '/'.join(owner))), None
+
         target_path = Path(self.path, self.config.targets_dir_name, name)
-        target = Target(name=name, target=target, path=target_path, alt=self, config=self.config)
-        err = target.save()
-        if err:
-            return err, None
+        target = Target(name=name, target=target, path=target_path, alt=self, config=self.config, mode=mode)
+        if write_now:
+            err = target.save()
+            if err:
+                return err, None
+        # Overrides the target inherited from a parent, if any
+        self.targets = [t for t in self.targets if not (t.inherited and t.name == name)]
         self.targets.append(target)
         return None, target
     
@@ -287,29 +489,37 @@ class Alt:
         err, target = self.get_target_by_name(name)
         if err:
             return err
+        if target.inherited:
+            return InvOperErr('Target `{}` is inherited from `{}`, it can only be removed there'.format(
+                name, Path(target.path).parent.parent))
         err = target.delete(write_now=True)
         if err:
             return err
         self.targets.remove(target)
+        self.saved_targets.discard(target.name)
         if write_now:
             return self.save()
         return None, target
     
-    def install(self, logfile=None):
+    def install(self, logfile=None, force=False):
         """Install/set symlinks as defined by self.targets."""
         for target in self.targets:
             # assume that contents are in this directory (at self.path)
             #content_path = Path(self.path, target.name)
             if logfile:
                 print('Installing target: `{}` --> `{}`'.format(target.name, target.target), file=logfile)
-            err = target.install()
+            err = target.install(force=force)
             if err:
                 return err
         return None
 
-    def uninstall(self, logfile=None):
-        """Uninstall/remove symlinks as defined by self.targets."""
+    def uninstall(self, logfile=None, force=False, keep=()):
+        """Uninstall/remove symlinks as defined by self.targets, except the targets named in keep."""
         for target in self.targets:
+            if target.name in keep:
+                if logfile:
+                    print('Keeping target: `{}` --> `{}`, unchanged'.format(target.name, target.target), file=logfile)
+                continue
             # assume that contents are in this directory (at self.path)
             if not target.is_installed():
                 if logfile:
@@ -317,7 +527,7 @@ class Alt:
                 continue
             if logfile:
                 print('Uninstalling target: `{}` --> `{}`'.format(target.name, target.target), file=logfile)
-            err = target.uninstall()
+            err = target.uninstall(force=force)
             if err:
                 return err
         return None
@@ -328,42 +538,147 @@ class Alt:
         if not self.path:
             self.path = Path(self.conf_type.path, self.name)
             
+        fs = self.config.fs
+        dirty = self.is_dirty()
+        if not self.saved:
+            err = self.create_dirs()
+            if err:
+                return err
+            self.saved = True
+            index.invalidate(self.config)
+
+        # Remove the symlinks of targets no longer part of the alt
+        names = self.own_target_names()
+        removed = self.saved_targets - names
+        for name in sorted(removed):
+            path = Path(self.path, self.config.targets_dir_name, name)
+            if fs.is_symlink(path):
+                fs.unlink(path)
+        if removed:
+            index.invalidate(self.config)
+
+        # Save the new and changed targets
+        for t in self.targets:
+            if not t.is_dirty():
+                continue
+            err = t.save()
+            if err:
+                return err
+        # Saving a changed inherited target makes it part of the alt
+        self.saved_targets = self.own_target_names()
+
+        err = self.save_meta()
+        if err:
+            return err
+
+        if dirty:
+            from confs import events
+            events.append(self.config, 'save', type=self.typename, alt=self.name)
+        # TODO Save all contents
+        return None 
+
+    def is_dirty(self) -> bool:
+        """Returns True if the alt differs from what was last loaded or saved."""
+        return (not self.saved
+                or self.saved_targets != self.own_target_names()
+                or any(t.is_dirty() for t in self.targets)
+                or self.collect_meta() != self.meta)
+
+    def own_target_names(self) -> set:
+        """Returns the names of the targets declared by the alt itself, and not inherited."""
+        return set(t.name for t in self.targets if not t.inherited)
+
+    def create_dirs(self) -> Err:
+        """Creates the directory of the alt and its targets directory, if missing."""
+        fs = self.config.fs
+
         # Create directory for the current alt if not yet created
-        if not self.path.is_dir():
-            if self.path.exists():
+        if not fs.is_dir(self.path):
+            if fs.lexists(self.path):
                 # Path exists, but is not a directory.
                 # Continuing could result in data loss.
                 return ExpDirErr('Alt path `{}` is not a directory'.format(self.path))
 
             try:
-                self.path.mkdir()
+                fs.mkdir(self.path)
             except PermissionError as pe:
                 return MkdirErr('Could not create directory `{}`: `{}`!'
                                  .format(self.path, pe))
         
         # Create directory for targets if not yet existing
         targets_path = Path(self.path, self.config.targets_dir_name)
-        if not targets_path.is_dir():
-            if targets_path.exists():
+        if not fs.is_dir(targets_path):
+            if fs.lexists(targets_path):
                 return ExpDirErr('Targets path `{}` is not a directory'.format(self.path))
 
             try:
-                targets_path.mkdir()
+                fs.mkdir(targets_path)
             except PermissionError as pe:
                 return MkdirErr('Could not create directory `{}`: `{}`!'
                                  .format(targets_path, pe))
+        return None
+        
+    def load_meta(self) -> Err:
+        """Loads the metadata of the alt and applies it to its targets."""
+        meta_path = Path(self.path, self.config.alt_meta_name)
+        self.meta = {}
+        if self.config.fs.is_file(meta_path):
+            # Only imported when needed, see confs.cli
+            import json
+            try:
+                self.meta = json.loads(self.config.fs.read_text(meta_path))
+            except (OSError, ValueError) as e:
+                return IncDataErr('Invalid alt metadata `{}`: {}'.format(meta_path, e))
 
-        # Save all targets
+        target_meta = self.meta.get('targets', {})
         for t in self.targets:
-            err = t.save()
-            if err:
-                return err
-            
-        # TODO Save all contents
-        
+            t.set_meta(target_meta.get(t.name, {}))
+        self.parents = list(self.meta.get('parents', []))
+        self.last_used = self.meta.get('last_used')
+        return None
+
+    def collect_meta(self) -> dict:
+        """Returns the metadata of the alt, including the current metadata of its targets."""
+        meta = dict(self.meta)
+        target_meta = {t.name: t.get_meta() for t in self.targets if not t.inherited and t.get_meta()}
+        if target_meta:
+            meta['targets'] = target_meta
+        else:
+            meta.pop('targets', None)
+        if self.parents:
+            meta['parents'] = list(self.parents)
+        else:
+            meta.pop('parents', None)
+        if self.last_used:
+            meta['last_used'] = self.last_used
+        else:
+            meta.pop('last_used', None)
+        return meta
+
+    def save_meta(self) -> Err:
+        """Writes the metadata of the alt, if it has changed."""
+        meta = self.collect_meta()
+        if meta == self.meta:
+            return None
+
+        import json
+        fs = self.config.fs
+        meta_path = Path(self.path, self.config.alt_meta_name)
+        try:
+            if meta:
+                # Replaced as a whole, so an interrupted write leaves the old metadata
+                tmp_path = Path(self.path, self.config.alt_meta_name + '.confs-tmp')
+                fs.write_text(tmp_path, json.dumps(meta, indent=1, sort_keys=True))
+                fs.replace(tmp_path, meta_path)
+            elif fs.is_file(meta_path):
+                fs.unlink(meta_path)
+        except OSError as e:
+            return IncDataErr('Could not write alt metadata `{}`: {}'.format(meta_path, e))
+        self.meta = meta
+        # The cached destinations record the modes of the targets
+        index.invalidate(self.config)
+        return None
 
-        return None 
-        
     @staticmethod
     def from_alt_path(path: Path, *args, config=Config(), conf_type=None, **kwargs):
         """
@@ -376,16 +691,25 @@ class Alt:
         
         if err:
             return err, alt
+
+        err = alt.load_meta()
+        if err:
+            return err, alt
+        alt.saved = True
+        alt.saved_targets = set(t.name for t in alt.targets)
         
         #conf_type = kwargs['conf_type'] if 'conf_type' in kwargs else None
         conf_type_name = conf_type.name if conf_type else None
         
+        # The content of a packed alt exists once it is unpacked
+        alt.packed = config.fs.is_file(Path(path, config.pack_name))
+
         # Make sure the targets exists
         missing_contents = []
         contents = []
         for t in alt.targets:
             content_path = Path(path, t.name)
-            if not content_path.exists():
+            if not alt.packed and not config.fs.exists(content_path):
                 #log('Content `{}`, declared by target `{}` is missing for type `{}` at `{}`'.format(
                 #    content_path, t.target, conf_type_name, content_path
                 #), warning=True)
@@ -401,46 +725,100 @@ class Alt:
 # TODO: Only execute actions on call to save()
 class Target:
     # Example Target('vim', Alt('vim', ...), Path(Path.home(), '.vim'))
-    def __init__(self, name: str, target: Path, alt: Alt = None, config=Config(), path=None):
+    def __init__(self, name: str, target: Path, alt: Alt = None, config=Config(), path=None, mode='symlink'):
         self.name = name     # The name of the target (filename in .confs/alt/)
         self.alt = alt       # The alt which this is a part of
         self.target = target # The target path -> to install the file'
         self.config = config
         self.path = path     # The path to this target symlink
+        self.mode = mode     # How to install: symlink, copy, hardlink, reflink, stow or secret
+        self.inherited = False # True if declared by a parent of the alt (see confs.layers)
+        self.layer = None      # The path of the layer containing the content, if not the alt
 
-        self.delete = False  # Is set to true when the next call to
+        self.deleted = False # Is set to true when the next call to
                              # save() should delete this target
+        self.saved_dest = None # The destination of the targets symlink on disk, if any
 
     def __repr__(self):
         return '<Target name="{}" target="{}" path="{}" alt="{}">'.format(self.name, self.target, self.path, self.alt)
     
     def default_content_path(func):
-        def wrapper(*args, **kwargs):
-            if len(args) < 2 or not args[1]:
-                #log('wrapped {}: {} No content_path was provided, calculating using alt'.format(func.__name__, args[0].path), warning=True)
-                return func(args[0], Path(args[0].alt.path, args[0].name, **kwargs))
-            else:
-                func(*args, **kwargs)
+        def wrapper(self, content_path=None, **kwargs):
+            if not content_path:
+                content_path = self.content_path()
+            return func(self, content_path, **kwargs)
         return wrapper
 
+    def content_path(self) -> Path:
+        """Returns the path of the content of the target, which may be in a parent of the alt."""
+        return Path(self.layer or self.alt.path, self.name)
+
     def set_default_path(func):
-        def wrapper(*args):
+        def wrapper(*args, **kwargs):
             if not args[0].path:
                 args[0].path = Path(args[0].alt.path, args[0].config.targets_dir_name, args[0].name)
-            return func(*args)
+            return func(*args, **kwargs)
         return wrapper
+
+    def get_meta(self) -> dict:
+        """Returns the metadata to store for the target in the alt metadata."""
+        meta = {}
+        if self.mode != 'symlink':
+            meta['mode'] = self.mode
+        return meta
+
+    def set_meta(self, meta: dict):
+        self.mode = meta.get('mode', 'symlink')
+
+    def is_materialized(self) -> bool:
+        """Returns True if the target is installed by copying instead of symlinking."""
+        return self.mode not in ('symlink', 'stow', 'secret')
     
+    def install(self, content_path=None, force=False):
+        """Installs the target (see _install), recording it in the change feed."""
+        err = self._install(content_path, force=force)
+        if not err:
+            self.record('install')
+        return err
+
+    def uninstall(self, content_path=None, force=False):
+        """Uninstalls the target (see _uninstall), recording it in the change feed."""
+        err = self._uninstall(content_path, force=force)
+        if not err:
+            self.record('uninstall')
+        return err
+
+    def record(self, event):
+        """Appends event of the target to the change feed, see confs.events."""
+        from confs import events
+        events.append(self.config, event, type=self.alt.typename, alt=self.alt.name, target=self.name,
+                      dest=str(Path(self.target).absolute()), mode=self.mode)
+
     @set_default_path
     @default_content_path
-    def install(self, content_path=None):
+    def _install(self, content_path=None, force=False):
         """Creates a symlink at target pointing to the altfile 'name'"""
-        if self.target.is_symlink():
-            self.target.unlink()
-        elif self.target.exists():
+        if self.mode == 'stow':
+            from confs import stow
+            return stow.install(self, content_path, force=force)
+        if self.mode == 'secret':
+            from confs import secret
+            return secret.install(self, content_path, force=force)
+        if self.is_materialized():
+            from confs import materialize
+            return materialize.install(self, content_path, force=force)
+
+        linker = self.config.linker
+        if linker and linker.at(self):
+            return linker.install(self, content_path)
+        fs = self.config.fs
+        if fs.is_symlink(self.target):
+            fs.unlink(self.target)
+        elif fs.exists(self.target):
             return ExpSymlinkErr('Target dest path `{}` already exists but is not a symlink.'.format(self.target.absolute()))
         
-        # NOTE: Uses absolute paths
-        self.target.absolute().symlink_to(content_path.absolute())
+        # NOTE: Uses absolute paths, unless config.relative_links
+        fs.symlink(self.target.absolute(), link_to(self.config, self.target.absolute(), content_path))
         return None
         
     @set_default_path
@@ -453,64 +831,145 @@ class Target:
         if not self.path:
             self.path = Path(self.alt.path, self.config.targets_dir_name, self.name)
 
-        if self.target.is_symlink():
+        if self.mode == 'stow':
+            from confs import stow
+            return stow.is_installed(self, content_path)
+        if self.mode == 'secret':
+            from confs import secret
+            return secret.is_installed(self, content_path)
+        if self.is_materialized():
+            from confs import materialize
+            return materialize.is_installed(self, content_path)
+
+        linker = self.config.linker
+        if linker and linker.at(self):
+            return linker.is_installed(self, content_path)
+        fs = self.config.fs
+        if fs.is_symlink(self.target):
             # Make sure that this target is already installed.
             # This is done by checking if the target resolves to content.
-            return self.target.resolve().samefile(content_path)
+            return fs.exists(content_path) and fs.samefile(fs.resolve(self.target), content_path)
         return False
         
     @set_default_path
     @default_content_path
-    def uninstall(self, content_path=None):
+    def _uninstall(self, content_path=None, force=False):
         """Removes the symlink at target IF it is installed."""
-        if self.target.is_symlink():
+        if self.mode == 'stow':
+            from confs import stow
+            return stow.uninstall(self, content_path, force=force)
+        if self.mode == 'secret':
+            from confs import secret
+            return secret.uninstall(self, content_path, force=force)
+        if self.is_materialized():
+            from confs import materialize
+            return materialize.uninstall(self, content_path, force=force)
+
+        linker = self.config.linker
+        if linker and linker.at(self):
+            return linker.uninstall(self, content_path)
+        fs = self.config.fs
+        if fs.is_symlink(self.target):
             # Make sure that this target is already installed.
             # This is done by checking if the target resolves to content.
-            if not self.target.resolve().samefile(content_path):
+            if not fs.samefile(fs.resolve(self.target), content_path):
                 return IncDataErr('Target: {} is not installed, cannot uninstall!'.format(self.path))
-            self.target.unlink()
+            fs.unlink(self.target)
         else:
             return InvOperErr('Target `{}` is not installed!'.format(self.path))
         return None
     
+    @set_default_path
+    @default_content_path
+    def drift(self, content_path=None):
+        """
+        Returns a list of (relpath, change) of the files of a materialized
+        target which were edited in place since it was installed.
+        """
+        if not self.is_materialized():
+            return []
+        from confs import materialize
+        return materialize.drift(self, content_path)
+
+    @set_default_path
+    @default_content_path
+    def sync_back(self, content_path=None):
+        """Copies the in place edits of a materialized target back into the content."""
+        if not self.is_materialized():
+            return InvOperErr('Target `{}` is not materialized, nothing to sync'.format(self.name))
+        from confs import materialize
+        return materialize.sync_back(self, content_path)
+    
     def delete(self, write_now=False):
         """Removes the target from the filesystem."""
-        self.delete = True
+        self.deleted = True
         if write_now:
             return self.save()
         return None
     
     @set_default_path
+    def is_dirty(self) -> bool:
+        """Returns True if the targets symlink has to be written (or deleted)."""
+        return self.deleted or self.saved_dest is None or Path(self.saved_dest) != Path(self.target)
+
     def save(self):
-        """Saves a target"""
-        if self.delete:
+        """Saves a target, only writing its symlink if it changed"""
+        if not self.is_dirty():
+            return None
+        fs = self.config.fs
+        if self.inherited:
+            # A changed inherited target overrides it in the alt itself
+            self.inherited = False
+            self.path = Path(self.alt.path, self.config.targets_dir_name, self.name)
+            self.saved_dest = None
+        if self.deleted:
             if not self.path:
                 self.path = Path(self.alt.path, self.config.targets_dir_name, self.name)
-            if self.path.is_symlink():
-                self.path.unlink()
-            elif self.path.exists():
+            if fs.is_symlink(self.path):
+                fs.unlink(self.path)
+            elif fs.exists(self.path):
                 return ExpSymlinkErr('Cannot delete target. Path `{}` is not a symlink.'.format(self.path))
             else:
                 # Nothing to delete
                 pass
+            self.update_dests(old_dest=self.target)
+            self.saved_dest = None
+            index.invalidate(self.config)
             verbose('Deleted target: {} at {}'.format(self.name, self.path))
             return
         else:
-            if self.path.is_symlink():
-                self.path.unlink()
-            elif self.path.exists():
+            old_dest = None
+            if fs.is_symlink(self.path):
+                old_dest = fs.readlink(self.path)
+                fs.unlink(self.path)
+            elif fs.exists(self.path):
                 return ExpSymlinkErr('Target path `{}` is not a symlink!'.format(self.path))
-            self.path.symlink_to(self.target) # !! NOTE: target does not have to exist
+            fs.symlink(self.path, self.target) # !! NOTE: target does not have to exist
+            self.update_dests(old_dest=old_dest, new_dest=self.target)
+            self.saved_dest = self.target
+        index.invalidate(self.config)
         return None
+
+    def update_dests(self, old_dest=None, new_dest=None):
+        """Updates the reverse index of destinations, if it is loaded."""
+        dests = self.config.dests
+        if dests is None or not self.alt:
+            return
+        owner = (self.alt.typename, self.alt.name, self.name)
+        if old_dest is not None:
+            dests.remove(old_dest, *owner)
+        if new_dest is not None:
+            dests.add(new_dest, *owner, mode=self.mode)
         
     @staticmethod
     def from_targets_path(path: Path, alt=None):
         """Returns a list of targets instance from a filesystem path."""
-        if not path.is_dir():
+        fs = alt.config.fs if alt else Config.fs
+        if not fs.is_dir(path):
             return (ExpDirErr('Targets-path `{}` has to be a directory!'.format(path)), None)
         targets = []
 
-        for e in path.iterdir():
+        for e in fs.iterdir(path):
             err, target = Target.from_target_path(e, alt=alt)
             if err: return (err, None)
             targets.append(target)
@@ -521,9 +980,12 @@ class Target:
         """Returns a target instance from a filesystem path"""
         if not path.stem:
             return (InvTargetPathErr('Target-file `{}` is invalid! A filename cannot end in \'/\'!'.format(path)), None)
-        if not path.is_symlink():
+        fs = alt.config.fs if alt else Config.fs
+        if not fs.is_symlink(path):
             return (ExpSymlinkErr('Target-file `{}` has to be a symlink!'.format(path)), None)
         #return None, Target(name=path.stem, target=path.resolve(), alt=alt, path=path)
-        target_path = Path(os.readlink(path.absolute())).absolute()
-        target = Target(name=path.stem, target=target_path, alt=alt, path=path)
+        target_path = Path(fs.readlink(path.absolute())).absolute()
+        target = Target(name=path.stem, target=target_path, alt=alt, path=path,
+                        config=alt.config if alt else Config())
+        target.saved_dest = target_path
         return None, target
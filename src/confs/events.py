@@ -0,0 +1,193 @@
+#!/bin/env python3
+"""
+Change feed of the state transitions of a confs path, so consumers (eg.
+an editor plugin or a status bar) learn about alt switches without
+polling the tree:
+
+    <confs_path>/.state/events.ndjson
+
+Each transition is appended as a line of JSON, numbered by a sequence
+number increasing across all types and processes:
+
+    {"seq": 12, "event": "enable", "type": "vim", "alt": "work", "previous": "default", ...}
+
+The events are:
+  enable      The enabled symlink of a type changed (alt is null when
+              no alt is enabled anymore), from ConfType.save
+  save        The targets or metadata of an alt were written, from Alt.save
+  install     A target was installed, from Target.install
+  uninstall   A target was uninstalled, from Target.uninstall
+
+and all of them carry the time and the pid of the writer. A write rolled
+back (or forward) by confs.journal appends the events of what it undid,
+its enable events marked with "recovered": true. Consumers keep
+the last sequence number they read and ask for the events after it
+(see read() and follow()), reading only the end of the log.
+
+The log is appended to under an exclusive flock(2) of it, which also
+serializes the sequence numbers. Once it grows past COMPACT_SIZE (and
+twice its size after the previous compaction), it is compacted: only
+the last event of each key (the type of an enable, the alt of a save,
+the target of an install or uninstall) is kept, with its sequence
+number. So reading the log from 0 still yields the current state, and
+a consumer behind a compaction only misses events superseded since.
+
+Trees on an in-memory filesystem (see confs.fs) have no change feed.
+"""
+
+import os
+import time
+import json
+import fcntl
+from pathlib import Path
+
+EVENTS_NAME = 'events.ndjson' # The log (in the state directory)
+EVENTS_VERSION = 1
+COMPACT_SIZE = 256 * 1024     # The size (in bytes) past which the log is compacted
+TAIL_SIZE = 4096              # The bytes read from the end of the log to find the last sequence number
+FOLLOW_INTERVAL = 0.1         # The seconds between checks of the log when following it
+
+def events_path(config) -> Path:
+    return Path(config.confs_path, config.state_dir_name, EVENTS_NAME)
+
+def key(event) -> tuple:
+    """Returns what event is the latest state of, see compact()."""
+    kind = event.get('event')
+    if kind == 'enable':
+        return (kind, event.get('type'))
+    if kind == 'save':
+        return (kind, event.get('type'), event.get('alt'))
+    return ('target', event.get('type'), event.get('alt'), event.get('target'))
+
+def parse(lines) -> list:
+    """Returns the events of lines, skipping the header and a line cut short by a crash."""
+    events = []
+    for line in lines:
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict) and 'seq' in event:
+            events.append(event)
+    return events
+
+def _last_seq(fd, size) -> int:
+    start = max(0, size - TAIL_SIZE)
+    os.lseek(fd, start, os.SEEK_SET)
+    lines = os.read(fd, size - start).split(b'\n')
+    for event in reversed(parse(lines[1:] if start else lines)):
+        return event['seq']
+    if start:
+        # An event longer than the tail, read it all
+        return max([event['seq'] for event in _read_all(fd)] or [0])
+    return 0
+
+def _read_all(fd) -> list:
+    os.lseek(fd, 0, os.SEEK_SET)
+    chunks = []
+    while True:
+        chunk = os.read(fd, 1 << 20)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return parse(b''.join(chunks).split(b'\n'))
+
+def _header(fd) -> dict:
+    os.lseek(fd, 0, os.SEEK_SET)
+    try:
+        header = json.loads(os.read(fd, TAIL_SIZE).split(b'\n')[0])
+    except ValueError:
+        return {}
+    return header if isinstance(header, dict) and 'seq' not in header else {}
+
+def compact(config, fd, size):
+    """Rewrites the log holding the flock fd, keeping the last event of each key."""
+    latest = {}
+    for event in _read_all(fd):
+        latest[key(event)] = event
+    events = sorted(latest.values(), key=lambda e: e['seq'])
+    lines = [json.dumps(event, sort_keys=True) for event in events]
+    size = sum(len(line) + 1 for line in lines)
+    header = json.dumps({'version': EVENTS_VERSION, 'compacted': size}, sort_keys=True)
+    path = events_path(config)
+    tmp_path = Path('{}.tmp'.format(path))
+    with open(str(tmp_path), 'w') as f:
+        f.write('\n'.join([header] + lines) + '\n')
+    # Replaced as a whole, so readers (and followers, see follow()) see either log
+    os.replace(str(tmp_path), str(path))
+
+def append(config, event, **data):
+    """Appends the event (eg. install) with data to the log, returning its sequence number or None."""
+    if config.fs.name != 'os':
+        return None
+    path = events_path(config)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            fd = os.open(str(path), os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # The log may have been compacted (replaced) while waiting for the lock
+            if os.fstat(fd).st_ino == os.stat(str(path)).st_ino:
+                break
+            os.close(fd)
+    except OSError:
+        # A read-only tree, its state does not change
+        return None
+    try:
+        size = os.fstat(fd).st_size
+        seq = _last_seq(fd, size) + 1
+        data.update(seq=seq, event=event, time=round(time.time(), 3), pid=os.getpid())
+        line = (json.dumps(data, sort_keys=True) + '\n').encode()
+        os.write(fd, line)
+        size += len(line)
+        if size > COMPACT_SIZE and size > 2 * _header(fd).get('compacted', 0):
+            compact(config, fd, size)
+        return seq
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+def read(config, since=0) -> list:
+    """Returns the events of the log after the sequence number since."""
+    try:
+        with open(str(events_path(config)), 'rb') as f:
+            lines = f.read().split(b'\n')
+    except FileNotFoundError:
+        return []
+    return [event for event in parse(lines) if event['seq'] > since]
+
+def follow(config, since=0, interval=FOLLOW_INTERVAL):
+    """Yields the events of the log after since, then each new event as it is appended, forever."""
+    path = str(events_path(config))
+    f = None
+    ino = None
+    partial = b''
+    while True:
+        if f is None:
+            try:
+                f = open(path, 'rb')
+                ino = os.fstat(f.fileno()).st_ino
+                partial = b''
+            except FileNotFoundError:
+                time.sleep(interval)
+                continue
+        data = f.read()
+        if data:
+            lines = (partial + data).split(b'\n')
+            partial = lines.pop()
+            for event in parse(lines):
+                if event['seq'] > since:
+                    since = event['seq']
+                    yield event
+            continue
+        # Only the log is checked, for growth or for its replacement by a compaction
+        try:
+            replaced = os.stat(path).st_ino != ino
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            f.close()
+            f = None
+            continue
+        time.sleep(interval)
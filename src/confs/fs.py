@@ -0,0 +1,532 @@
+#!/bin/env python3
+"""
+Filesystem backends used by the model (ConfType, Alt, Target), the
+materialized installs and the commands for all filesystem access.
+
+The backend of a confs tree is set in Config.fs:
+
+    OSBackend        The real filesystem (the default)
+    MemoryBackend    An in-memory tree, for benchmarks and experiments on
+                     large trees without any disk I/O
+    RecordingBackend Wraps another backend, logging and counting every
+                     operation (see RecordingBackend.counts)
+
+All methods take a Path or str, and raise the same OSError subclasses as
+the os module (FileNotFoundError, FileExistsError, ...) on failure.
+
+Not routed through the backend are the cached listing (confs.index),
+which is read by shell completion before anything else is imported,
+hooks, which are executed as processes, and export/import, which stream
+to and from real files.
+"""
+
+import os
+import stat
+import errno
+import fcntl
+import itertools
+from pathlib import Path
+from collections import Counter
+
+FICLONE = 0x40049409   # ioctl(2) request to clone (reflink) a file, see ioctl_ficlone(2)
+
+def _oserror(cls, err, path):
+    return cls(err, os.strerror(err), str(path))
+
+class OSBackend:
+    """The real filesystem."""
+    name = 'os'
+
+    def __repr__(self):
+        return '<OSBackend>'
+
+    def exists(self, path) -> bool:
+        return os.path.exists(path)
+
+    def lexists(self, path) -> bool:
+        return os.path.lexists(path)
+
+    def is_dir(self, path) -> bool:
+        return os.path.isdir(path)
+
+    def is_file(self, path) -> bool:
+        return os.path.isfile(path)
+
+    def is_symlink(self, path) -> bool:
+        return os.path.islink(path)
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def lstat(self, path):
+        return os.lstat(path)
+
+    def samefile(self, a, b) -> bool:
+        return os.path.samefile(a, b)
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def iterdir(self, path):
+        return [Path(path, name) for name in self.listdir(path)]
+
+    def resolve(self, path) -> Path:
+        return Path(path).resolve()
+
+    def readlink(self, path) -> str:
+        return os.readlink(path)
+
+    def symlink(self, path, target):
+        """Creates a symlink at path pointing to target."""
+        os.symlink(target, path)
+
+    def mkdir(self, path, parents=False, exist_ok=False):
+        Path(path).mkdir(parents=parents, exist_ok=exist_ok)
+
+    def rmdir(self, path):
+        os.rmdir(path)
+
+    def rmtree(self, path):
+        import shutil
+        shutil.rmtree(path)
+
+    def unlink(self, path):
+        os.unlink(path)
+
+    def rename(self, src, dst):
+        os.rename(src, dst)
+
+    def replace(self, src, dst):
+        os.replace(src, dst)
+
+    def touch(self, path):
+        Path(path).touch()
+
+    def read_bytes(self, path) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def write_bytes(self, path, data: bytes):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def read_text(self, path) -> str:
+        return self.read_bytes(path).decode()
+
+    def write_text(self, path, text: str):
+        self.write_bytes(path, text.encode())
+
+    def copy(self, src, dst):
+        """Copies the file src to dst, with its mode and times."""
+        import shutil
+        shutil.copy2(src, dst)
+
+    def link(self, src, dst):
+        """Creates the hardlink dst of src."""
+        os.link(src, dst)
+
+    def clone(self, src, dst):
+        """Creates dst as a copy-on-write clone of src, raising OSError if unsupported."""
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        import shutil
+        shutil.copystat(src, dst)
+
+    # Operations on a name in a directory opened once with open_dir, so the
+    # path of the directory is not walked again for each (see confs.linker)
+
+    def open_dir(self, path):
+        """Returns a handle of the directory path, to be closed with close_dir."""
+        return os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+
+    def close_dir(self, handle):
+        os.close(handle)
+
+    def stat_at(self, handle, name):
+        return os.stat(name, dir_fd=handle)
+
+    def readlink_at(self, handle, name) -> str:
+        return os.readlink(name, dir_fd=handle)
+
+    def symlink_at(self, handle, name, target):
+        """Creates a symlink name in the directory handle pointing to target."""
+        os.symlink(target, name, dir_fd=handle)
+
+    def unlink_at(self, handle, name):
+        os.unlink(name, dir_fd=handle)
+
+class Stat:
+    """The subset of os.stat_result provided by MemoryBackend."""
+    def __init__(self, st_mode, st_ino, st_nlink, st_size, st_mtime_ns):
+        self.st_mode = st_mode
+        self.st_dev = 0
+        self.st_ino = st_ino
+        self.st_nlink = st_nlink
+        self.st_size = st_size
+        self.st_mtime_ns = st_mtime_ns
+        self.st_mtime = st_mtime_ns / 1e9
+
+    def __repr__(self):
+        return '<Stat mode="{:o}" ino="{}" size="{}">'.format(self.st_mode, self.st_ino, self.st_size)
+
+class _Node:
+    def __init__(self, mode, ino, mtime_ns, data=b'', link=None):
+        self.mode = mode     # stat.S_IFDIR, S_IFREG or S_IFLNK, with permissions
+        self.ino = ino
+        self.nlink = 1
+        self.mtime_ns = mtime_ns
+        self.data = data     # The content of a file
+        self.link = link     # The destination of a symlink
+        self.children = {} if stat.S_ISDIR(mode) else None # Name -> _Node of a directory
+
+class MemoryBackend:
+    """
+    An in-memory filesystem, starting out with only the root directory.
+    Relative paths are relative to the root. Times come from a counter
+    incremented on each change, so they are ordered but not wall times.
+    """
+    name = 'memory'
+    max_links = 40   # Symlinks followed before giving up with ELOOP
+
+    def __init__(self):
+        self._inos = itertools.count(1)
+        self._clock = itertools.count(1)
+        self.root = _Node(stat.S_IFDIR | 0o755, next(self._inos), next(self._clock))
+        self._dirs = {'': self.root} # Cache of directory path (without symlinks) -> _Node
+
+    def __repr__(self):
+        return '<MemoryBackend>'
+
+    @staticmethod
+    def _parts(path):
+        return [p for p in os.fspath(path).split('/') if p and p != '.']
+
+    def _walk(self, path, follow=True, depth=0):
+        """
+        Returns (parent node, name, node) for path, following symlinks
+        in the parents (and in the last component if follow), where node
+        is None if it does not exist. The root yields (root, '', root).
+        """
+        path = os.fspath(path)
+        head, _, name = path.rpartition('/')
+        parent = self._dirs.get(head)
+        if parent is not None and name not in ('', '.', '..'):
+            node = parent.children.get(name)
+            if node is None or not follow or not stat.S_ISLNK(node.mode):
+                return parent, name, node
+
+        if depth > self.max_links:
+            raise _oserror(OSError, errno.ELOOP, path)
+        stack = [self.root]
+        names = []
+        parts = self._parts(path)
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            if part == '..':
+                if names:
+                    stack.pop()
+                    names.pop()
+                if last:
+                    return (stack[-2] if names else self.root), (names[-1] if names else ''), stack[-1]
+                continue
+            parent = stack[-1]
+            if parent.children is None:
+                raise _oserror(NotADirectoryError, errno.ENOTDIR, path)
+            node = parent.children.get(part)
+            if node is not None and stat.S_ISLNK(node.mode) and (follow or not last):
+                prefix = '' if node.link.startswith('/') else '/'.join([''] + names)
+                rest = '/'.join(parts[i + 1:])
+                return self._walk('{}/{}/{}'.format(prefix, node.link, rest).rstrip('/'), follow, depth + 1)
+            if last:
+                if depth == 0:
+                    self._dirs['/'.join([''] + names)] = parent
+                return parent, part, node
+            if node is None:
+                raise _oserror(FileNotFoundError, errno.ENOENT, path)
+            stack.append(node)
+            names.append(part)
+        return self.root, '', self.root
+
+    def _node(self, path, follow=True):
+        try:
+            return self._walk(path, follow)[2]
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def _get(self, path, follow=True):
+        node = self._node(path, follow)
+        if node is None:
+            raise _oserror(FileNotFoundError, errno.ENOENT, path)
+        return node
+
+    def _create(self, path, mode, **kwargs):
+        parent, name, node = self._walk(path, follow=False)
+        if node is not None:
+            raise _oserror(FileExistsError, errno.EEXIST, path)
+        if parent.children is None:
+            raise _oserror(NotADirectoryError, errno.ENOTDIR, path)
+        node = _Node(mode, next(self._inos), next(self._clock), **kwargs)
+        parent.children[name] = node
+        parent.mtime_ns = next(self._clock)
+        return node
+
+    def _remove(self, path):
+        parent, name, node = self._walk(path, follow=False)
+        if node is None:
+            raise _oserror(FileNotFoundError, errno.ENOENT, path)
+        del parent.children[name]
+        node.nlink -= 1
+        if node.children is not None:
+            # Paths below the directory now resolve differently
+            self._dirs = {'': self.root}
+        parent.mtime_ns = next(self._clock)
+        return node
+
+    def exists(self, path) -> bool:
+        try:
+            return self._node(path) is not None
+        except OSError:
+            return False
+
+    def lexists(self, path) -> bool:
+        return self._node(path, follow=False) is not None
+
+    def is_dir(self, path) -> bool:
+        try:
+            node = self._node(path)
+        except OSError:
+            return False
+        return node is not None and stat.S_ISDIR(node.mode)
+
+    def is_file(self, path) -> bool:
+        try:
+            node = self._node(path)
+        except OSError:
+            return False
+        return node is not None and stat.S_ISREG(node.mode)
+
+    def is_symlink(self, path) -> bool:
+        node = self._node(path, follow=False)
+        return node is not None and stat.S_ISLNK(node.mode)
+
+    def _stat(self, node):
+        size = len(node.data) if stat.S_ISREG(node.mode) else len(node.link or '')
+        return Stat(node.mode, node.ino, node.nlink, size, node.mtime_ns)
+
+    def stat(self, path):
+        return self._stat(self._get(path))
+
+    def lstat(self, path):
+        return self._stat(self._get(path, follow=False))
+
+    def samefile(self, a, b) -> bool:
+        return self._get(a) is self._get(b)
+
+    def listdir(self, path):
+        node = self._get(path)
+        if node.children is None:
+            raise _oserror(NotADirectoryError, errno.ENOTDIR, path)
+        return list(node.children)
+
+    def iterdir(self, path):
+        return [Path(path, name) for name in self.listdir(path)]
+
+    def resolve(self, path) -> Path:
+        # Like Path.resolve(strict=False): resolve the existing part, append the rest
+        parts = self._parts(path)
+        resolved = Path('/')
+        for i, part in enumerate(parts):
+            candidate = Path(resolved, part)
+            node = self._node(candidate, follow=False)
+            if node is None:
+                return Path(candidate, *parts[i + 1:])
+            if part == '..':
+                resolved = resolved.parent
+            elif stat.S_ISLNK(node.mode):
+                link = node.link if node.link.startswith('/') else str(Path(resolved, node.link))
+                resolved = self.resolve(link)
+            else:
+                resolved = candidate
+        return resolved
+
+    def readlink(self, path) -> str:
+        node = self._get(path, follow=False)
+        if not stat.S_ISLNK(node.mode):
+            raise _oserror(OSError, errno.EINVAL, path)
+        return node.link
+
+    def symlink(self, path, target):
+        self._create(path, stat.S_IFLNK | 0o777, link=os.fspath(target))
+
+    def mkdir(self, path, parents=False, exist_ok=False):
+        if parents:
+            parent = Path(path).parent
+            if parent != Path(path) and not self.is_dir(parent):
+                self.mkdir(parent, parents=True, exist_ok=True)
+        try:
+            self._create(path, stat.S_IFDIR | 0o755)
+        except FileExistsError:
+            if not (exist_ok and self.is_dir(path)):
+                raise
+
+    def rmdir(self, path):
+        node = self._get(path, follow=False)
+        if node.children is None:
+            raise _oserror(NotADirectoryError, errno.ENOTDIR, path)
+        if node.children:
+            raise _oserror(OSError, errno.ENOTEMPTY, path)
+        self._remove(path)
+
+    def rmtree(self, path):
+        node = self._get(path, follow=False)
+        if node.children is None:
+            raise _oserror(NotADirectoryError, errno.ENOTDIR, path)
+        self._remove(path)
+
+    def unlink(self, path):
+        node = self._get(path, follow=False)
+        if node.children is not None:
+            raise _oserror(IsADirectoryError, errno.EISDIR, path)
+        self._remove(path)
+
+    def rename(self, src, dst):
+        node = self._get(src, follow=False)
+        parent, name, existing = self._walk(dst, follow=False)
+        if existing is node:
+            return
+        if existing is not None:
+            if existing.children is not None:
+                if node.children is None:
+                    raise _oserror(IsADirectoryError, errno.EISDIR, dst)
+                if existing.children:
+                    raise _oserror(OSError, errno.ENOTEMPTY, dst)
+            elif node.children is not None:
+                raise _oserror(NotADirectoryError, errno.ENOTDIR, dst)
+        self._remove(src)
+        node.nlink += 1
+        parent.children[name] = node
+        parent.mtime_ns = next(self._clock)
+
+    def replace(self, src, dst):
+        self.rename(src, dst)
+
+    def touch(self, path):
+        node = self._node(path)
+        if node is None:
+            self._create(path, stat.S_IFREG | 0o644)
+        else:
+            node.mtime_ns = next(self._clock)
+
+    def read_bytes(self, path) -> bytes:
+        node = self._get(path)
+        if node.children is not None:
+            raise _oserror(IsADirectoryError, errno.EISDIR, path)
+        return node.data
+
+    def write_bytes(self, path, data: bytes):
+        node = self._node(path)
+        if node is None:
+            node = self._create(path, stat.S_IFREG | 0o644)
+        elif node.children is not None:
+            raise _oserror(IsADirectoryError, errno.EISDIR, path)
+        node.data = bytes(data)
+        node.mtime_ns = next(self._clock)
+
+    def read_text(self, path) -> str:
+        return self.read_bytes(path).decode()
+
+    def write_text(self, path, text: str):
+        self.write_bytes(path, text.encode())
+
+    def copy(self, src, dst):
+        node = self._get(src)
+        self.write_bytes(dst, node.data)
+        copied = self._get(dst)
+        copied.mode = node.mode
+        copied.mtime_ns = node.mtime_ns
+
+    def link(self, src, dst):
+        node = self._get(src, follow=False)
+        if node.children is not None:
+            raise _oserror(PermissionError, errno.EPERM, src)
+        parent, name, existing = self._walk(dst, follow=False)
+        if existing is not None:
+            raise _oserror(FileExistsError, errno.EEXIST, dst)
+        parent.children[name] = node
+        node.nlink += 1
+        parent.mtime_ns = next(self._clock)
+
+    def clone(self, src, dst):
+        raise _oserror(OSError, errno.EOPNOTSUPP, dst)
+
+    # The handle of a directory is its resolved path, names are looked up in it
+
+    def open_dir(self, path):
+        if self._get(path).children is None:
+            raise _oserror(NotADirectoryError, errno.ENOTDIR, path)
+        return str(self.resolve(path))
+
+    def close_dir(self, handle):
+        pass
+
+    def stat_at(self, handle, name):
+        return self.stat(os.path.join(handle, name))
+
+    def readlink_at(self, handle, name) -> str:
+        return self.readlink(os.path.join(handle, name))
+
+    def symlink_at(self, handle, name, target):
+        self.symlink(os.path.join(handle, name), target)
+
+    def unlink_at(self, handle, name):
+        self.unlink(os.path.join(handle, name))
+
+class RecordingBackend:
+    """
+    Wraps a backend, recording every operation as (name, paths...) in
+    ops and the number of calls of each operation in counts.
+    If logfile is set, each operation is also printed to it.
+    """
+    WRITE_OPS = frozenset(['symlink', 'mkdir', 'rmdir', 'rmtree', 'unlink', 'rename',
+                           'replace', 'touch', 'write_bytes', 'write_text', 'copy', 'link', 'clone',
+                           'symlink_at', 'unlink_at'])
+
+    def __init__(self, backend=None, logfile=None):
+        self.backend = backend if backend is not None else OSBackend()
+        self.logfile = logfile
+        self.ops = []
+        self.counts = Counter()
+
+    def __repr__(self):
+        return '<RecordingBackend backend="{}" ops="{}">'.format(self.backend, len(self.ops))
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    @property
+    def writes(self) -> int:
+        """The number of operations which modified the filesystem."""
+        return sum(n for op, n in self.counts.items() if op in self.WRITE_OPS)
+
+    @property
+    def reads(self) -> int:
+        return sum(n for op, n in self.counts.items() if op not in self.WRITE_OPS)
+
+    def reset(self):
+        self.ops = []
+        self.counts = Counter()
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def recorded(*args, **kwargs):
+            op = (name,) + tuple(os.fspath(a) for a in args if isinstance(a, (str, os.PathLike)))
+            self.ops.append(op)
+            self.counts[name] += 1
+            if self.logfile:
+                print(' '.join(op), file=self.logfile)
+            return attr(*args, **kwargs)
+        return recorded
@@ -0,0 +1,154 @@
+#!/bin/env python3
+"""
+Post-install/uninstall/enable hooks of types and alts.
+
+Hooks are executable files named post-<event> in the hooks directory
+of a type (<type>/hooks/) or an alt (<type>/<alt>/hooks/), eg.
+~/.confs/tmux/hooks/post-install. They are collected using Hooks.fire()
+while a command runs and executed once per run by Hooks.run():
+
+ - A hook fired for several types or alts (eg. the same script symlinked
+   into several hooks directories) is only run once.
+ - The hooks of one type run sequentially (alt hooks before type hooks),
+   the hooks of different types run in parallel.
+ - Each hook is killed (with its process group) after config.hook_timeout
+   seconds. Only the hook itself is waited for: its output goes to a
+   temporary file instead of a pipe, so a daemon it starts in the
+   background (eg. `tmux source` or `foo &`) does not hold it up.
+
+Hooks are run with the directory containing them as working directory
+and the following environment variables set:
+    CONFS_EVENT        The event (install, uninstall or enable)
+    CONFS_TYPES        Space separated names of the types which fired it
+    CONFS_IDENTIFIERS  Space separated type/alt identifiers which fired it
+    CONFS_PATH         The confs path
+"""
+
+import os
+import time
+from pathlib import Path
+
+EVENTS = ('install', 'uninstall', 'enable')
+
+class Hook:
+    def __init__(self, path: Path, event: str):
+        self.path = path          # The resolved path of the hook
+        self.event = event        # The event the hook is run for
+        self.identifiers = []     # The type/alt identifiers which fired the hook
+
+    def __repr__(self):
+        return '<Hook path="{}" event="{}" identifiers="{}">'.format(self.path, self.event, self.identifiers)
+
+class HookResult:
+    def __init__(self, hook: Hook, returncode=None, duration=0.0, timed_out=False, output='', error=None):
+        self.hook = hook
+        self.returncode = returncode
+        self.duration = duration   # Wall time in seconds
+        self.timed_out = timed_out
+        self.output = output       # Combined stdout and stderr
+        self.error = error         # Set if the hook could not be started
+
+    def __repr__(self):
+        return '<HookResult hook="{}" returncode="{}" duration="{:.3f}" timed_out="{}">'.format(
+            self.hook, self.returncode, self.duration, self.timed_out)
+
+    @property
+    def ok(self):
+        return self.error is None and not self.timed_out and self.returncode == 0
+
+def hook_paths(config, conf_type, alt, event):
+    """Returns the paths of the alt hook and type hook of event, existing or not."""
+    name = 'post-{}'.format(event)
+    paths = []
+    if alt is not None and alt.path:
+        paths.append(Path(alt.path, config.hooks_dir_name, name))
+    if conf_type.path:
+        path = Path(conf_type.path, config.hooks_dir_name, name)
+        if config.lower_paths and not path.is_file():
+            # In a union, the type hook of the highest repository having one (see confs.union)
+            lower = [Path(repo, conf_type.name, config.hooks_dir_name, name) for repo in config.lower_paths]
+            path = next((p for p in lower if p.is_file()), path)
+        paths.append(path)
+    return paths
+
+class Hooks:
+    """Collects the hooks fired during a run of confs, and runs each of them once."""
+    def __init__(self, config, enabled=True):
+        self.config = config
+        self.enabled = enabled
+        self.queued = {}   # (resolved path, event) -> Hook
+        self.chains = {}   # typename -> [Hook], run sequentially
+
+    def __repr__(self):
+        return '<Hooks queued="{}">'.format(list(self.queued.values()))
+
+    def fire(self, event: str, conf_type, alt=None):
+        """Queues the hooks of event for alt and its conf_type."""
+        if not self.enabled:
+            return
+        identifier = '{}/{}'.format(conf_type.name, alt.name) if alt else conf_type.name
+        for path in hook_paths(self.config, conf_type, alt, event):
+            if not path.is_file() or not os.access(str(path), os.X_OK):
+                continue
+            key = (path.resolve(), event)
+            hook = self.queued.get(key)
+            if not hook:
+                hook = Hook(key[0], event)
+                self.queued[key] = hook
+                self.chains.setdefault(conf_type.name, []).append(hook)
+            if identifier not in hook.identifiers:
+                hook.identifiers.append(identifier)
+
+    def run_hook(self, hook: Hook) -> HookResult:
+        # Only imported when hooks run, as most commands fire none
+        import signal
+        import tempfile
+        import subprocess
+        env = dict(os.environ)
+        env['CONFS_EVENT'] = hook.event
+        env['CONFS_TYPES'] = ' '.join(sorted(set(i.split('/')[0] for i in hook.identifiers)))
+        env['CONFS_IDENTIFIERS'] = ' '.join(hook.identifiers)
+        env['CONFS_PATH'] = str(self.config.confs_path)
+
+        start = time.monotonic()
+        with tempfile.TemporaryFile() as output:
+            try:
+                # A new session, so the whole process group can be killed on timeout
+                proc = subprocess.Popen([str(hook.path)], cwd=str(hook.path.parent), env=env,
+                                        stdin=subprocess.DEVNULL, stdout=output,
+                                        stderr=subprocess.STDOUT, start_new_session=True)
+            except OSError as e:
+                return HookResult(hook, error=e, duration=time.monotonic() - start)
+
+            try:
+                proc.wait(timeout=self.config.hook_timeout)
+                timed_out = False
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                proc.wait()
+                timed_out = True
+            output.seek(0)
+            return HookResult(hook, returncode=proc.returncode, duration=time.monotonic() - start,
+                              timed_out=timed_out, output=output.read().decode(errors='replace'))
+
+    def run_chain(self, chain):
+        return [self.run_hook(hook) for hook in chain]
+
+    def run(self):
+        """
+        Runs all queued hooks, returning a list of HookResults in
+        the order the hooks were fired. The queue is emptied.
+        """
+        chains = list(self.chains.values())
+        self.queued = {}
+        self.chains = {}
+        if not chains:
+            return []
+        if len(chains) == 1:
+            return self.run_chain(chains[0])
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(self.config.hook_jobs, len(chains))) as pool:
+            return [result for results in pool.map(self.run_chain, chains) for result in results]
@@ -0,0 +1,430 @@
+#!/bin/env python3
+"""
+Compact cached listing of the types, alts and targets of a confs tree.
+
+The listing is stored in the cache directory of the confs path and
+contains one tab separated line per alt:
+
+    <type> TAB <alt> TAB <flag> [TAB <target> ...]
+
+where <flag> is `*` for the enabled alt of the type and empty otherwise.
+Types without any alts are stored as a line containing only the type name.
+The targets of layered alts include the targets they inherit (see
+confs.layers).
+
+Only the `os` module is used, as the listing is read on every shell
+completion and has to be fast even for trees with thousands of types.
+The exception is invalidate(), which is called by the model on every
+write and goes through the filesystem backend of the config.
+
+The cache directory also contains the reverse index of destinations
+(see Dests), with one line per target:
+
+    <dest> TAB <type> TAB <alt> TAB <target> TAB <mode>
+
+It is loaded once per Config and kept up to date by Target.save(), so
+conflicting destinations are found without walking the tree. The mode
+is only recorded for targets which are not symlinked, as stow targets
+may share destinations (see confs.stow).
+
+Both are invalidated by every write of confs, and also record a hash of
+the mtimes of the directories they were built from (see stamp()), so
+types, alts, targets and metadata changed outside of confs (eg. by a
+git pull) are noticed with a few stats per alt when they are read.
+
+In a union of repositories (see confs.union), both are kept per
+repository and merged when loaded.
+"""
+
+import os
+import hashlib
+
+CACHE_DIR_NAME = '.cache'      # The directory (in confs_path) containing caches
+STATE_DIR_NAME = '.state'      # The directory (in confs_path) containing state
+ENABLED_LINK_NAME = 'enabled'  # The symlink (in a type) to its enabled alt
+LISTING_NAME = 'listing'       # The name of the listing file in the cache directory
+LISTING_VERSION = 'confs-listing 1'
+DESTS_NAME = 'dests'           # The name of the destination index in the cache directory
+DESTS_VERSION = 'confs-dests 2'
+TARGETS_DIR_NAME = 'targets'   # The directory (in an alt) containing targets
+ALT_META_NAME = 'meta.json'    # The file (in an alt) containing alt metadata
+
+def _stem(name):
+    """Mirrors Path.stem, which is what the model uses for names."""
+    return os.path.splitext(name)[0]
+
+def listing_path(confs_path, cache_dir_name=CACHE_DIR_NAME):
+    return os.path.join(str(confs_path), cache_dir_name, LISTING_NAME)
+
+def dests_path(confs_path, cache_dir_name=CACHE_DIR_NAME):
+    return os.path.join(str(confs_path), cache_dir_name, DESTS_NAME)
+
+def invalidate(config):
+    """Removes the cached listing and destinations for the confs path of config, using its filesystem backend."""
+    for path in (listing_path(config.confs_path, config.cache_dir_name),
+                 dests_path(config.confs_path, config.cache_dir_name)):
+        # Checked first, so invalidating caches which are not there costs no write
+        if not config.fs.lexists(path):
+            continue
+        try:
+            config.fs.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # A read-only tree simply never gets a cached listing
+            pass
+
+def stamp(root, listing, targets_dir_name=TARGETS_DIR_NAME, alt_meta_name=ALT_META_NAME) -> str:
+    """
+    Returns a hash of the mtimes of the directories of the tree at root
+    which listing was built from: the root, the types and the targets
+    directories and metadata of the alts.
+    """
+    # Joined by hand, as this runs for every alt on every read
+    root = str(root) + os.sep
+    targets, meta = os.sep + targets_dir_name, os.sep + alt_meta_name
+    paths = [root] + [root + typename for typename in listing.types()]
+    for row in listing.rows:
+        if len(row) > 1:
+            alt = root + row[0] + os.sep + row[1]
+            paths += (alt + targets, alt + meta)
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append('{}\0{}'.format(path, os.stat(path).st_mtime_ns))
+        except OSError:
+            mtimes.append(path)
+    return hashlib.sha1('\n'.join(mtimes).encode()).hexdigest()
+
+class Listing:
+    def __init__(self, rows):
+        self.rows = rows # List of [typename, altname, flag, target ...]
+        self.stamp = None # The stamp of the tree it was read or written with
+
+    def __repr__(self):
+        return '<Listing rows="{}">'.format(len(self.rows))
+
+    def types(self):
+        seen = set()
+        out = []
+        for row in self.rows:
+            if row[0] not in seen:
+                seen.add(row[0])
+                out.append(row[0])
+        return out
+
+    def alts(self, typename):
+        return [row[1] for row in self.rows if row[0] == typename and len(row) > 1]
+
+    def enabled_alt(self, typename):
+        for row in self.rows:
+            if row[0] == typename and len(row) > 2 and row[2] == '*':
+                return row[1]
+        return None
+
+    def targets(self, typename, altname):
+        for row in self.rows:
+            if row[0] == typename and len(row) > 1 and row[1] == altname:
+                return row[3:]
+        return []
+
+    def dump(self):
+        return '\n'.join('\t'.join(row) for row in self.rows)
+
+def read(confs_path, cache_dir_name=CACHE_DIR_NAME, targets_dir_name=TARGETS_DIR_NAME, alt_meta_name=ALT_META_NAME):
+    """
+    Returns the cached Listing of confs_path, or None if it is missing
+    or the tree changed since it was written.
+    """
+    path = listing_path(confs_path, cache_dir_name)
+    try:
+        with open(path) as f:
+            header = f.readline().rstrip('\n').split('\t')
+            if len(header) != 2 or header[0] != LISTING_VERSION:
+                return None
+            listing = Listing([line.rstrip('\n').split('\t') for line in f if line.strip()])
+    except (OSError, ValueError):
+        return None
+    # Checked against the tree, which may have been changed outside of confs
+    listing.stamp = stamp(confs_path, listing, targets_dir_name, alt_meta_name)
+    return listing if listing.stamp == header[1] else None
+
+def build(config, root=None):
+    """Builds a Listing by walking the tree at root (confs_path by default), without loading the model."""
+    import json
+    rows = []
+    parents = {} # (typename, altname) -> parents, of layered alts
+    root = str(root or config.confs_path)
+    with os.scandir(root) as it:
+        type_entries = sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+
+    for te in type_entries:
+        typename = _stem(te.name)
+        if typename in config.excluded_conf_types:
+            continue
+        try:
+            enabled = _stem(os.path.basename(os.readlink(
+                os.path.join(te.path, config.enabled_link_name)).rstrip('/')))
+        except OSError:
+            enabled = None
+
+        with os.scandir(te.path) as it:
+            alt_entries = sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+        alt_rows = []
+        for ae in alt_entries:
+            altname = _stem(ae.name)
+            if altname in config.excluded_alts:
+                continue
+            try:
+                with os.scandir(os.path.join(ae.path, config.targets_dir_name)) as it:
+                    targets = sorted(_stem(e.name) for e in it)
+            except OSError:
+                targets = []
+            try:
+                with open(os.path.join(ae.path, config.alt_meta_name)) as f:
+                    alt_parents = json.load(f).get('parents')
+                if alt_parents:
+                    parents[(typename, altname)] = alt_parents
+            except (OSError, ValueError, AttributeError):
+                pass
+            alt_rows.append([typename, altname, '*' if altname == enabled else ''] + targets)
+        rows.extend(alt_rows if alt_rows else [[typename]])
+    if parents:
+        _inherit(rows, parents)
+    return Listing(rows)
+
+def _inherit(rows, parents):
+    """Adds the targets inherited by the layered alts in parents to their rows."""
+    own = {(row[0], row[1]): row[3:] for row in rows if len(row) > 1}
+
+    def names(key, seen):
+        found = list(own.get(key, []))
+        for parent in parents.get(key, []):
+            typename, _, altname = str(parent).rpartition('/')
+            parent_key = (typename or key[0], altname)
+            if parent_key not in seen:
+                found += names(parent_key, seen + [parent_key])
+        return found
+
+    for row in rows:
+        if len(row) > 1 and (row[0], row[1]) in parents:
+            row[3:] = sorted(set(names((row[0], row[1]), [(row[0], row[1])])))
+
+def write(config, listing):
+    """Atomically writes listing to the cache, ignoring write errors."""
+    path = listing_path(config.confs_path, config.cache_dir_name)
+    tmp_path = '{}.{}'.format(path, os.getpid())
+    try:
+        # Create the cache directory first, as it changes the mtime of the root
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        listing.stamp = stamp(config.confs_path, listing, config.targets_dir_name, config.alt_meta_name)
+        with open(tmp_path, 'w') as f:
+            f.write('{}\t{}\n'.format(LISTING_VERSION, listing.stamp))
+            f.write(listing.dump())
+            f.write('\n')
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+def load(config):
+    """Returns the cached listing, rebuilding and caching it if needed."""
+    if config.lower_paths:
+        from confs import union
+        return union.load_listing(config)
+    return load_repo(config)
+
+def load_repo(config):
+    """Returns the cached listing of confs_path by itself, ignoring the lower repositories of a union."""
+    listing = read(config.confs_path, config.cache_dir_name, config.targets_dir_name, config.alt_meta_name)
+    if listing is None:
+        listing = build(config)
+        write(config, listing)
+    return listing
+
+def normpath(path):
+    """Returns path as the absolute, normalized path used as key by Dests."""
+    return os.path.abspath(os.path.expanduser(str(path)))
+
+def _ancestors(path):
+    """Yields the proper ancestors of the normalized path, nearest first."""
+    parent = os.path.dirname(path)
+    while parent != path:
+        yield parent
+        path, parent = parent, os.path.dirname(parent)
+
+class Dests:
+    """
+    Reverse index of target destinations, mapping each destination
+    to the (type, alt, target) declaring it.
+    """
+    def __init__(self):
+        self.owners = {} # dest -> [(typename, altname, targetname)]
+        self.below = {}  # directory -> set of dests inside it
+        self.modes = {}  # (typename, altname, targetname) -> mode, unless symlink
+
+    def __repr__(self):
+        return '<Dests dests="{}">'.format(len(self.owners))
+
+    def add(self, dest, typename, altname, targetname, mode='symlink'):
+        dest = normpath(dest)
+        owner = (typename, altname, targetname)
+        owners = self.owners.setdefault(dest, [])
+        if owner not in owners:
+            owners.append(owner)
+        if mode and mode != 'symlink':
+            self.modes[owner] = mode
+        else:
+            self.modes.pop(owner, None)
+        for parent in _ancestors(dest):
+            self.below.setdefault(parent, set()).add(dest)
+
+    def remove(self, dest, typename, altname, targetname):
+        dest = normpath(dest)
+        owners = self.owners.get(dest, [])
+        if (typename, altname, targetname) in owners:
+            owners.remove((typename, altname, targetname))
+            self.modes.pop((typename, altname, targetname), None)
+        if owners:
+            return
+        self.owners.pop(dest, None)
+        for parent in _ancestors(dest):
+            below = self.below.get(parent)
+            if below is not None:
+                below.discard(dest)
+                if not below:
+                    del self.below[parent]
+
+    def lookup(self, path):
+        """
+        Returns (dest, owners) of the longest destination equal to or
+        containing path, or (None, []) if path is not inside any.
+        """
+        path = normpath(path)
+        for candidate in [path] + list(_ancestors(path)):
+            if candidate in self.owners:
+                return candidate, list(self.owners[candidate])
+        return None, []
+
+    def conflicts(self, dest, typename, altname, targetname, mode='symlink'):
+        """
+        Returns a list of (dest, (type, alt, target)) declaring dest, a
+        directory containing it or a path inside it, except for the other
+        alts of the same type (which are never installed at the same time)
+        and, for a stow target, other stow targets (which are merged).
+        """
+        dest = normpath(dest)
+        candidates = [dest] + [p for p in _ancestors(dest) if p in self.owners]
+        candidates += sorted(self.below.get(dest, ()))
+        found = []
+        for candidate in candidates:
+            for owner in self.owners.get(candidate, []):
+                if owner == (typename, altname, targetname):
+                    continue
+                if mode == 'stow' and self.modes.get(owner) == 'stow':
+                    continue
+                if owner[0] != typename or owner[1] == altname:
+                    found.append((candidate, owner))
+        return found
+
+    def dump(self):
+        return '\n'.join('\t'.join((dest,) + owner + (self.modes.get(owner, 'symlink'),))
+                         for dest, owners in sorted(self.owners.items()) for owner in owners)
+
+def read_dests(confs_path, current, cache_dir_name=CACHE_DIR_NAME):
+    """Returns the cached Dests of confs_path, or None if it is missing or not of the current stamp of the tree."""
+    try:
+        with open(dests_path(confs_path, cache_dir_name)) as f:
+            header = f.readline().rstrip('\n').split('\t')
+            if len(header) != 2 or header[0] != DESTS_VERSION:
+                return None
+            if header[1] != current:
+                return None
+            dests = Dests()
+            for line in f:
+                row = line.rstrip('\n').split('\t')
+                if len(row) == 5:
+                    dests.add(*row)
+            return dests
+    except (OSError, ValueError):
+        return None
+
+def build_dests(config, root=None):
+    """
+    Builds the Dests of the tree at root (confs_path by default) by reading
+    all targets links and the modes in the alt metadata, using the
+    filesystem backend.
+    """
+    import json
+    fs = config.fs
+    dests = Dests()
+    root = str(root or config.confs_path)
+    for typename in sorted(fs.listdir(root)):
+        type_path = os.path.join(root, typename)
+        if _stem(typename) in config.excluded_conf_types or not fs.is_dir(type_path):
+            continue
+        for altname in sorted(fs.listdir(type_path)):
+            if _stem(altname) in config.excluded_alts:
+                continue
+            targets_path = os.path.join(type_path, altname, config.targets_dir_name)
+            try:
+                names = fs.listdir(targets_path)
+            except OSError:
+                continue
+            try:
+                meta = json.loads(fs.read_text(os.path.join(type_path, altname, config.alt_meta_name)))
+            except (OSError, ValueError):
+                meta = {}
+            modes = {name: m.get('mode') for name, m in meta.get('targets', {}).items()}
+            for name in names:
+                try:
+                    link = fs.readlink(os.path.join(targets_path, name))
+                except OSError:
+                    continue
+                dests.add(link, _stem(typename), _stem(altname), _stem(name), modes.get(_stem(name)))
+    return dests
+
+def write_dests(config, dests, current):
+    """Atomically writes dests, built from the tree of the stamp current, to the cache, ignoring write errors."""
+    path = dests_path(config.confs_path, config.cache_dir_name)
+    tmp_path = '{}.{}'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            f.write('{}\t{}\n'.format(DESTS_VERSION, current))
+            f.write(dests.dump())
+            f.write('\n')
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+def load_dests(config):
+    """
+    Returns the Dests of the tree of config, kept on config once loaded.
+    The cache is only used on the real filesystem.
+    """
+    if config.dests is not None:
+        return config.dests
+    if config.lower_paths:
+        from confs import union
+        config.dests = union.load_dests(config)
+    else:
+        config.dests = load_repo_dests(config)
+    return config.dests
+
+def load_repo_dests(config):
+    """Returns the Dests of confs_path by itself, ignoring the lower repositories of a union."""
+    on_disk = config.fs.name == 'os'
+    # Valid as long as the listing is, which is built from the same directories
+    current = load_repo(config).stamp if on_disk else None
+    dests = read_dests(config.confs_path, current, config.cache_dir_name) if current else None
+    if dests is None:
+        dests = build_dests(config)
+        if current:
+            write_dests(config, dests, current)
+    return dests
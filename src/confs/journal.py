@@ -0,0 +1,480 @@
+#!/bin/env python3
+"""
+Write-ahead journal of the writes of a type, so a command interrupted
+half way (killed, crashed or out of disk space) can be rolled back or
+forward instead of leaving the type half switched:
+
+    <confs_path>/.state/journal/<type>.journal
+
+Before changing anything, a write (eg. install, which uninstalls the
+old alt, switches the `enabled` symlink and installs the new alt) writes
+its whole plan to the journal of the type and syncs it to disk: a line
+per step (a JSON object, see KINDS), holding what is needed to apply it
+and to undo it, followed by a line marking the plan complete. Each step
+then appends a line when it begins, and one when it is done (or failed),
+each synced to disk too, and the journal is removed once the write is
+complete. A journal left behind therefore tells which steps were
+applied, which ones may have been applied partly, and which ones were
+not started.
+
+Rolling back undoes the begun steps in reverse order, including the
+failed ones (which may have been applied partly), and rolling
+forward applies the steps which are not done, touching only the paths
+in the journal instead of rescanning the tree. The steps check the state
+they find before changing it, so applying or undoing a step twice (eg.
+after a recovery was interrupted in turn) does nothing, and a path
+changed by someone else in between is reported instead of overwritten.
+Recovery installs and uninstalls targets with force, as the drift of
+their installed copies was checked before the plan was written.
+
+A journal is written under the exclusive lock of its type (see
+confs.locks), so a journal found by a process taking that lock belongs
+to a process which is gone. A Session rolls it back when taking the
+lock, and `confs recover [--forward]` recovers journals explicitly.
+Writes which fail with an error are rolled back right away.
+
+Trees on an in-memory filesystem (see confs.fs) keep their journals in
+memory, only to roll back failed writes.
+"""
+
+import os
+from pathlib import Path
+
+from confs import index
+from confs.confslib import Err, ExpSymlinkErr, IncDataErr, InvOperErr, link_to, log
+
+JOURNAL_DIR_NAME = 'journal' # The directory (in the state directory) containing the journals
+JOURNAL_SUFFIX = '.journal'
+JOURNAL_VERSION = 1
+TMP_SUFFIX = '.confs-tmp'
+
+def journal_path(config, typename) -> Path:
+    return Path(config.confs_path, config.state_dir_name, JOURNAL_DIR_NAME, typename + JOURNAL_SUFFIX)
+
+def exists(config, typename) -> bool:
+    """Returns True if typename has a journal left by an interrupted write."""
+    return config.fs.name == 'os' and os.path.lexists(str(journal_path(config, typename)))
+
+def pending(config) -> list:
+    """Returns the sorted names of the types with a journal left by an interrupted write."""
+    if config.fs.name != 'os':
+        return []
+    try:
+        names = os.listdir(str(Path(config.confs_path, config.state_dir_name, JOURNAL_DIR_NAME)))
+    except OSError:
+        return []
+    return sorted(name[:-len(JOURNAL_SUFFIX)] for name in names if name.endswith(JOURNAL_SUFFIX))
+
+# Steps, each applied and undone from the data in the journal alone
+
+def _link_value(fs, path):
+    """Returns the value of the symlink at path, or None if missing. Raises ValueError for other files."""
+    if fs.is_symlink(path):
+        return str(fs.readlink(path))
+    if fs.lexists(path):
+        raise ValueError(path)
+    return None
+
+def _set_link(config, path, expected, value) -> Err:
+    """Sets the symlink at path (None meaning no symlink) from expected to value."""
+    fs = config.fs
+    path = Path(path)
+    try:
+        current = _link_value(fs, path)
+    except ValueError:
+        return ExpSymlinkErr('`{}` is not a symlink'.format(path))
+    if current == value:
+        return None
+    # Symlinks are replaced by unlinking them first, so a missing one is half way
+    if current is not None and current != expected:
+        return IncDataErr('Symlink `{}` was changed to `{}` in the meantime'.format(path, current))
+    if current is not None:
+        fs.unlink(path)
+    if value is not None:
+        fs.symlink(path, value)
+    return None
+
+def _enabled_event(config, step, before, value):
+    """
+    Appends the enable event of a recovered link step on the enabled
+    symlink of a type, if it changed it, so the change feed (see
+    confs.events) does not keep the alt enabled by the interrupted write.
+    """
+    path = Path(step['path'])
+    if path.name != config.enabled_link_name or before == value:
+        return
+    from confs import events
+    name = lambda link: Path(link).name if link else None
+    events.append(config, 'enable', type=path.parent.name, alt=name(value), previous=name(before), recovered=True)
+
+def _set_text(config, path, expected, value) -> Err:
+    """Sets the content of the file at path (None meaning no file) from expected to value."""
+    fs = config.fs
+    path = Path(path)
+    current = fs.read_text(path) if fs.is_file(path) else None
+    if current == value:
+        return None
+    if current not in (None, '', expected):
+        return IncDataErr('File `{}` was changed in the meantime'.format(path))
+    if value is None:
+        fs.unlink(path)
+    else:
+        tmp_path = Path('{}{}'.format(path, TMP_SUFFIX))
+        fs.write_text(tmp_path, value)
+        fs.replace(tmp_path, path)
+    return None
+
+def _move(config, src, dst) -> Err:
+    fs = config.fs
+    if fs.lexists(dst) and not fs.lexists(src):
+        return None
+    if not fs.lexists(src):
+        return IncDataErr('Neither `{}` nor `{}` exist'.format(src, dst))
+    if fs.lexists(dst):
+        return IncDataErr('Cannot move `{}` to `{}`, which exists'.format(src, dst))
+    fs.rename(src, dst)
+    return None
+
+def _create(config, step) -> Err:
+    fs = config.fs
+    path = Path(step['path'])
+    if fs.lexists(path):
+        return None
+    if step['dir']:
+        fs.mkdir(path)
+    else:
+        fs.touch(path)
+    return None
+
+def _uncreate(config, step) -> Err:
+    fs = config.fs
+    path = Path(step['path'])
+    if not fs.lexists(path):
+        return None
+    if step['dir'] and fs.is_dir(path) and not fs.is_symlink(path):
+        if fs.listdir(path):
+            return IncDataErr('Directory `{}` is not empty anymore, kept it'.format(path))
+        fs.rmdir(path)
+    elif not step['dir'] and fs.is_file(path) and not fs.lstat(path).st_size:
+        fs.unlink(path)
+    else:
+        return IncDataErr('`{}` was changed in the meantime, kept it'.format(path))
+    return None
+
+def _target(config, step):
+    """Returns the Target of the step, standing alone as the type may not load half way."""
+    from confs.confslib import Alt, Target
+    alt_path = Path(step['alt_path'])
+    alt = Alt(name=alt_path.name, config=config, path=alt_path)
+    target = Target(step['target'], Path(step['dest']), alt=alt, config=config,
+                    path=Path(alt_path, config.targets_dir_name, step['target']), mode=step['mode'])
+    target.layer = Path(step['layer']) if step['layer'] else None
+    return target
+
+def _remove_partial(config, step, target):
+    """Removes the partial copy of a materialized target installed where nothing was."""
+    from confs import materialize
+    fs = config.fs
+    dest = Path(target.target)
+    if step['fresh'] and fs.lexists(dest) and not fs.is_symlink(dest) and not materialize.load_manifest(target):
+        materialize.remove(fs, dest)
+
+def _install(config, step) -> Err:
+    target = _target(config, step)
+    if target.is_materialized():
+        _remove_partial(config, step, target)
+    elif target.mode in ('symlink', 'secret') and target.is_installed():
+        return None
+    return target.install(force=True)
+
+def _uninstall(config, step) -> Err:
+    target = _target(config, step)
+    if target.is_materialized():
+        from confs import materialize
+        if not materialize.load_manifest(target):
+            _remove_partial(config, step, target)
+            return None
+    elif target.mode in ('symlink', 'secret') and not target.is_installed():
+        return None
+    err = target.uninstall(force=True)
+    # Only returned by stow when none of its links are left
+    return None if target.mode == 'stow' and isinstance(err, InvOperErr) else err
+
+def _reinstall(config, step) -> Err:
+    """Undoes an uninstall."""
+    target = _target(config, step)
+    if target.mode in ('symlink', 'secret') and target.is_installed():
+        return None
+    return target.install(force=True)
+
+# Kind -> (apply, undo), both taking (config, step) and returning an Err
+KINDS = {
+    'link':      (lambda config, step: _set_link(config, step['path'], step['old'], step['new']),
+                  lambda config, step: _set_link(config, step['path'], step['new'], step['old'])),
+    'write':     (lambda config, step: _set_text(config, step['path'], step['old'], step['new']),
+                  lambda config, step: _set_text(config, step['path'], step['new'], step['old'])),
+    'move':      (lambda config, step: _move(config, step['src'], step['dst']),
+                  lambda config, step: _move(config, step['dst'], step['src'])),
+    'create':    (_create, _uncreate),
+    'install':   (_install, _uninstall),
+    'uninstall': (_uninstall, _reinstall),
+}
+
+class Journal:
+    """The journal of one write to a type, see the module docstring."""
+    def __init__(self, config, typename, operation, identifier=None):
+        self.config = config
+        self.typename = typename
+        self.operation = operation   # The name of the write, eg. install
+        self.identifier = identifier or typename
+        self.steps = []              # The planned steps, dicts with their kind and data
+        self.planned = False         # True once the whole plan is written
+        self.begun = set()           # The indices of the steps which were begun
+        self.done = set()            # ... and done
+        self.failed = {}             # ... and failed, index -> message
+        self.pid = os.getpid()
+        self.path = journal_path(config, typename) if config.fs.name == 'os' else None
+        self._fd = None
+        # Only imported when writing, as exists() is checked by every Session
+        import threading
+        self._mutex = threading.Lock() # Steps may run in parallel (eg. the moves of a migration)
+
+    def __repr__(self):
+        return '<Journal description="{}" steps="{}" begun="{}" done="{}" failed="{}">'.format(
+            self.description, len(self.steps), len(self.begun), len(self.done), len(self.failed))
+
+    @property
+    def description(self) -> str:
+        return '{} {}'.format(self.operation, self.identifier)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+            return False
+        errs = self.rollback()
+        if errs:
+            log('Could not roll back `{}`, see `confs recover`: {}'.format(
+                self.description, '; '.join(str(e) for e in errs)), warning=True)
+        return False
+
+    # Planning
+
+    def plan(self, kind, **data) -> int:
+        """Adds a step to the plan, returning its index."""
+        if kind not in KINDS:
+            raise ValueError('Invalid journal step `{}`'.format(kind))
+        data['kind'] = kind
+        self.steps.append(data)
+        return len(self.steps) - 1
+
+    def plan_target(self, kind, target, fresh=False) -> int:
+        """Plans to install or uninstall target, where fresh is True if nothing is at its destination yet."""
+        return self.plan(kind, type=target.alt.typename, alt=target.alt.name, alt_path=str(Path(target.alt.path).absolute()),
+                         target=target.name, dest=str(Path(target.target).absolute()), mode=target.mode,
+                         layer=str(target.layer) if target.layer else None, fresh=fresh)
+
+    def plan_link(self, path, value) -> list:
+        """Plans to set the symlink at path to value (or to remove it if None), unless it already is."""
+        try:
+            old = _link_value(self.config.fs, path)
+        except ValueError:
+            old = None
+        value = str(value) if value is not None else None
+        return [] if old == value else [self.plan('link', path=str(path), old=old, new=value)]
+
+    def plan_alt(self, alt) -> list:
+        """Plans the writes the next alt.save() makes, returning the indices of their steps."""
+        fs = self.config.fs
+        config = self.config
+        steps = []
+        alt_path = Path(alt.path or Path(alt.conf_type.path, alt.name))
+        targets_path = Path(alt_path, config.targets_dir_name)
+        if not alt.saved:
+            for path in (alt_path, targets_path):
+                if not fs.is_dir(path):
+                    steps.append(self.plan('create', path=str(path), dir=True))
+        for name in sorted(alt.saved_targets - alt.own_target_names()):
+            steps += self.plan_link(Path(targets_path, name), None)
+        for target in alt.targets:
+            if target.is_dirty():
+                path = Path(target.path) if target.path and not target.inherited else Path(targets_path, target.name)
+                steps += self.plan_link(path, None if target.deleted else target.target)
+        meta = alt.collect_meta()
+        if meta != alt.meta:
+            import json
+            meta_path = Path(alt_path, config.alt_meta_name)
+            steps.append(self.plan('write', path=str(meta_path),
+                                   old=fs.read_text(meta_path) if fs.is_file(meta_path) else None,
+                                   new=json.dumps(meta, indent=1, sort_keys=True) if meta else None))
+        return steps
+
+    def plan_enable(self, conf, alt) -> list:
+        """Plans the write of the enabled symlink of conf, for conf.enable_alt_by_name(alt.name)."""
+        path = Path(conf.path or Path(self.config.confs_path, conf.name), self.config.enabled_link_name).absolute()
+        return self.plan_link(path, link_to(self.config, path, Path(alt.path).absolute()))
+
+    # Applying
+
+    def _append(self, record):
+        if self._fd is not None:
+            import json
+            os.write(self._fd, (json.dumps(record, sort_keys=True) + '\n').encode())
+            # Synced like the plan, so after a power loss the journal does not
+            # miss a step which was applied (or begun) on disk
+            os.fsync(self._fd)
+
+    def start(self) -> Err:
+        """Writes the plan to disk, before any of its steps are applied."""
+        self.planned = True
+        if self.path is None or not self.steps:
+            return None
+        import json
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(str(self.path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND | os.O_CLOEXEC, 0o644)
+            lines = [{'version': JOURNAL_VERSION, 'operation': self.operation, 'identifier': self.identifier,
+                      'type': self.typename, 'pid': self.pid}]
+            lines += [dict(step, step=i) for i, step in enumerate(self.steps)]
+            lines.append({'planned': len(self.steps)})
+            os.write(self._fd, ''.join(json.dumps(line, sort_keys=True) + '\n' for line in lines).encode())
+            os.fsync(self._fd)
+        except OSError as e:
+            self.close()
+            return IncDataErr('Could not write the journal `{}`: {}'.format(self.path, e))
+        return None
+
+    def run(self, steps, func) -> Err:
+        """
+        Applies the steps (an index or a list of them) by calling func,
+        returning its Err. Steps of a run without a plan are not journaled.
+        """
+        steps = [steps] if isinstance(steps, int) else list(steps)
+        with self._mutex:
+            for i in steps:
+                self.begun.add(i)
+                self._append({'begin': i})
+        err = func()
+        with self._mutex:
+            for i in steps:
+                if err:
+                    self.failed[i] = str(err)
+                    self._append({'failed': i, 'err': str(err)})
+                else:
+                    self.done.add(i)
+                    self._append({'done': i})
+        return err
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def commit(self):
+        """Removes the journal, as all of its steps were applied."""
+        self.close()
+        if self.path is not None and self.steps:
+            try:
+                os.unlink(str(self.path))
+            except FileNotFoundError:
+                pass
+
+    # Recovery
+
+    def _recover(self, indices, undo) -> list:
+        errs = []
+        for i in indices:
+            step = self.steps[i]
+            before = None
+            try:
+                if step['kind'] == 'link':
+                    try:
+                        before = _link_value(self.config.fs, step['path'])
+                    except ValueError:
+                        pass
+                err = KINDS[step['kind']][1 if undo else 0](self.config, step)
+            except OSError as e:
+                err = IncDataErr('Could not {} step {} ({}): {}'.format('undo' if undo else 'apply', i, step['kind'], e))
+            if err:
+                errs.append(err)
+            elif step['kind'] == 'link':
+                # Installs and uninstalls of targets are appended by Target itself
+                _enabled_event(self.config, step, before, step['old'] if undo else step['new'])
+        # The steps change targets and metadata behind the cached indexes
+        index.invalidate(self.config)
+        if not errs:
+            self.commit()
+        else:
+            self.close()
+        return errs
+
+    def rollback(self) -> list:
+        """
+        Undoes the begun steps, newest first, returning the Errs of the
+        steps which could not be undone. Failed steps are undone too, as
+        they may have been applied partly: undoing a step compares what
+        is on disk with what it expects first, so it only undoes what was
+        applied.
+        """
+        return self._recover(sorted(self.begun, reverse=True), undo=True)
+
+    def forward(self) -> list:
+        """Applies the steps which are not done, returning the Errs of the steps which could not be applied."""
+        if not self.planned:
+            # Nothing was applied before the plan was complete
+            return self._recover([], undo=False)
+        return self._recover([i for i in range(len(self.steps)) if i not in self.done and i not in self.failed],
+                             undo=False)
+
+def load(config, typename):
+    """Returns (err, Journal) of the journal left by an interrupted write of typename."""
+    import json
+    path = journal_path(config, typename)
+    try:
+        with open(str(path)) as f:
+            lines = f.read().split('\n')
+    except OSError as e:
+        return IncDataErr('Could not read the journal `{}`: {}'.format(path, e)), None
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # The line written when interrupted
+            break
+    if not records or records[0].get('version') != JOURNAL_VERSION:
+        return IncDataErr('Invalid journal `{}`'.format(path)), None
+
+    header = records[0]
+    journal = Journal(config, typename, header['operation'], header.get('identifier'))
+    journal.pid = header.get('pid')
+    for record in records[1:]:
+        if 'step' in record:
+            step = dict(record)
+            del step['step']
+            journal.steps.append(step)
+        elif 'planned' in record:
+            journal.planned = record['planned'] == len(journal.steps)
+        elif 'begin' in record:
+            journal.begun.add(record['begin'])
+        elif 'done' in record:
+            journal.done.add(record['done'])
+        elif 'failed' in record:
+            journal.failed[record['failed']] = record.get('err', '')
+    if any(step.get('kind') not in KINDS for step in journal.steps) or \
+       any(i >= len(journal.steps) for i in journal.begun):
+        return IncDataErr('Invalid journal `{}`'.format(path)), None
+    return None, journal
+
+def recover(config, typename, forward=False):
+    """
+    Rolls the journal of typename back (or forward), returning (errs,
+    Journal) where errs are the Errs of the steps which could not be
+    recovered, in which case the journal is kept.
+    """
+    err, journal = load(config, typename)
+    if err:
+        return [err], None
+    return (journal.forward() if forward else journal.rollback()), journal
@@ -0,0 +1,189 @@
+#!/bin/env python3
+"""
+Layered alts, inheriting the targets and content of parent alts.
+
+An alt declares its parents in its metadata, as the names of alts of
+the same type or as <type>/<alt> identifiers:
+
+    {"parents": ["stable"]}
+
+The layers of an alt are the alt itself followed by each of its parents
+and their own parents, depth first, in the order declared. A target is
+declared by the first layer with a target of that name, and its content
+is taken from the first layer containing it, so an alt which only
+differs from its parent in a few files only has to contain those. An
+alt can also declare a target itself to override its destination or
+mode, without copying its content.
+
+Inherited targets are part of the targets of the alt, but are never
+written to its targets directory unless changed (which overrides them).
+
+Resolving the layers of an alt is cached on the config and, on the real
+filesystem, in the cache directory of the confs path:
+
+    <confs_path>/.cache/layers
+
+as JSON, keyed by the path of the alt. An entry is used as long as the
+mtimes of the directory, targets directory and metadata of all its
+layers are unchanged, so loading a layered alt does not have to load
+its parents from other types.
+"""
+
+import os
+from pathlib import Path
+
+from confs import index
+from confs.confslib import IncDataErr
+
+LAYERS_NAME = 'layers'         # The name of the layer cache in the cache directory
+LAYERS_VERSION = 'confs-layers 1'
+
+def layers_path(config):
+    return os.path.join(str(config.confs_path), config.cache_dir_name, LAYERS_NAME)
+
+def parents_of(alt):
+    """Returns the (typename, altname) of the parents declared by alt."""
+    parents = []
+    for parent in alt.parents:
+        typename, _, altname = str(parent).rpartition('/')
+        parents.append((typename or alt.typename, altname))
+    return parents
+
+def _mtime(fs, path):
+    try:
+        return fs.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+def stamp(config, paths):
+    """Returns the mtimes identifying the state of the layers at paths."""
+    fs = config.fs
+    return [[_mtime(fs, p), _mtime(fs, os.path.join(p, config.targets_dir_name)),
+             _mtime(fs, os.path.join(p, config.alt_meta_name))] for p in paths]
+
+def read_cache(config):
+    """Returns the cached resolved layers by alt path, empty if missing or invalid."""
+    import json
+    try:
+        with open(layers_path(config)) as f:
+            cache = json.load(f)
+        return cache['alts'] if cache.get('version') == LAYERS_VERSION else {}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+def write_cache(config, cache):
+    """Atomically writes cache, ignoring write errors."""
+    import json
+    path = layers_path(config)
+    tmp_path = '{}.{}'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': LAYERS_VERSION, 'alts': cache}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+def load_cache(config):
+    """Returns the layer cache of config, read once. The file is only used on the real filesystem."""
+    if config.layers is None:
+        config.layers = read_cache(config) if config.fs.name == 'os' else {}
+    return config.layers
+
+def chain(alt, siblings, seen=None):
+    """
+    Returns (err, alts) of the parents of alt and their own parents, depth
+    first, loading the ones which are not in siblings (alts by name).
+    """
+    from confs.confslib import Alt
+    config = alt.config
+    seen = seen if seen is not None else [(alt.typename, alt.name)]
+    alts = []
+    for typename, altname in parents_of(alt):
+        if (typename, altname) in seen:
+            return IncDataErr('Alt `{}/{}` inherits from itself through `{}/{}`'.format(
+                seen[0][0], seen[0][1], typename, altname)), None
+        parent = siblings.get(altname) if typename == alt.typename else None
+        if parent is None:
+            # The highest repository containing it, in a union (see confs.union)
+            path = next((p for p in (Path(repo, typename, altname) for repo in config.repos())
+                         if config.fs.is_dir(p)), None)
+            if path is None:
+                return IncDataErr('Parent `{}/{}` of alt `{}/{}` does not exist'.format(
+                    typename, altname, alt.typename, alt.name)), None
+            err, parent = Alt.from_alt_path(path, config=config)
+            if err:
+                return err, None
+        err, parents = chain(parent, siblings if typename == alt.typename else {}, seen + [(typename, altname)])
+        if err:
+            return err, None
+        alts += [parent] + parents
+    return None, alts
+
+def resolve_rows(alt, parents):
+    """
+    Returns a row [name, dest, mode, path, content] per target of the layers
+    alt and parents, where path is the targets symlink of the declaring
+    layer and content is the path of the first layer containing the content.
+    """
+    config = alt.config
+    layers = [alt] + parents
+    rows = {}
+    for layer in layers:
+        for t in layer.targets:
+            if t.inherited or t.name in rows:
+                continue
+            rows[t.name] = [t.name, str(t.target), t.mode,
+                            str(Path(layer.path, config.targets_dir_name, t.name)), None]
+    for row in rows.values():
+        row[4] = next((str(layer.path) for layer in layers
+                       if config.fs.lexists(Path(layer.path, row[0]))), str(alt.path))
+    return sorted(rows.values())
+
+def resolve(alt, siblings=None) -> 'Err':
+    """Adds the targets alt inherits from its parents, using the cache while the layers are unchanged."""
+    if not alt.parents:
+        return None
+    config = alt.config
+    cache = load_cache(config)
+    key = index.normpath(alt.path)
+    entry = cache.get(key)
+    if not (entry and stamp(config, entry['layers']) == entry['stamp']):
+        err, parents = chain(alt, siblings or {})
+        if err:
+            return err
+        paths = [str(a.path) for a in [alt] + parents]
+        entry = {'layers': paths, 'stamp': stamp(config, paths), 'rows': resolve_rows(alt, parents)}
+        cache[key] = entry
+        if config.fs.name == 'os':
+            write_cache(config, cache)
+    apply(alt, entry['rows'])
+    return None
+
+def apply(alt, rows):
+    """Adds the inherited targets of rows to alt and points all targets to the layer of their content."""
+    from confs.confslib import Target
+    config = alt.config
+    alt_path = str(alt.path)
+    own = {t.name: t for t in alt.targets if not t.inherited}
+    alt.targets = list(own.values())
+    for name, dest, mode, path, content in rows:
+        target = own.get(name)
+        if target is None:
+            target = Target(name=name, target=Path(dest), alt=alt, config=config, path=Path(path), mode=mode)
+            target.inherited = True
+            target.saved_dest = target.target
+            alt.targets.append(target)
+        target.layer = Path(content) if content != alt_path else None
+
+    alt.contents = []
+    alt.missing_contents = []
+    for t in alt.targets:
+        content_path = t.content_path()
+        if config.fs.exists(content_path) or (alt.packed and not t.layer):
+            alt.contents.append(content_path)
+        else:
+            alt.missing_contents.append(content_path)
@@ -0,0 +1,148 @@
+#!/bin/env python3
+"""
+Directory relative install engine for symlinked targets.
+
+Checking, installing and uninstalling a symlinked target by its absolute
+path makes the kernel walk the whole destination path for each call,
+and the path based checks add a realpath (an lstat per component) and a
+samefile on top. With the destinations of a type spread over a deep
+~/.config, the repeated walks of the same parents dominate an install.
+
+A Linker groups the targets by the directory of their destination,
+opens each of these directories once (see fs.open_dir) and then works
+on the name of the destination inside it, with the *at operations of
+the backend (readlinkat(2), symlinkat(2), unlinkat(2), fstatat(2)):
+
+    is_installed    readlinkat, compared to the link an install writes,
+                    and a stat of the content; the destination is only
+                    followed (fstatat) if the link differs
+    install         symlinkat, and on EEXIST readlinkat, leaving the same
+                    link as it is and replacing another one
+    uninstall       readlinkat as above, then unlinkat
+
+While a Linker is active (as a context manager) it is set as
+config.linker, and Target uses it for the symlinked targets whose
+destination directory was opened. Other modes, and destinations in a
+directory which does not exist, take the path based code. So do the
+destinations inside the destination of a stow or materialized target
+of the batch, as installing it may replace their directory (eg. by
+unfolding a stowed directory, see confs.stow) after it was opened.
+"""
+
+import os
+import errno
+from pathlib import Path
+
+from confs import index
+from confs.confslib import Err, ExpSymlinkErr, IncDataErr, InvOperErr, link_to
+
+class Linker:
+    """The open destination directories of a batch of targets."""
+    def __init__(self, config, targets=()):
+        self.config = config
+        self.fs = config.fs
+        self.dirs = {}           # Directory -> handle, of the opened destination directories
+        self.previous = None     # The linker of config before this one was activated
+        self.open(targets)
+
+    def __repr__(self):
+        return '<Linker dirs="{}">'.format(len(self.dirs))
+
+    def __enter__(self):
+        self.previous = self.config.linker
+        self.config.linker = self
+        return self
+
+    def __exit__(self, *exc):
+        self.config.linker = self.previous
+        self.close()
+
+    @staticmethod
+    def split(target):
+        """Returns (directory, name) of the destination of target."""
+        return os.path.split(index.normpath(target.target))
+
+    def open(self, targets):
+        """Opens the destination directories of the symlinked targets, each once."""
+        targets = list(targets)
+        others = [index.normpath(t.target) for t in targets if t.mode != 'symlink']
+        for directory in sorted(set(self.split(t)[0] for t in targets if t.mode == 'symlink')):
+            if directory in self.dirs or any(directory == o or directory.startswith(o + os.sep) for o in others):
+                continue
+            try:
+                self.dirs[directory] = self.fs.open_dir(directory)
+            except OSError:
+                # Eg. not created yet
+                pass
+
+    def close(self):
+        for handle in self.dirs.values():
+            self.fs.close_dir(handle)
+        self.dirs = {}
+
+    def at(self, target):
+        """Returns (handle, name) of the destination of target, or None if the path based code is needed."""
+        if target.mode != 'symlink':
+            return None
+        directory, name = self.split(target)
+        handle = self.dirs.get(directory)
+        return None if handle is None else (handle, name)
+
+    def _points_to(self, target, handle, name, value, content_path) -> bool:
+        """Returns True if the symlink name of handle, containing value, resolves to content_path."""
+        fs = self.fs
+        try:
+            content = fs.stat(content_path)
+        except OSError:
+            return False
+        if value == str(link_to(self.config, target.target, content_path)):
+            return True
+        # Written differently (eg. by hand), follow it
+        try:
+            st = fs.stat_at(handle, name)
+        except OSError:
+            return False
+        return (st.st_dev, st.st_ino) == (content.st_dev, content.st_ino)
+
+    def is_installed(self, target, content_path) -> bool:
+        handle, name = self.at(target)
+        try:
+            value = self.fs.readlink_at(handle, name)
+        except OSError:
+            # Nothing there, or not a symlink
+            return False
+        return self._points_to(target, handle, name, value, content_path)
+
+    def install(self, target, content_path) -> Err:
+        handle, name = self.at(target)
+        fs = self.fs
+        link = str(link_to(self.config, target.target, content_path))
+        try:
+            fs.symlink_at(handle, name, link)
+            return None
+        except FileExistsError:
+            pass
+        try:
+            if fs.readlink_at(handle, name) == link:
+                # Already installed, as it would be written
+                return None
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            return ExpSymlinkErr('Target dest path `{}` already exists but is not a symlink.'.format(
+                Path(target.target).absolute()))
+        fs.unlink_at(handle, name)
+        fs.symlink_at(handle, name, link)
+        return None
+
+    def uninstall(self, target, content_path) -> Err:
+        handle, name = self.at(target)
+        fs = self.fs
+        try:
+            value = fs.readlink_at(handle, name)
+        except OSError:
+            return InvOperErr('Target `{}` is not installed!'.format(target.path))
+        if not self._points_to(target, handle, name, value, content_path):
+            return IncDataErr('Target: {} is not installed, cannot uninstall!'.format(target.path))
+        fs.unlink_at(handle, name)
+        return None
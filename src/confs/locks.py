@@ -0,0 +1,122 @@
+#!/bin/env python3
+"""
+Advisory per-type locks, so concurrent confs processes (eg. two
+terminals, or a configuration management agent and a user) cannot
+interleave writes to the same type, while operations on different
+types still run in parallel.
+
+Each type has a lock file in the state directory of the confs path:
+
+    <confs_path>/.state/locks/<type>.lock
+
+locked using flock(2): shared while a type is read and exclusive while
+it is written. A Session takes the lock of a type when it first loads
+or writes it, and keeps it until it is released (at the latest when the
+process exits), so the model it caches stays valid.
+
+Locks are polled instead of blocking, so two processes waiting for each
+other (eg. both reading a type the other is writing) fail with a LockErr
+after the lock timeout of the config instead of hanging. The time spent
+waiting is shown in verbose output.
+
+Only trees on the real filesystem are locked, as an in-memory tree (see
+confs.fs) is private to its process. Read-only trees are read unlocked.
+"""
+
+import os
+import time
+import fcntl
+from pathlib import Path
+
+from confs.confslib import LockErr, verbose
+
+LOCKS_DIR_NAME = 'locks' # The directory (in the state directory) containing the lock files
+
+def lock_path(config, typename) -> Path:
+    return Path(config.confs_path, config.state_dir_name, LOCKS_DIR_NAME, '{}.lock'.format(typename))
+
+class Lock:
+    def __init__(self, typename, fd, exclusive):
+        self.typename = typename
+        self.fd = fd               # The open lock file
+        self.exclusive = exclusive # False for a shared lock
+
+    def __repr__(self):
+        return '<Lock typename="{}" exclusive="{}">'.format(self.typename, self.exclusive)
+
+class Locks:
+    """The locks held on the types of a confs path."""
+    def __init__(self, config, timeout=None):
+        self.config = config
+        self.timeout = timeout if timeout is not None else config.lock_timeout
+        self.held = {}    # Typename -> Lock
+        self.waited = 0.0 # The total time spent waiting for locks, in seconds
+
+    def __repr__(self):
+        return '<Locks held="{}">'.format(sorted(self.held))
+
+    def _open(self, typename):
+        path = lock_path(self.config, typename)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            return os.open(str(path), os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        except OSError:
+            try:
+                return os.open(str(path), os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                return None
+
+    def acquire(self, typename, exclusive=False):
+        """
+        Locks typename, returning (err, converted) where converted is True
+        if a shared lock held was converted to an exclusive one. As flock(2)
+        does not convert atomically, the type may have changed in between,
+        and if the conversion times out no lock is held anymore.
+        """
+        if self.config.fs.name != 'os':
+            return None, False
+        held = self.held.get(typename)
+        if held and (held.exclusive or not exclusive):
+            return None, False
+
+        fd = held.fd if held else self._open(typename)
+        if fd is None:
+            verbose('Not locking `{}`, its lock file cannot be created'.format(typename))
+            return None, False
+
+        start = time.monotonic()
+        delay = 0.001
+        flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        while True:
+            try:
+                fcntl.flock(fd, flags)
+                break
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                # Eg. a filesystem without flock support
+                verbose('Not locking `{}`: {}'.format(typename, e))
+                break
+            if time.monotonic() - start > self.timeout:
+                # A failed conversion has already dropped the shared lock
+                self.held.pop(typename, None)
+                os.close(fd)
+                return LockErr('Timed out after {}s waiting for the {} lock of `{}`'.format(
+                    self.timeout, 'exclusive' if exclusive else 'shared', typename)), False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+        waited = time.monotonic() - start
+        self.waited += waited
+        self.held[typename] = Lock(typename, fd, exclusive)
+        verbose('Locked `{}` ({}) after waiting {:.1f} ms'.format(
+            typename, 'exclusive' if exclusive else 'shared', waited * 1000))
+        return None, bool(held)
+
+    def release(self, typename=None):
+        """Releases the lock of typename, or all locks."""
+        for name in [typename] if typename else list(self.held):
+            lock = self.held.pop(name, None)
+            if lock:
+                # Closing the last descriptor releases the flock
+                os.close(lock.fd)
@@ -0,0 +1,297 @@
+#!/bin/env python3
+"""
+Materialized installation of targets, for applications which refuse
+symlinked configs or replace them when saving.
+
+Instead of a symlink, the content of a target is copied, hardlinked or
+reflinked (copy-on-write clone, falling back to a copy) to its
+destination. A manifest of every installed file is kept in the state
+directory of the confs path:
+
+    <confs_path>/.state/manifests/<type>/<alt>/<target>.json
+
+recording the size, mtime and inode of the installed file, the sha256 of
+its content and the size and mtime of the content it was installed from.
+Re-installs only copy files whose content changed, and files whose size
+or mtime differ from the manifest are hashed to detect if the installed
+copy was edited in place (see drift() and sync_back()).
+"""
+
+import os
+import json
+import errno
+import hashlib
+from pathlib import Path
+
+from confs.confslib import ExpSymlinkErr, IncDataErr, InvOperErr, DriftErr
+
+MODES = ('symlink', 'copy', 'hardlink', 'reflink', 'stow', 'secret') # stow and secret are handled by confs.stow and confs.secret
+
+TMP_SUFFIX = '.confs-tmp'
+
+def manifest_path(target) -> Path:
+    alt_path = Path(target.alt.path)
+    return Path(target.config.confs_path, target.config.state_dir_name, 'manifests',
+                alt_path.parent.name, alt_path.name, '{}.json'.format(target.name))
+
+def load_manifest(target):
+    """Returns the manifest of target, or None if it is not installed."""
+    try:
+        return json.loads(target.config.fs.read_text(manifest_path(target)))
+    except (OSError, ValueError):
+        return None
+
+def save_manifest(target, manifest):
+    fs = target.config.fs
+    path = manifest_path(target)
+    fs.mkdir(path.parent, parents=True, exist_ok=True)
+    tmp_path = Path('{}{}'.format(path, TMP_SUFFIX))
+    fs.write_text(tmp_path, json.dumps(manifest, indent=1, sort_keys=True))
+    fs.replace(tmp_path, path)
+
+def remove_manifest(target):
+    try:
+        target.config.fs.unlink(manifest_path(target))
+    except FileNotFoundError:
+        pass
+
+def is_dir(fs, path: Path) -> bool:
+    """Returns True if path is a directory, and not a symlink to one."""
+    return fs.is_dir(path) and not fs.is_symlink(path)
+
+def walk(fs, root: Path):
+    """
+    Yields the relative paths of all entries of root, parents before
+    children, without following symlinks. A file root yields '.'.
+    """
+    if not is_dir(fs, root):
+        yield '.'
+        return
+    dirs = ['']
+    while dirs:
+        rel_dir = dirs.pop(0)
+        names = sorted(fs.listdir(join(root, rel_dir or '.')))
+        subdirs = [name for name in names if is_dir(fs, Path(root, rel_dir, name))]
+        for name in [name for name in names if name not in subdirs] + subdirs:
+            yield os.path.join(rel_dir, name)
+        dirs[0:0] = [os.path.join(rel_dir, name) for name in subdirs]
+
+def join(root: Path, rel: str) -> Path:
+    return root if rel == '.' else Path(root, rel)
+
+def digest(fs, path: Path) -> str:
+    return hashlib.sha256(fs.read_bytes(path)).hexdigest()
+
+def materialize_file(fs, mode, src: Path, dst: Path):
+    """Creates dst from src using mode, atomically replacing dst."""
+    tmp = Path('{}{}'.format(dst, TMP_SUFFIX))
+    if fs.lexists(tmp):
+        fs.unlink(tmp)
+    if mode == 'hardlink':
+        try:
+            fs.link(src, tmp)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            fs.copy(src, tmp)
+    elif mode == 'reflink':
+        try:
+            fs.clone(src, tmp)
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY):
+                raise
+            if fs.lexists(tmp):
+                fs.unlink(tmp)
+            fs.copy(src, tmp)
+    else:
+        fs.copy(src, tmp)
+    fs.replace(tmp, dst)
+
+def file_entry(fs, src: Path, dst: Path, sha256=None) -> dict:
+    sst = fs.lstat(src)
+    dst_st = fs.lstat(dst)
+    return {'size': dst_st.st_size, 'mtime': dst_st.st_mtime_ns, 'ino': dst_st.st_ino,
+            'sha256': sha256 or digest(fs, dst), 'src': [sst.st_size, sst.st_mtime_ns]}
+
+def unchanged(fs, entry, path: Path) -> bool:
+    """Returns True if path still matches its manifest entry, hashing only if the stat differs."""
+    try:
+        st = fs.lstat(path)
+    except FileNotFoundError:
+        return False
+    if 'link' in entry:
+        return fs.is_symlink(path) and fs.readlink(path) == entry['link']
+    if 'dir' in entry:
+        return is_dir(fs, path)
+    if fs.is_symlink(path) or not fs.is_file(path):
+        return False
+    if (st.st_size, st.st_mtime_ns, st.st_ino) == (entry['size'], entry['mtime'], entry['ino']):
+        return True
+    return st.st_size == entry['size'] and digest(fs, path) == entry['sha256']
+
+def same_file(fs, a: Path, b: Path) -> bool:
+    try:
+        return fs.samefile(a, b)
+    except OSError:
+        return False
+
+def drift(target, content_path: Path, manifest=None):
+    """
+    Returns a list of (relpath, change) of files in the installed copy of
+    target edited in place since it was installed, where change is one of
+    'modified', 'added' or 'deleted'.
+    """
+    fs = target.config.fs
+    manifest = manifest or load_manifest(target)
+    if not manifest:
+        return []
+    dest = Path(target.target)
+    files = manifest['files']
+    changes = []
+    for rel, entry in sorted(files.items()):
+        path = join(dest, rel)
+        if unchanged(fs, entry, path) or (target.mode == 'hardlink' and same_file(fs, path, join(content_path, rel))):
+            # A hardlink edited in place also changes the content, so it never drifts
+            continue
+        changes.append((rel, 'modified' if fs.lexists(path) else 'deleted'))
+    if is_dir(fs, dest):
+        changes += [(rel, 'added') for rel in walk(fs, dest) if rel not in files]
+    return changes
+
+def is_installed(target, content_path: Path) -> bool:
+    fs = target.config.fs
+    manifest = load_manifest(target)
+    dest = Path(target.target)
+    return bool(manifest) and fs.lexists(dest) and not fs.is_symlink(dest)
+
+def install(target, content_path: Path, force=False):
+    """
+    Materializes content_path at the destination of target, only
+    copying files changed since the previous install.
+    """
+    fs = target.config.fs
+    dest = Path(target.target)
+    manifest = load_manifest(target)
+    if fs.is_symlink(dest):
+        # Previously installed as a symlink (or dangling), replace it
+        fs.unlink(dest)
+        manifest = None
+    elif fs.lexists(dest) and not manifest:
+        return ExpSymlinkErr('Target dest path `{}` already exists, but is not installed by confs.'.format(dest))
+
+    if manifest and not force:
+        changes = drift(target, content_path, manifest)
+        if changes:
+            return DriftErr('Installed copy `{}` was modified in place ({} changed files), '
+                            'sync it using `confs sync`, or force the install'.format(dest, len(changes)))
+
+    old_files = manifest['files'] if manifest else {}
+    files = {}
+    if fs.is_dir(content_path) and not fs.is_dir(dest):
+        fs.mkdir(dest)
+    for rel in walk(fs, content_path):
+        src = join(content_path, rel)
+        dst = join(dest, rel)
+        entry = old_files.get(rel)
+        if fs.is_symlink(src):
+            linkname = fs.readlink(src)
+            if not (entry and unchanged(fs, entry, dst)) or entry.get('link') != linkname:
+                if fs.lexists(dst):
+                    remove(fs, dst)
+                fs.symlink(dst, linkname)
+            files[rel] = {'link': linkname}
+        elif fs.is_dir(src):
+            if fs.lexists(dst) and not is_dir(fs, dst):
+                fs.unlink(dst)
+            fs.mkdir(dst, exist_ok=True)
+            files[rel] = {'dir': True}
+        else:
+            sst = fs.lstat(src)
+            if entry and 'sha256' in entry and entry['src'] == [sst.st_size, sst.st_mtime_ns] \
+               and unchanged(fs, entry, dst):
+                files[rel] = entry
+                continue
+            if target.mode == 'hardlink' and same_file(fs, src, dst):
+                files[rel] = file_entry(fs, src, dst)
+                continue
+            if fs.lexists(dst) and (fs.is_symlink(dst) or fs.is_dir(dst)):
+                remove(fs, dst)
+            materialize_file(fs, target.mode, src, dst)
+            files[rel] = file_entry(fs, src, dst)
+
+    # Remove files no longer part of the content, deepest first
+    for rel in sorted(set(old_files) - set(files), reverse=True):
+        path = join(dest, rel)
+        if fs.lexists(path):
+            remove(fs, path, only_empty_dirs=True)
+
+    save_manifest(target, {'mode': target.mode, 'dest': str(dest), 'files': files})
+    return None
+
+def remove(fs, path: Path, only_empty_dirs=False):
+    if is_dir(fs, path):
+        if only_empty_dirs:
+            try:
+                fs.rmdir(path)
+            except OSError:
+                pass
+        else:
+            fs.rmtree(path)
+    else:
+        fs.unlink(path)
+
+def uninstall(target, content_path: Path, force=False):
+    """Removes the installed copy of target, refusing if it was edited in place."""
+    fs = target.config.fs
+    manifest = load_manifest(target)
+    dest = Path(target.target)
+    if not manifest or fs.is_symlink(dest):
+        return InvOperErr('Target `{}` is not installed!'.format(target.path))
+    if not force:
+        changes = drift(target, content_path, manifest)
+        if changes:
+            return DriftErr('Installed copy `{}` was modified in place ({} changed files), '
+                            'sync it using `confs sync`, or force the uninstall'.format(dest, len(changes)))
+
+    for rel in sorted(manifest['files'], reverse=True):
+        path = join(dest, rel)
+        if fs.lexists(path):
+            remove(fs, path, only_empty_dirs=True)
+    if fs.lexists(dest):
+        remove(fs, dest, only_empty_dirs=True)
+    remove_manifest(target)
+    if fs.lexists(dest):
+        return IncDataErr('Installed copy `{}` contains files not installed by confs, kept them'.format(dest))
+    return None
+
+def sync_back(target, content_path: Path):
+    """Copies the changes made to the installed copy of target back into its content."""
+    fs = target.config.fs
+    manifest = load_manifest(target)
+    if not manifest:
+        return InvOperErr('Target `{}` is not installed!'.format(target.path))
+    dest = Path(target.target)
+    changes = drift(target, content_path, manifest)
+    for rel, change in changes:
+        src = join(dest, rel)
+        dst = join(content_path, rel)
+        if change == 'deleted':
+            if fs.lexists(dst):
+                remove(fs, dst)
+            manifest['files'].pop(rel, None)
+            continue
+        if fs.is_symlink(src):
+            linkname = fs.readlink(src)
+            if fs.lexists(dst):
+                remove(fs, dst)
+            fs.symlink(dst, linkname)
+            manifest['files'][rel] = {'link': linkname}
+        elif fs.is_dir(src):
+            fs.mkdir(dst, parents=True, exist_ok=True)
+            manifest['files'][rel] = {'dir': True}
+        else:
+            fs.mkdir(dst.parent, parents=True, exist_ok=True)
+            materialize_file(fs, 'copy', src, dst)
+            manifest['files'][rel] = file_entry(fs, dst, src)
+    save_manifest(target, manifest)
+    return None
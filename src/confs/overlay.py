@@ -0,0 +1,212 @@
+#!/bin/env python3
+"""
+Ephemeral home directories, to try an alt in a single process tree
+without installing it (see `confs exec`).
+
+The overlay of an alt is a symlink farm mirroring the home directory:
+every entry of the home directory is a symlink to the real one, except
+the destinations of the targets of the alt, which point to their
+content, and the destinations of the enabled alt of the same type,
+which are hidden. Directories containing such destinations (eg.
+~/.config for ~/.config/nvim) are real directories in the overlay,
+mirroring their real counterparts the same way. Stow targets override
+the entries of their content inside their destination.
+
+The command is run with HOME (and the XDG base directories inside it)
+pointing to the overlay, so nothing outside the overlay changes and the
+other shells keep seeing the installed alt. Writes through the overlay
+go to the real files, except for the content of the alt itself.
+
+Overlays are built in the runtime directory (usually a tmpfs):
+
+    $XDG_RUNTIME_DIR/confs/exec/<type>-<alt>-<hash>/home
+
+and reused as long as their signature, covering the targets of the alt
+and the entries of the mirrored directories, is unchanged. A changed
+overlay is built next to the old one and renamed over it, so processes
+using the old one are not disturbed. Destinations outside of the home
+directory cannot be overlaid and are skipped.
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+
+from confs import index
+from confs.confslib import InvOperErr, IncDataErr, verbose
+
+OVERLAY_DIR_NAME = 'home'  # The overlay, in the cache directory of an alt
+SIGNATURE_NAME = 'signature'
+XDG_DIRS = ('XDG_CONFIG_HOME', 'XDG_DATA_HOME', 'XDG_STATE_HOME', 'XDG_CACHE_HOME')
+
+class Overlay:
+    def __init__(self, identifier, path, home):
+        self.identifier = identifier
+        self.path = path         # The overlay home directory
+        self.home = home         # The real home directory
+        self.overrides = {}      # Relative path -> content path of the targets
+        self.hidden = set()      # Relative paths of the destinations of the enabled alt
+        self.skipped = []        # Destinations outside of the home directory
+        self.reused = False      # True if the cached overlay was used
+
+    def __repr__(self):
+        return '<Overlay identifier="{}" path="{}" reused="{}">'.format(self.identifier, self.path, self.reused)
+
+    def dirs(self):
+        """Returns the relative paths of the directories containing overrides, parents first."""
+        dirs = set()
+        for rel in list(self.overrides) + list(self.hidden):
+            parts = rel.split(os.sep)
+            dirs.update(os.sep.join(parts[:i]) for i in range(1, len(parts)))
+        return sorted(dirs, key=lambda d: (d.count(os.sep), d))
+
+    def signature(self) -> str:
+        """Returns a signature of the overrides and the entries of the mirrored directories."""
+        h = hashlib.sha1()
+        h.update('{}\0{}\n'.format(self.path, self.home).encode())
+        for rel in sorted(self.overrides):
+            h.update('o\0{}\0{}\n'.format(rel, self.overrides[rel]).encode())
+        for rel in sorted(self.hidden):
+            h.update('h\0{}\n'.format(rel).encode())
+        for rel in [''] + self.dirs():
+            h.update('d\0{}\0{}\n'.format(rel, '\0'.join(_listdir(os.path.join(self.home, rel)))).encode())
+        return h.hexdigest()
+
+    def env(self, environ) -> dict:
+        """Returns environ with HOME, and the XDG base directories inside it, pointing to the overlay."""
+        env = dict(environ)
+        env['HOME'] = self.path
+        for name in XDG_DIRS:
+            value = environ.get(name)
+            if value:
+                rel = os.path.relpath(os.path.abspath(value), self.home)
+                if not rel.startswith('..'):
+                    env[name] = os.path.normpath(os.path.join(self.path, rel))
+        env['CONFS_EXEC'] = self.identifier
+        return env
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+def runtime_dir() -> str:
+    """Returns the directory to build overlays in, on tmpfs if possible."""
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base and os.path.isdir(base):
+        return os.path.join(base, 'confs', 'exec')
+    return os.path.join(tempfile.gettempdir(), 'confs-{}'.format(os.getuid()), 'exec')
+
+def cache_path(config, typename, altname) -> str:
+    key = hashlib.sha1(index.normpath(config.confs_path).encode()).hexdigest()[:12]
+    return os.path.join(runtime_dir(), '{}-{}-{}'.format(typename, altname, key))
+
+def plan(conf, alt, home):
+    """Returns (err, Overlay) of alt of conf over home, with its overrides."""
+    config = alt.config
+    overlay = Overlay('{}/{}'.format(conf.name, alt.name),
+                      os.path.join(cache_path(config, conf.name, alt.name), OVERLAY_DIR_NAME), home)
+
+    def relative(dest):
+        rel = os.path.relpath(index.normpath(dest), home)
+        return None if rel.startswith('..') or rel == '.' else rel
+
+    for target in alt.targets:
+        rel = relative(target.target)
+        if rel is None:
+            overlay.skipped.append(str(target.target))
+            continue
+        content = str(target.content_path().absolute())
+        if target.mode == 'secret':
+            # Overlaid with the decrypted secret, never with its ciphertext
+            from confs import secret
+            err, content = secret.decrypted(target, content, dest=os.path.join(overlay.path, rel))
+            if err:
+                return err, None
+            overlay.overrides[rel] = str(content)
+        elif target.mode == 'stow' and os.path.isdir(content):
+            for name in _listdir(content):
+                overlay.overrides[os.path.join(rel, name)] = os.path.join(content, name)
+        else:
+            overlay.overrides[rel] = content
+
+    # The installed alt of the type would otherwise show through
+    enabled = conf.enabled_alt
+    if enabled and enabled is not alt:
+        for target in enabled.targets:
+            rel = relative(target.target)
+            if rel and target.mode != 'stow' and rel not in overlay.overrides:
+                overlay.hidden.add(rel)
+    return None, overlay
+
+def build(overlay, path):
+    """Creates the symlink farm of overlay at path."""
+    dirs = set(overlay.dirs())
+
+    def mirror(rel):
+        real = os.path.join(overlay.home, rel)
+        dst = os.path.join(path, rel)
+        names = set(_listdir(real))
+        names.update(os.path.basename(r) for r in list(overlay.overrides) + list(dirs)
+                     if os.path.dirname(r) == rel)
+        for name in sorted(names):
+            child = os.path.join(rel, name) if rel else name
+            if child in overlay.overrides:
+                os.symlink(overlay.overrides[child], os.path.join(dst, name))
+            elif child in overlay.hidden:
+                continue
+            elif child in dirs:
+                os.mkdir(os.path.join(dst, name))
+                mirror(child)
+            else:
+                os.symlink(os.path.join(real, name), os.path.join(dst, name))
+
+    os.makedirs(path)
+    mirror('')
+
+def prepare(conf, alt, home=None):
+    """Returns (err, Overlay) of alt, building it unless the cached one is still valid."""
+    if alt.config.fs.name != 'os':
+        return InvOperErr('Overlays are only supported on the real filesystem'), None
+    home = index.normpath(home or os.path.expanduser('~'))
+    err, overlay = plan(conf, alt, home)
+    if err:
+        return err, None
+    cache = os.path.dirname(overlay.path)
+    signature = overlay.signature()
+    signature_path = os.path.join(cache, SIGNATURE_NAME)
+    try:
+        with open(signature_path) as f:
+            if f.read() == signature and os.path.isdir(overlay.path):
+                overlay.reused = True
+                return None, overlay
+    except OSError:
+        pass
+
+    # Built next to the old overlay and swapped in, as it may be in use
+    tmp_path = '{}.{}'.format(overlay.path, os.getpid())
+    old_path = '{}.old.{}'.format(overlay.path, os.getpid())
+    try:
+        os.makedirs(cache, mode=0o700, exist_ok=True)
+        if os.path.lexists(tmp_path):
+            shutil.rmtree(tmp_path)
+        build(overlay, tmp_path)
+        if os.path.lexists(overlay.path):
+            os.rename(overlay.path, old_path)
+        os.rename(tmp_path, overlay.path)
+        with open(signature_path + '.tmp', 'w') as f:
+            f.write(signature)
+        os.replace(signature_path + '.tmp', signature_path)
+        if os.path.lexists(old_path):
+            shutil.rmtree(old_path)
+    except OSError as e:
+        return IncDataErr('Could not build the overlay of `{}` at `{}`: {}'.format(
+            overlay.identifier, overlay.path, e)), None
+    verbose('Built the overlay of `{}` at `{}`'.format(overlay.identifier, overlay.path))
+    return None, overlay
+
+def remove(overlay):
+    """Removes the cached overlay."""
+    shutil.rmtree(os.path.dirname(overlay.path), ignore_errors=True)
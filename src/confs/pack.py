@@ -0,0 +1,158 @@
+#!/bin/env python3
+"""
+Cold storage of inactive alts, packing their content into a single xz
+compressed tar archive inside the alt directory:
+
+    <confs_path>/<type>/<alt>/content.tar.xz
+
+The targets directory, metadata and hooks of the alt stay in place, so
+packed alts are still listed and shown (and their destinations still
+conflict) without touching the archive, while scans of the content (eg.
+export, drift and migrations) only see one file.
+
+A packed alt is unpacked when it is enabled or installed, streaming the
+archive into a staging directory in the alt, whose entries are then
+renamed into place before the archive is removed. An interrupted unpack
+leaves the archive, which stays authoritative until it is gone.
+
+Enabling or installing an alt records when it was last used in its
+metadata, so alts unused for a number of days can be packed in bulk (see
+`confs pack --older-than`).
+"""
+
+import os
+import time
+import shutil
+from pathlib import Path
+
+from confs.confslib import InvOperErr, IncDataErr
+
+STAGING_NAME = '.confs-unpack'  # The directory in the alt that an archive is unpacked into
+LAST_USED_RESOLUTION = 3600     # Seconds, the last used time is only updated once it is older
+
+def archive_path(config, alt_path) -> Path:
+    return Path(alt_path, config.pack_name)
+
+def is_packed(config, alt_path) -> bool:
+    return config.fs.is_file(archive_path(config, alt_path))
+
+def skipped_names(config) -> set:
+    """Returns the names of the entries of an alt which are not content (its targets, metadata, hooks or archive)."""
+    return set(config.excluded_altfiles) | {config.targets_dir_name, config.alt_meta_name,
+                                             config.hooks_dir_name, config.pack_name, STAGING_NAME}
+
+def content_names(config, alt_path):
+    """Returns the names of the entries of an alt which are content."""
+    skip = skipped_names(config)
+    return sorted(name for name in config.fs.listdir(alt_path) if name not in skip)
+
+def last_used(config, alt) -> float:
+    """Returns when alt was last enabled or installed, or else last changed."""
+    if alt.last_used:
+        return alt.last_used
+    return config.fs.stat(alt.path).st_mtime_ns / 1e9
+
+def touch(alt, now=None) -> 'Err':
+    """Records that alt is used now, unless it already was recently."""
+    now = int(now if now is not None else time.time())
+    if alt.last_used and now - alt.last_used < LAST_USED_RESOLUTION:
+        return None
+    alt.last_used = now
+    return alt.save_meta()
+
+def _remove(path):
+    if os.path.islink(path) or not os.path.isdir(path):
+        os.unlink(path)
+    else:
+        shutil.rmtree(path)
+
+def pack(config, alt_path) -> 'Err':
+    """Packs the content of the alt at alt_path into its archive, then removes it."""
+    import tarfile
+    if config.fs.name != 'os':
+        return InvOperErr('Packing is only supported on the real filesystem')
+    alt_path = str(alt_path)
+    if is_packed(config, alt_path):
+        return InvOperErr('Alt `{}` is already packed'.format(alt_path))
+    names = content_names(config, alt_path)
+    if not names:
+        return InvOperErr('Alt `{}` has no content to pack'.format(alt_path))
+
+    path = str(archive_path(config, alt_path))
+    tmp_path = '{}.{}'.format(path, os.getpid())
+    try:
+        with tarfile.open(tmp_path, mode='w:xz', format=tarfile.PAX_FORMAT) as tar:
+            for name in names:
+                tar.add(os.path.join(alt_path, name), arcname=name)
+        os.replace(tmp_path, path)
+    except (OSError, tarfile.TarError) as e:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return IncDataErr('Could not pack `{}`: {}'.format(alt_path, e))
+
+    # The archive is complete, so the content can go
+    try:
+        for name in names:
+            _remove(os.path.join(alt_path, name))
+    except OSError as e:
+        return IncDataErr('Packed `{}`, but could not remove its content: {}'.format(alt_path, e))
+    return None
+
+def member_name(member):
+    """Returns the normalized name of member, or None if it would be extracted outside of the alt."""
+    parts = [p for p in member.name.split('/') if p and p != '.']
+    if not parts or member.name.startswith('/') or '..' in parts:
+        return None
+    if not (member.isreg() or member.isdir() or member.issym()):
+        return None
+    return os.path.join(*parts)
+
+def unpack(config, alt_path) -> 'Err':
+    """Streams the archive of the alt at alt_path back into the alt, then removes it."""
+    import tarfile
+    alt_path = str(alt_path)
+    path = str(archive_path(config, alt_path))
+    staging = os.path.join(alt_path, STAGING_NAME)
+    try:
+        if os.path.lexists(staging):
+            _remove(staging)
+        os.mkdir(staging)
+        real_staging = os.path.realpath(staging)
+        dirs = []
+        with tarfile.open(path, mode='r|xz') as tar:
+            for member in tar:
+                name = member_name(member)
+                if name is None:
+                    return IncDataErr('Invalid member `{}` in `{}`'.format(member.name, path))
+                dest = os.path.join(staging, name)
+                # Never write through a symlink extracted before
+                if os.path.commonpath([real_staging, os.path.realpath(os.path.dirname(dest))]) != real_staging:
+                    return IncDataErr('Invalid member `{}` in `{}`'.format(member.name, path))
+                if member.isdir():
+                    os.makedirs(dest, exist_ok=True)
+                    dirs.append((dest, member))
+                elif member.issym():
+                    os.symlink(member.linkname, dest)
+                else:
+                    with tar.extractfile(member) as src, open(dest, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.chmod(dest, member.mode & 0o7777)
+                    os.utime(dest, (member.mtime, member.mtime))
+        # Directories last, as extracting their entries changed them
+        for dest, member in reversed(dirs):
+            os.chmod(dest, member.mode & 0o7777)
+            os.utime(dest, (member.mtime, member.mtime))
+
+        for name in sorted(os.listdir(staging)):
+            dest = os.path.join(alt_path, name)
+            if os.path.lexists(dest):
+                # Left over by an interrupted pack, the archive wins
+                _remove(dest)
+            os.rename(os.path.join(staging, name), dest)
+        os.rmdir(staging)
+        os.unlink(path)
+    except (OSError, tarfile.TarError) as e:
+        return IncDataErr('Could not unpack `{}`: {}'.format(path, e))
+    return None
@@ -0,0 +1,156 @@
+#!/bin/env python3
+"""
+Directory-scoped alt selection: a `.confs` pin file in a directory (eg.
+a work project) names the alts to use below it, one identifier per line:
+
+    # ~/work/.confs
+    git/work
+    editorconfig/work
+
+The shell integration of `confs hook` finds the nearest pin file above
+the current directory with shell builtins only, remembering it for the
+directory, and runs `confs __pin` only when the nearest pin file (or its
+content) changed. The pinned types whose enabled alt differs are then
+installed, and the types pinned before but not anymore are put back to
+the alt enabled before they were pinned, so only the links of the types
+that change are touched. Targets the old and new alt would install
+identically (eg. inherited from a common parent) are left in place, see
+Session.install.
+
+What was applied is kept in the state directory, with the alts each
+pin replaced:
+
+    <confs_path>/.state/pins.json
+
+so `confs __pin` returns without loading the tree when the pin file is
+the one already applied, or when every pinned type is already enabled.
+A pinned type changed by hand in between is left as it is.
+"""
+
+import os
+import json
+from pathlib import Path
+
+from confs import index
+
+PIN_NAME = '.confs'       # The pin file of a directory
+PINS_NAME = 'pins.json'   # The applied pins (in the state directory)
+
+def state_path(confs_path) -> Path:
+    return Path(confs_path, index.STATE_DIR_NAME, PINS_NAME)
+
+def load_state(confs_path) -> dict:
+    try:
+        with open(str(state_path(confs_path))) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+def save_state(confs_path, state):
+    path = state_path(confs_path)
+    tmp_path = Path('{}.tmp'.format(path))
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(tmp_path), 'w') as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(str(tmp_path), str(path))
+    except OSError:
+        # A read-only tree, applied again on the next prompt
+        pass
+
+def parse(text):
+    """Returns (errors, {typename: altname}) of the content of a pin file, a later pin of a type winning."""
+    errors = []
+    pins = {}
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.split('#', 1)[0]
+        for identifier in line.split():
+            typename, _, altname = identifier.partition('/')
+            if not typename or not altname or '/' in altname:
+                errors.append('line {}: invalid pin `{}`, expected type/alt'.format(number, identifier))
+                continue
+            pins[typename] = altname
+    return errors, pins
+
+def read(pin):
+    """Returns (errors, {typename: altname}) of the pin file pin, none if pin is empty."""
+    if not pin:
+        return [], {}
+    try:
+        with open(pin) as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return ['cannot read it: {}'.format(e)], {}
+    return parse(text)
+
+def find(directory):
+    """Returns the nearest pin file in directory or its parents, or None."""
+    directory = os.path.abspath(directory)
+    while True:
+        path = os.path.join(directory, PIN_NAME)
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+def enabled_alt(confs_path, typename):
+    """Returns the name of the enabled alt of typename read from its symlink, without loading the tree."""
+    try:
+        return os.path.basename(os.readlink(os.path.join(str(confs_path), typename, index.ENABLED_LINK_NAME)).rstrip('/'))
+    except OSError:
+        return None
+
+def applied(confs_path, pins, state) -> bool:
+    """Returns True if pins need no change: every pinned type is enabled, and none pinned before is left."""
+    pinned = state.get('pinned', {})
+    return set(pinned) <= set(pins) and all(enabled_alt(confs_path, t) == a for t, a in pins.items())
+
+def apply(session, pins, state, log=None):
+    """
+    Installs the alts of pins, restoring the types no longer pinned, and
+    returns the new state. Each switch is reported by log(message, warning).
+    """
+    from confs.session import ConfsError
+    log = log or (lambda message, warning=False: None)
+    pinned = dict(state.get('pinned', {}))
+
+    for typename in sorted(set(pinned) - set(pins)):
+        entry = pinned.pop(typename)
+        try:
+            conf = session.load(typename)
+            previous = entry.get('previous')
+            if getattr(conf.enabled_alt, 'name', None) != entry['alt'] or previous == entry['alt']:
+                # Switched by hand since it was pinned, or pinned to the alt it had
+                continue
+            if previous and entry.get('installed'):
+                session.install('{}/{}'.format(typename, previous))
+            else:
+                if any(t.is_installed() for t in conf.enabled_alt.targets):
+                    session.uninstall(typename)
+                if previous:
+                    session.enable('{}/{}'.format(typename, previous))
+            log('Restored `{}/{}`'.format(typename, previous) if previous else 'Uninstalled `{}`'.format(typename))
+        except ConfsError as e:
+            log('Unable to restore `{}`: {}'.format(typename, e), warning=True)
+
+    for typename, altname in sorted(pins.items()):
+        identifier = '{}/{}'.format(typename, altname)
+        try:
+            conf, alt = session.get(identifier)
+            enabled = conf.enabled_alt
+            if typename not in pinned:
+                pinned[typename] = {'previous': enabled.name if enabled else None,
+                                    'installed': bool(enabled) and any(t.is_installed() for t in enabled.targets)}
+            pinned[typename]['alt'] = altname
+            if enabled is not alt:
+                result = session.install(identifier)
+                log('Pinned `{}`'.format(identifier))
+                for name, err in sorted(result.failed.items()):
+                    log('Unable to install `{}/{}`: {}'.format(identifier, name, err), warning=True)
+        except ConfsError as e:
+            pinned.pop(typename, None)
+            log('Unable to pin `{}`: {}'.format(identifier, e), warning=True)
+    return dict(state, pinned=pinned)
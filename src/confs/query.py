@@ -0,0 +1,318 @@
+#!/bin/env python3
+"""
+Filter and projection expressions over the types, alts and targets of a
+confs tree, used by `confs query` and Session.query().
+
+An expression is a list of predicates, combined using `and` (implicit
+between two predicates), `or`, `not` and parentheses:
+
+    installed                   A boolean field is true
+    dest^=~/.config             Field starts with the value
+    mode!=symlink               Field does not equal the value
+    enabled and not installed
+
+The operators are = != ^= (prefix) $= (suffix) *= (contains) ~= (glob)
+and < <= > >= for numeric fields. The prefix of a path field (PATH_FIELDS)
+compares whole path components, so dest^=~/.vim matches ~/.vim/vimrc but
+not ~/.vimrc, while the other fields compare strings (type^=vi matches
+vim). Values may be quoted using ' or ", and values starting with ~/ are
+expanded to the home directory.
+
+Each field belongs to a level (type, alt or target) and a query returns
+one row per object of the deepest level used by the filter or the
+selected fields. Fields are evaluated lazily, and only on the rows which
+get that far, so eg. `enabled and not installed` only checks whether
+targets of enabled alts are installed. Queries only using fields which
+are kept in the cached listing (see confs.index) do not load the model.
+"""
+
+import os
+import re
+import fnmatch
+from pathlib import Path
+
+from confs.confslib import InvQueryErr
+
+LEVELS = ('type', 'alt', 'target')
+
+class Field:
+    def __init__(self, name, level, get, indexed=False, help=''):
+        self.name = name        # The name used in expressions
+        self.level = level      # One of LEVELS
+        self.get = get          # Function of (conf, alt, target) returning the value
+        self.indexed = indexed  # True if the value is available in the cached listing
+        self.help = help
+
+    def __repr__(self):
+        return '<Field name="{}" level="{}">'.format(self.name, self.level)
+
+def _missing(conf, alt, target):
+    if alt.packed and not target.layer:
+        return False
+    return not conf.config.fs.exists(target.content_path())
+
+FIELDS = {f.name: f for f in [
+    Field('type', 'type', lambda c, a, t: c.name, True, 'The name of the type'),
+    Field('enabled_alt', 'type', lambda c, a, t: c.enabled_alt.name if c.enabled_alt else '', True,
+          'The name of the enabled alt of the type, empty if none'),
+    Field('num_alts', 'type', lambda c, a, t: len(c.alts), True, 'The number of alts of the type'),
+    Field('alt', 'alt', lambda c, a, t: a.name, True, 'The name of the alt'),
+    Field('enabled', 'alt', lambda c, a, t: a is c.enabled_alt, True, 'Whether the alt is enabled'),
+    Field('num_targets', 'alt', lambda c, a, t: len(a.targets), True, 'The number of targets of the alt'),
+    Field('path', 'alt', lambda c, a, t: str(a.path), False, 'The path of the alt'),
+    Field('packed', 'alt', lambda c, a, t: a.packed, False, 'Whether the content of the alt is packed (see confs pack)'),
+    Field('target', 'target', lambda c, a, t: t.name, True, 'The name of the target'),
+    Field('dest', 'target', lambda c, a, t: str(t.target), False, 'The destination of the target'),
+    Field('mode', 'target', lambda c, a, t: t.mode, False, 'How the target is installed (see confs mode)'),
+    Field('installed', 'target', lambda c, a, t: t.is_installed(), False, 'Whether the target is installed'),
+    Field('missing', 'target', _missing, False, 'Whether the content of the target is missing'),
+    Field('modified', 'target', lambda c, a, t: bool(t.drift()), False,
+          'Whether the installed copy of the target was modified in place'),
+]}
+
+PATH_FIELDS = ('path', 'dest') # Compared by path components by ^=
+
+DEFAULT_FIELDS = {
+    'type': ['type', 'enabled_alt', 'num_alts'],
+    'alt': ['type', 'alt', 'enabled', 'num_targets'],
+    'target': ['type', 'alt', 'target', 'dest', 'mode', 'installed'],
+}
+
+KEYWORDS = ('and', 'or', 'not')
+
+TOKEN_RE = re.compile(r'''\s*(?:
+    (?P<paren>[()])
+  | (?P<op>!=|\^=|\$=|\*=|~=|<=|>=|=|<|>)
+  | "(?P<dquoted>[^"]*)"
+  | '(?P<squoted>[^']*)'
+  | (?P<word>(?:[^\s()=!<>"'^$*~]|[\^$*~!](?!=))+)
+)''', re.VERBOSE)
+
+def tokenize(text):
+    """Returns a list of (kind, value) of text, where kind is paren, op, value or word."""
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = TOKEN_RE.match(text, pos)
+        if not m or m.end() == pos:
+            return InvQueryErr('Unexpected `{}` in query `{}`'.format(text[pos:].strip(), text)), None
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind in ('dquoted', 'squoted'):
+            kind = 'value'
+        tokens.append((kind, value))
+        pos = m.end()
+    return None, tokens
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _truthy(value):
+    return value.lower() in ('true', 'yes', '1')
+
+def compare(actual, op, value, path=False):
+    """Returns the outcome of `actual op value`, where value is a string and path is True for a path field."""
+    if op in ('<', '<=', '>', '>='):
+        a, b = _number(actual), _number(value)
+        if a is None or b is None:
+            return False
+        return {'<': a < b, '<=': a <= b, '>': a > b, '>=': a >= b}[op]
+    if isinstance(actual, bool):
+        equal = actual == _truthy(value)
+        return equal if op == '=' else not equal if op == '!=' else False
+
+    actual = str(actual)
+    if op == '=':
+        return actual == value
+    elif op == '!=':
+        return actual != value
+    elif op == '^=':
+        if not path:
+            return actual.startswith(value)
+        actual, value = Path(os.path.expanduser(actual)), Path(os.path.expanduser(value))
+        return actual == value or value in actual.parents
+    elif op == '$=':
+        return actual.endswith(value)
+    elif op == '*=':
+        return value in actual
+    elif op == '~=':
+        return fnmatch.fnmatchcase(actual, value)
+    return False
+
+class Query:
+    """A parsed expression, see parse()."""
+    def __init__(self, text, predicate, fields):
+        self.text = text
+        self.predicate = predicate # Function of a row returning True if it matches
+        self.fields = fields       # The names of the fields used by the expression
+
+    def __repr__(self):
+        return '<Query text="{}" fields="{}">'.format(self.text, self.fields)
+
+    def matches(self, row) -> bool:
+        return self.predicate(row)
+
+class _Parser:
+    def __init__(self, text, tokens):
+        self.text = text
+        self.tokens = tokens
+        self.pos = 0
+        self.fields = []
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def error(self, msg):
+        raise _ParseError(InvQueryErr('{} in query `{}`'.format(msg, self.text)))
+
+    def keyword(self, token):
+        kind, value = token
+        return value.lower() if kind == 'word' and value.lower() in KEYWORDS else None
+
+    def parse_or(self):
+        left = self.parse_and()
+        while self.keyword(self.peek()) == 'or':
+            self.next()
+            right = self.parse_and()
+            left = (lambda l, r: lambda row: l(row) or r(row))(left, right)
+        return left
+
+    def parse_and(self):
+        left = self.parse_not()
+        while True:
+            token = self.peek()
+            if token[0] is None or token == ('paren', ')') or self.keyword(token) == 'or':
+                return left
+            if self.keyword(token) == 'and':
+                self.next()
+            right = self.parse_not()
+            left = (lambda l, r: lambda row: l(row) and r(row))(left, right)
+
+    def parse_not(self):
+        token = self.peek()
+        if self.keyword(token) == 'not':
+            self.next()
+            inner = self.parse_not()
+            return lambda row: not inner(row)
+        if token == ('paren', '('):
+            self.next()
+            inner = self.parse_or()
+            if self.next() != ('paren', ')'):
+                self.error('Missing `)`')
+            return inner
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        kind, name = self.next()
+        if kind != 'word' or self.keyword((kind, name)):
+            self.error('Expected a field, got `{}`'.format(name) if name else 'Unexpected end')
+        if name not in FIELDS:
+            self.error('Unknown field `{}` (fields: {})'.format(name, ', '.join(FIELDS)))
+        if name not in self.fields:
+            self.fields.append(name)
+
+        if self.peek()[0] != 'op':
+            return lambda row: bool(row[name])
+        _, op = self.next()
+        kind, value = self.next()
+        if kind not in ('word', 'value'):
+            self.error('Expected a value after `{}{}`'.format(name, op))
+        if value.startswith('~/'):
+            value = os.path.expanduser(value)
+        return lambda row: compare(row[name], op, value, name in PATH_FIELDS)
+
+class _ParseError(Exception):
+    def __init__(self, err):
+        self.err = err
+
+def parse(text):
+    """Returns (err, Query) of the expression text. An empty text matches everything."""
+    err, tokens = tokenize(text)
+    if err:
+        return err, None
+    if not tokens:
+        return None, Query(text, lambda row: True, [])
+    parser = _Parser(text, tokens)
+    try:
+        predicate = parser.parse_or()
+        if parser.peek()[0] is not None:
+            parser.error('Unexpected `{}`'.format(parser.peek()[1]))
+    except _ParseError as e:
+        return e.err, None
+    return None, Query(text, predicate, parser.fields)
+
+def level_of(fields, level=None):
+    """Returns the deepest level of fields and level, defaulting to target."""
+    levels = [FIELDS[f].level for f in fields] + ([level] if level else [])
+    if not levels:
+        return 'target'
+    return max(levels, key=LEVELS.index)
+
+def check_fields(fields):
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        return InvQueryErr('Unknown fields: {} (fields: {})'.format(', '.join(unknown), ', '.join(FIELDS)))
+    return None
+
+def is_indexed(fields) -> bool:
+    return all(FIELDS[f].indexed for f in fields)
+
+class Row:
+    """A type, alt or target of the model, computing field values when first used."""
+    def __init__(self, conf, alt=None, target=None):
+        self.objects = (conf, alt, target)
+        self.values = {}
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            self.values[name] = FIELDS[name].get(*self.objects)
+        return self.values[name]
+
+def model_rows(confs, level):
+    """Yields a Row per type, alt or target (by level) of confs."""
+    for conf in confs:
+        if level == 'type':
+            yield Row(conf)
+            continue
+        for alt in sorted(conf.alts, key=lambda a: a.name):
+            if level == 'alt':
+                yield Row(conf, alt)
+                continue
+            for target in sorted(alt.targets, key=lambda t: t.name):
+                yield Row(conf, alt, target)
+
+def index_rows(listing, level):
+    """Yields a dict of the indexed fields per type, alt or target (by level) of a Listing."""
+    by_type = {}
+    for row in listing.rows:
+        by_type.setdefault(row[0], []).append(row)
+
+    for typename, rows in by_type.items():
+        alt_rows = [r for r in rows if len(r) > 1]
+        type_row = {'type': typename, 'num_alts': len(alt_rows),
+                    'enabled_alt': next((r[1] for r in alt_rows if r[2] == '*'), '')}
+        if level == 'type':
+            yield type_row
+            continue
+        for r in alt_rows:
+            alt_row = dict(type_row, alt=r[1], enabled=r[2] == '*', num_targets=len(r) - 3)
+            if level == 'alt':
+                yield alt_row
+                continue
+            for name in r[3:]:
+                yield dict(alt_row, target=name)
+
+def run(query, rows, select):
+    """Yields a dict of the select fields of each of rows matching query."""
+    for row in rows:
+        if query.matches(row):
+            yield {name: row[name] for name in select}
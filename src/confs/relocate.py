@@ -0,0 +1,183 @@
+#!/bin/env python3
+"""
+Relocation of a confs tree, eg. after moving ~/.confs or copying it to
+another user, rewriting every symlink pointing into its old location:
+
+  * the symlinks inside the tree, eg. the `enabled` symlink of each type
+    and symlinks kept in the content of targets
+  * the installed symlinks of the targets, and the per-file symlinks of
+    stow targets below their destination
+
+The links of each group are collected first and then replaced in
+parallel, each one atomically (a new symlink renamed over the old one).
+The links inside the tree go first, as the types only load once their
+`enabled` symlinks are valid again.
+
+With relative links, the links are rewritten relative to their own
+directory and the setting is stored in the tree, so later writes also
+create relative links: moving the tree together with the home directory
+then keeps working, and moving the tree by itself only breaks the
+installed links (outside the tree), which `confs relocate --from` fixes.
+"""
+
+import os
+import errno
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from confs import index
+from confs import layers
+from confs.confslib import InvOperErr, IncDataErr, link_to
+
+TMP_SUFFIX = '.confs-tmp'
+
+class Relocation:
+    """The outcome of a relocation."""
+    def __init__(self, old_path, new_path):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.moved = False # True if the tree was moved by the relocation
+        self.internal = 0  # The number of rewritten links inside the tree
+        self.installed = 0 # The number of rewritten installed links
+        self.failed = []   # (link path, Err) of links which could not be rewritten
+
+    def __repr__(self):
+        return '<Relocation old_path="{}" new_path="{}" internal="{}" installed="{}" failed="{}">'.format(
+            self.old_path, self.new_path, self.internal, self.installed, len(self.failed))
+
+def moved(path, old_path, new_path):
+    """Returns path inside old_path mapped to new_path, or None if it is not inside it."""
+    path = os.path.normpath(path)
+    if path == old_path:
+        return new_path
+    if path.startswith(old_path + os.sep):
+        return new_path + path[len(old_path):]
+    return None
+
+def link_dest(fs, path) -> str:
+    """Returns the absolute, normalized path the symlink path points to."""
+    return os.path.normpath(os.path.join(os.path.dirname(str(path)), str(fs.readlink(path))))
+
+def tree_links(fs, root):
+    """Yields the symlinks below root (skipping .git), without following them."""
+    dirs = [root]
+    while dirs:
+        current = dirs.pop()
+        for name in fs.listdir(current):
+            path = os.path.join(current, name)
+            if fs.is_symlink(path):
+                yield path
+            elif name != '.git' and fs.is_dir(path):
+                dirs.append(path)
+
+def installed_links(fs, content, dest):
+    """Yields the symlinks at dest, and below it along the directories of content (for stow targets)."""
+    if fs.is_symlink(dest):
+        yield dest
+    elif fs.is_dir(dest) and fs.is_dir(content) and not fs.is_symlink(content):
+        for name in fs.listdir(content):
+            yield from installed_links(fs, os.path.join(content, name), os.path.join(dest, name))
+
+def plan_internal(config, old_path, new_path):
+    """Returns a list of (link, new destination) of the links of the tree at new_path into old_path."""
+    fs = config.fs
+    links = []
+    for link in tree_links(fs, new_path):
+        dest = moved(link_dest(fs, link), old_path, new_path)
+        if dest is not None:
+            links.append((link, dest))
+    return links
+
+def plan_installed(session, old_path, new_path):
+    """
+    Returns a list of (link, new destination) of the installed links of the
+    targets of session into old_path. The tree must load, so the links
+    inside it (eg. `enabled`) have to be rewritten first.
+    """
+    fs = session.config.fs
+    links = []
+    seen = set()
+    for conf in session.load():
+        for alt in conf.alts:
+            for target in alt.targets:
+                content = str(target.content_path())
+                for link in installed_links(fs, content, index.normpath(target.target)):
+                    dest = moved(link_dest(fs, link), old_path, new_path)
+                    if dest is not None and link not in seen:
+                        seen.add(link)
+                        links.append((link, dest))
+    return links
+
+def rewrite(config, link, dest):
+    """Atomically replaces the symlink link by one pointing to dest, returning an Err on failure."""
+    fs = config.fs
+    tmp = '{}{}'.format(link, TMP_SUFFIX)
+    try:
+        if fs.lexists(tmp):
+            fs.unlink(tmp)
+        fs.symlink(tmp, link_to(config, link, dest))
+        fs.replace(tmp, link)
+    except OSError as e:
+        return InvOperErr('Could not rewrite `{}`: {}'.format(link, e))
+    return None
+
+def relocate(session, new_path, old_path=None, relative=None, jobs=None):
+    """
+    Moves the tree of session to new_path (unless old_path is given, when
+    it was already moved from old_path) and rewrites all links into its
+    old location. With relative True or False, the links are rewritten
+    (and later created) relative or absolute, else as the tree is set to.
+    Returns (err, Relocation).
+    """
+    config = session.config
+    fs = config.fs
+    new_path = index.normpath(new_path)
+    if old_path is None:
+        old_path = index.normpath(config.confs_path)
+        if fs.lexists(new_path):
+            return IncDataErr('`{}` already exists'.format(new_path)), None
+        # Nothing may change the types while they are moved
+        for typename in session.typenames():
+            session._lock(typename, exclusive=True)
+        try:
+            fs.rename(old_path, new_path)
+        except OSError as e:
+            session.release()
+            if e.errno == errno.EXDEV:
+                return InvOperErr('Cannot move `{}` to another filesystem, copy it and use '
+                                  '`confs relocate --from {} {}`'.format(old_path, old_path, new_path)), None
+            return InvOperErr('Could not move `{}` to `{}`: {}'.format(old_path, new_path, e)), None
+        result = Relocation(old_path, new_path)
+        result.moved = True
+    else:
+        old_path = index.normpath(old_path)
+        if not fs.is_dir(new_path):
+            return IncDataErr('`{}` is not a directory'.format(new_path)), None
+        result = Relocation(old_path, new_path)
+
+    # The locks and the caches of the old location are no longer valid
+    session.release()
+    config.confs_path = Path(new_path)
+    config.dests = None
+    config.layers = None
+    if relative is not None:
+        config.relative_links = relative
+    index.invalidate(config)
+    try:
+        fs.unlink(layers.layers_path(config))
+    except OSError:
+        pass
+
+    with ThreadPoolExecutor(max_workers=jobs or config.jobs) as pool:
+        for kind, links in (('internal', lambda: plan_internal(config, old_path, new_path)),
+                            ('installed', lambda: plan_installed(session, old_path, new_path))):
+            links = links()
+            errs = list(pool.map(lambda entry: rewrite(config, *entry), links))
+            result.failed += [(link, err) for (link, _), err in zip(links, errs) if err]
+            setattr(result, kind, sum(1 for err in errs if not err))
+    session.refresh()
+
+    err = config.save_settings()
+    if err:
+        return err, result
+    return None, result
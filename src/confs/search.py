@@ -0,0 +1,391 @@
+#!/bin/env python3
+"""
+Full text search of the content of all alts (see `confs grep`), using a
+persistent trigram index in the cache directory of the confs path:
+
+    <confs_path>/.cache/search.db
+
+The index is an SQLite database with a row per content file, recording
+its mtime, size and trigram signature: a bloom filter with a bit set
+for each distinct trigram (three consecutive bytes, lowercased) of the
+file. A signature has two to four bits per trigram, up to SIGNATURE_BITS
+(a file of a few lines takes 32 bytes), so the index stays a fraction
+of the size of the content and a changed file rewrites a single row. Before each
+search, the content of the alts is walked and only the files whose
+mtime or size changed are read and indexed again, so an unchanged tree
+costs a stat per file instead of reading every file.
+
+A search first extracts the literal strings every match of the pattern
+has to contain (all of a fixed string, or the literal runs of a regular
+expression outside of groups, classes and optional repetitions), and
+only reads the files whose signature has the bits of all their
+trigrams. Patterns without such literals (eg. containing `|`) read
+every text file. The lines of the candidate files are then matched with
+the regular expression, so the index (whose false positives are only
+read for nothing) never changes the results, only how many files are
+read.
+
+Binary files (containing a NUL byte) and files larger than
+MAX_FILE_SIZE are not indexed nor searched, as with `grep -I`. The
+exclusion rules of the config apply: excluded types, alts and alt files
+(at any depth) are skipped, as are the targets, metadata, hooks and
+archives of the alts. In a union of repositories (see confs.union) the
+overridden alts of lower repositories are skipped.
+
+If the cache directory is not writable the index is built in memory,
+which still works, at the cost of reading every file.
+"""
+
+import os
+import re
+import sqlite3
+import itertools
+import collections
+
+from confs.confslib import InvOperErr, InvQueryErr, IncDataErr
+
+SEARCH_NAME = 'search.db'    # The name of the index in the cache directory
+SEARCH_VERSION = 1           # Stored as the user_version of the database, rebuilt when different
+MAX_FILE_SIZE = 4 * 1024 * 1024
+BINARY_PROBE = 8192          # The number of leading bytes checked for a NUL byte
+SIGNATURE_BITS = 8192        # The maximum size of the trigram signature of a file, a power of 2
+MIN_SIGNATURE_BITS = 256
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    type TEXT NOT NULL,
+    alt TEXT NOT NULL,
+    rel TEXT NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+-- Apart from files, as every search reads all of files but only some of the signatures
+CREATE TABLE IF NOT EXISTS signatures (
+    file INTEGER PRIMARY KEY,  -- Missing for binary and large files
+    signature BLOB NOT NULL
+);
+'''
+
+class Match:
+    def __init__(self, typename, altname, rel, line_number, line):
+        self.typename = typename
+        self.altname = altname
+        self.rel = rel                 # The path of the file relative to the alt, starting with the target
+        self.line_number = line_number # Starting at 1
+        self.line = line
+
+    def __repr__(self):
+        return '<Match file="{}/{}/{}" line="{}">'.format(self.typename, self.altname, self.rel, self.line_number)
+
+    @property
+    def target(self) -> str:
+        return self.rel.split(os.sep, 1)[0]
+
+class Update:
+    """The changes made to the index by an update."""
+    def __init__(self):
+        self.files = 0   # The number of content files
+        self.indexed = 0 # The number of files (re)indexed
+        self.removed = 0 # The number of files no longer in the content
+
+    def __repr__(self):
+        return '<Update files="{}" indexed="{}" removed="{}">'.format(self.files, self.indexed, self.removed)
+
+def index_path(config) -> str:
+    return os.path.join(str(config.confs_path), config.cache_dir_name, SEARCH_NAME)
+
+def connect(config):
+    """Returns a connection to the index, in memory if it cannot be stored in the cache directory."""
+    path = index_path(config)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.access(os.path.dirname(path), os.W_OK):
+            raise PermissionError(path)
+        db = sqlite3.connect(path, timeout=config.lock_timeout)
+        version = db.execute('PRAGMA user_version').fetchone()[0]
+    except (OSError, sqlite3.Error):
+        db = sqlite3.connect(':memory:')
+        version = SEARCH_VERSION
+    if version != SEARCH_VERSION:
+        db.executescript('DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS signatures;')
+    db.executescript(SCHEMA)
+    db.execute('PRAGMA user_version = {}'.format(SEARCH_VERSION))
+    return db
+
+def _files(path, excluded):
+    """Yields (path, rel, stat) of the regular files below the directory path, without following symlinks."""
+    stack = [(path, '')]
+    while stack:
+        path, rel = stack.pop()
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name in excluded:
+                continue
+            # Joined by hand, as this runs for every file on every search
+            entry_rel = rel + os.sep + entry.name if rel else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, entry_rel))
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry_rel, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+def walk(config, typenames=None):
+    """Yields (typename, altname, path, rel, stat) of the content files of all alts (of typenames)."""
+    from confs import index, pack
+    # Absolute, as the paths of the files identify them in the index
+    repos = [index.normpath(config.confs_path)]
+    if config.lower_paths:
+        from confs import union
+        repos += [index.normpath(repo) for repo in union.lower(config)]
+    skipped = pack.skipped_names(config)
+    excluded = set(config.excluded_altfiles)
+    seen = set() # (typename, altname) of the higher repositories of a union
+    for repo in repos:
+        found = set()
+        for type_entry in sorted(os.scandir(repo), key=lambda e: e.name):
+            typename = index._stem(type_entry.name)
+            if typename in config.excluded_conf_types or not type_entry.is_dir() \
+               or (typenames is not None and typename not in typenames):
+                continue
+            for alt_entry in sorted(os.scandir(type_entry.path), key=lambda e: e.name):
+                altname = index._stem(alt_entry.name)
+                if altname in config.excluded_alts or not alt_entry.is_dir(follow_symlinks=False) \
+                   or (typename, altname) in seen:
+                    continue
+                found.add((typename, altname))
+                for path, rel, st in _files(alt_entry.path, excluded | skipped):
+                    yield typename, altname, path, rel, st
+        seen |= found
+
+def trigrams(data: bytes) -> set:
+    """Returns the distinct lowercased trigrams of data."""
+    data = data.lower()
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+class _Bits(dict):
+    """Trigram -> its bit in a signature of size bits (a multiplicative hash, stable across runs), computed once."""
+    def __init__(self, size):
+        self.size = size
+
+    def __missing__(self, trigram):
+        bit = self[trigram] = ((int.from_bytes(trigram, 'big') * 0x9E3779B1) & 0xFFFFFFFF) * self.size >> 32
+        return bit
+
+_bits = {}                             # Size -> _Bits
+_DIGITS = bytes.maketrans(b'\0\1', b'01')
+
+def signature(trigrams, size=None) -> bytes:
+    """
+    Returns the signature of size bits (by default, two to four bits per
+    trigram) with the bits of trigrams set.
+    """
+    if size is None:
+        size = MIN_SIGNATURE_BITS
+        while size < 2 * len(trigrams) and size < SIGNATURE_BITS:
+            size *= 2
+    bits = _bits.get(size) or _bits.setdefault(size, _Bits(size))
+    # A byte per bit, set and packed without a loop in Python, as this runs for every trigram
+    flags = bytearray(size)
+    collections.deque(map(flags.__setitem__, map(bits.__getitem__, trigrams), itertools.repeat(1)), maxlen=0)
+    return int(flags.translate(_DIGITS)[::-1], 2).to_bytes(size // 8, 'little')
+
+def read_text(path, size):
+    """Returns the bytes of the file at path if it is a text file to index, else None."""
+    if size > MAX_FILE_SIZE:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return None if b'\0' in data[:BINARY_PROBE] else data
+
+def update(config, db, typenames=None) -> Update:
+    """
+    Brings the index up to date with the content of the tree (or of the
+    types typenames), reading only the changed files.
+    """
+    result = Update()
+    query = 'SELECT id, path, mtime, size FROM files'
+    if typenames is not None:
+        typenames = sorted(typenames)
+        query += ' WHERE type IN ({})'.format(', '.join('?' * len(typenames)))
+    stored = {path: (id, mtime, size) for id, path, mtime, size in db.execute(query, typenames or ())}
+    changed = []
+    for typename, altname, path, rel, st in walk(config, typenames=typenames):
+        result.files += 1
+        old = stored.pop(path, None)
+        if old and old[1] == st.st_mtime_ns and old[2] == st.st_size:
+            continue
+        changed.append((old[0] if old else None, typename, altname, path, rel, st))
+
+    with db:
+        removed = [(id,) for id, _, _ in stored.values()] + [(id,) for id, *_ in changed if id is not None]
+        db.executemany('DELETE FROM signatures WHERE file = ?', removed)
+        db.executemany('DELETE FROM files WHERE id = ?', removed)
+        result.removed = len(stored)
+        for _, typename, altname, path, rel, st in changed:
+            data = read_text(path, st.st_size)
+            cursor = db.execute('INSERT INTO files (path, type, alt, rel, mtime, size) VALUES (?, ?, ?, ?, ?, ?)',
+                                (path, typename, altname, rel, st.st_mtime_ns, st.st_size))
+            if data is not None:
+                db.execute('INSERT INTO signatures (file, signature) VALUES (?, ?)',
+                           (cursor.lastrowid, signature(trigrams(data))))
+        result.indexed = len(changed)
+    return result
+
+def literals(pattern: str) -> list:
+    """
+    Returns literal strings which every match of the regular expression
+    pattern contains. Only literals outside of groups and classes, and not
+    made optional by a quantifier, are returned, so the list may be empty.
+    """
+    if '|' in pattern:
+        return []
+    runs = []
+    run = ''
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        char = None
+        if c == '\\':
+            escaped = pattern[i + 1:i + 2]
+            i += 2
+            if escaped and not escaped.isalnum():
+                char = escaped
+        elif c == '[':
+            # Skips the class, where a leading ] (after an optional ^) is literal
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+        elif c == '{':
+            i = pattern.find('}', i) + 1 or len(pattern)
+        elif c in '()':
+            depth += 1 if c == '(' else -1
+            i += 1
+        elif c in '.^$*+?':
+            i += 1
+        else:
+            char = c
+            i += 1
+
+        if char is None or depth:
+            runs.append(run)
+            run = ''
+            continue
+        quantifier = pattern[i:i + 1]
+        if quantifier in ('*', '?', '{'):
+            # The character may not appear at all
+            runs.append(run)
+            run = ''
+        elif quantifier == '+':
+            runs.append(run + char)
+            run = ''
+        else:
+            run += char
+    runs.append(run)
+    return [r for r in runs if len(r) >= 3]
+
+def required_trigrams(strings, ignore_case=False) -> set:
+    """Returns the trigrams a file has to contain to contain all of strings."""
+    required = set()
+    for s in strings:
+        found = trigrams(s.encode())
+        if ignore_case:
+            # Only ASCII is lowercased in the index, so other bytes may differ in case
+            found = {t for t in found if max(t) < 0x80}
+        required |= found
+    return required
+
+def compile_pattern(pattern, ignore_case=False, fixed=False):
+    """
+    Returns (err, regex, whole, literals) of pattern, where whole matches a
+    whole file if any of its lines match regex (or is None if unknown).
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    source = re.escape(pattern) if fixed else pattern
+    try:
+        regex = re.compile(source, flags)
+    except re.error as e:
+        return InvQueryErr('Invalid pattern `{}`: {}'.format(pattern, e)), None, None, None
+    # ^ and $ match at every line of a file, but \A and \Z only at its ends
+    whole = re.compile(source, flags | re.MULTILINE) if '\\A' not in source and '\\Z' not in source else None
+    if fixed:
+        return None, regex, whole, [pattern]
+    if regex.flags & re.VERBOSE:
+        # Whitespace in the pattern is not literal
+        return None, regex, whole, []
+    return None, regex, whole, literals(pattern)
+
+def _sizes():
+    """Yields the sizes of signatures."""
+    size = MIN_SIGNATURE_BITS
+    while size <= SIGNATURE_BITS:
+        yield size
+        size *= 2
+
+def candidates(db, required, filters=None):
+    """
+    Returns (type, alt, path, rel) of the text files which may contain all
+    required trigrams, of filters (a list of (typename, altname or None)).
+    """
+    masks = {} # Signature length -> the bits of the required trigrams
+    for length in (size // 8 for size in _sizes()):
+        masks[length] = int.from_bytes(signature(required, size=length * 8), 'little')
+    rows = db.execute('SELECT type, alt, path, rel, signature FROM files JOIN signatures ON file = id '
+                      'ORDER BY type, alt, rel')
+    return [row[:4] for row in rows
+            if int.from_bytes(row[4], 'little') & masks[len(row[4])] == masks[len(row[4])]
+            and (not filters or any(row[0] == typename and (altname is None or row[1] == altname)
+                                    for typename, altname in filters))]
+
+def search(config, pattern, ignore_case=False, fixed=False, filters=None, files_only=False):
+    """
+    Returns (err, matches) of the lines of the content matching pattern, in
+    the alts of filters (a list of (typename, altname or None)) or all alts.
+    With files_only, only the first match of each file is returned.
+    """
+    if config.fs.name != 'os':
+        return InvOperErr('Searching is only supported on the real filesystem'), None
+    err, regex, whole, strings = compile_pattern(pattern, ignore_case=ignore_case, fixed=fixed)
+    if err:
+        return err, None
+    if ignore_case or regex.flags & re.IGNORECASE:
+        ignore_case = True
+    try:
+        db = connect(config)
+        try:
+            update(config, db, typenames={typename for typename, _ in filters} if filters else None)
+            rows = candidates(db, required_trigrams(strings, ignore_case=ignore_case), filters)
+        finally:
+            db.close()
+    except (OSError, sqlite3.Error) as e:
+        return IncDataErr('Could not update the search index `{}`: {}'.format(index_path(config), e)), None
+
+    matches = []
+    for typename, altname, path, rel in rows:
+        data = read_text(path, 0)
+        if data is None:
+            continue
+        text = data.decode('utf-8', errors='replace')
+        if whole and not whole.search(text):
+            continue
+        for number, line in enumerate(text.splitlines(), 1):
+            if regex.search(line):
+                matches.append(Match(typename, altname, rel, number, line))
+                if files_only:
+                    break
+    return None, matches
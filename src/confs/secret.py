@@ -0,0 +1,345 @@
+#!/bin/env python3
+"""
+Secret targets, whose content (eg. a .netrc or an API token) is kept
+encrypted in the confs path and only decrypted into memory backed
+storage (tmpfs) to be installed.
+
+The content of a target in secret mode is encrypted file by file with
+the key of the user (32 random bytes, hex encoded), kept outside the
+confs path so the tree can be shared and committed:
+
+    ~/.config/confs/secret.key   (or the secret_key setting)
+
+Files are encrypted with a stream cipher built from the standard
+library: the key stream is HMAC-SHA256 of a random nonce and a block
+counter (CTR mode), and the nonce and ciphertext are authenticated with
+HMAC-SHA256 (encrypt-then-MAC), using separate keys derived from the
+key. An encrypted file is MAGIC, the nonce, the ciphertext and the tag.
+
+Installing decrypts the content into the decrypt cache, a directory
+private to the user in $XDG_RUNTIME_DIR (or /dev/shm), where each entry
+is named by the destination it is installed to and the sha256 of the
+encrypted content:
+
+    $XDG_RUNTIME_DIR/confs/secrets/<destination hash>-<sha256>
+
+and links the destination to it, like a symlinked target. So installing
+the same content again (eg. re-installing the alt, or switching between
+alts inheriting the secret from a common parent) only hashes it, and
+changed content gets a new entry. As no two destinations share an
+entry, uninstalling one removes its entry without leaving another
+destination dangling. The cache is lost on reboot like the rest of
+the tmpfs, after which the next install decrypts again.
+
+Setting the mode of a target to secret encrypts its content in place,
+and setting another mode decrypts it back (see Session.set_mode).
+"""
+
+import os
+import hmac
+import hashlib
+from pathlib import Path
+
+from confs.confslib import Err, ExpSymlinkErr, IncDataErr, InvOperErr, log
+
+MAGIC = b'confs-secret1\n'
+NONCE_SIZE = 16
+TAG_SIZE = 32
+KEY_SIZE = 32
+BLOCK_SIZE = 32 # The size of a block of the key stream, a SHA256 digest
+CACHE_DIR_NAME = 'secrets'
+
+def key_path(config) -> Path:
+    if config.secret_key:
+        return Path(os.path.expanduser(str(config.secret_key)))
+    return Path(os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config'), 'confs', 'secret.key')
+
+def load_key(config, create=False):
+    """Returns (err, key) of the secret key, creating it if missing and create is True."""
+    return read_key(key_path(config), create=create)
+
+def read_key(path, create=False):
+    """Returns (err, key) of the key file path, creating it if missing and create is True."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY | os.O_CLOEXEC)
+    except FileNotFoundError:
+        if not create:
+            return InvOperErr('No secret key `{}`, it is created when encrypting a target'.format(path)), None
+        return _create_key(path)
+    except OSError as e:
+        return IncDataErr('Could not read the secret key `{}`: {}'.format(path, e)), None
+    try:
+        if os.fstat(fd).st_mode & 0o077:
+            return IncDataErr('Secret key `{}` is accessible by others, run `chmod 600` on it'.format(path)), None
+        text = os.read(fd, 4 * KEY_SIZE).strip()
+    finally:
+        os.close(fd)
+    try:
+        key = bytes.fromhex(text.decode())
+    except (UnicodeDecodeError, ValueError):
+        key = b''
+    if len(key) != KEY_SIZE:
+        return IncDataErr('Invalid secret key `{}`, expected {} hex encoded bytes'.format(path, KEY_SIZE)), None
+    return None, key
+
+def _create_key(path):
+    key = os.urandom(KEY_SIZE)
+    try:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC, 0o600)
+        try:
+            os.write(fd, (key.hex() + '\n').encode())
+        finally:
+            os.close(fd)
+    except FileExistsError:
+        # Created by another process in the meantime
+        return read_key(path)
+    except OSError as e:
+        return IncDataErr('Could not create the secret key `{}`: {}'.format(path, e)), None
+    log('Created the secret key `{}`, back it up: the secret targets cannot be decrypted without it'.format(path), warning=True)
+    return None, key
+
+# Encryption
+#
+# The standard library has no cipher, and confs only depends on docopt:
+# requiring a compiled crypto library (eg. cryptography) for one mode
+# would make every install of confs depend on it. So the cipher is built
+# from HMAC-SHA256 alone, using only standard constructions: HMAC as a
+# PRF in counter mode is a stream cipher (secure as long as a nonce is
+# never reused, which 16 random bytes make negligible), and a MAC over
+# the nonce and the ciphertext, checked before decrypting anything, makes
+# it authenticated encryption (encrypt-then-MAC). The two keys are
+# derived from the key by HMAC with distinct labels, so neither use
+# leaks anything about the other. The format starts with MAGIC, so a
+# vetted cipher can replace this one as another version.
+
+def _keys(key):
+    """Returns the (encryption, authentication) keys derived from key."""
+    return (hmac.new(key, b'confs-secret encryption', hashlib.sha256).digest(),
+            hmac.new(key, b'confs-secret authentication', hashlib.sha256).digest())
+
+def _xor_stream(enc_key, nonce, data) -> bytes:
+    """XORs data with the key stream of nonce, which is its own inverse."""
+    if not data:
+        return b''
+    prf = hmac.new(enc_key, nonce, hashlib.sha256)
+    blocks = []
+    for counter in range((len(data) + BLOCK_SIZE - 1) // BLOCK_SIZE):
+        block = prf.copy()
+        block.update(counter.to_bytes(8, 'big'))
+        blocks.append(block.digest())
+    stream = b''.join(blocks)[:len(data)]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(stream, 'big')).to_bytes(len(data), 'big')
+
+def encrypt(key, data: bytes) -> bytes:
+    enc_key, mac_key = _keys(key)
+    nonce = os.urandom(NONCE_SIZE)
+    sealed = MAGIC + nonce + _xor_stream(enc_key, nonce, data)
+    return sealed + hmac.new(mac_key, sealed, hashlib.sha256).digest()
+
+def decrypt(key, blob: bytes, path=None):
+    """Returns (err, data) of the encrypted blob, read from path (for errors)."""
+    name = ' `{}`'.format(path) if path else ''
+    if not is_encrypted(blob) or len(blob) < len(MAGIC) + NONCE_SIZE + TAG_SIZE:
+        return IncDataErr('File{} is not an encrypted secret'.format(name)), None
+    enc_key, mac_key = _keys(key)
+    sealed, tag = blob[:-TAG_SIZE], blob[-TAG_SIZE:]
+    if not hmac.compare_digest(tag, hmac.new(mac_key, sealed, hashlib.sha256).digest()):
+        return IncDataErr('Secret{} cannot be authenticated, it was modified or encrypted with another key'.format(name)), None
+    nonce = sealed[len(MAGIC):len(MAGIC) + NONCE_SIZE]
+    return None, _xor_stream(enc_key, nonce, sealed[len(MAGIC) + NONCE_SIZE:])
+
+def is_encrypted(data: bytes) -> bool:
+    return data.startswith(MAGIC)
+
+def _files(fs, root: Path):
+    """Returns the relative paths of the files of the content root ('.' for a file content)."""
+    from confs import materialize
+    return [rel for rel in materialize.walk(fs, root)
+            if not materialize.is_dir(fs, materialize.join(root, rel)) and not fs.is_symlink(materialize.join(root, rel))]
+
+def encrypt_content(config, content_path, key) -> Err:
+    """Encrypts the files of content_path in place, skipping those already encrypted."""
+    from confs import materialize
+    fs = config.fs
+    for rel in _files(fs, Path(content_path)):
+        path = materialize.join(Path(content_path), rel)
+        data = fs.read_bytes(path)
+        if not is_encrypted(data):
+            _replace(fs, path, encrypt(key, data))
+    return None
+
+def decrypt_content(config, content_path, key) -> Err:
+    """Decrypts the files of content_path in place, checking all of them first, skipping those not encrypted."""
+    from confs import materialize
+    fs = config.fs
+    plain = []
+    for rel in _files(fs, Path(content_path)):
+        path = materialize.join(Path(content_path), rel)
+        data = fs.read_bytes(path)
+        if not is_encrypted(data):
+            continue
+        err, data = decrypt(key, data, path)
+        if err:
+            return err
+        plain.append((path, data))
+    for path, data in plain:
+        _replace(fs, path, data)
+    return None
+
+def _replace(fs, path, data):
+    from confs.materialize import TMP_SUFFIX
+    tmp_path = Path('{}{}'.format(path, TMP_SUFFIX))
+    fs.write_bytes(tmp_path, data)
+    fs.replace(tmp_path, path)
+
+# The decrypt cache
+
+def cache_root(config):
+    """Returns (err, path) of the decrypt cache of the user, creating it private to the user."""
+    fs = config.fs
+    if config.secret_cache:
+        root = Path(os.path.expanduser(str(config.secret_cache)))
+    elif fs.name != 'os':
+        root = Path('/run/confs', CACHE_DIR_NAME)
+    elif os.environ.get('XDG_RUNTIME_DIR') and os.path.isdir(os.environ['XDG_RUNTIME_DIR']):
+        root = Path(os.environ['XDG_RUNTIME_DIR'], 'confs', CACHE_DIR_NAME)
+    elif os.path.isdir('/dev/shm'):
+        root = Path('/dev/shm', 'confs-{}'.format(os.getuid()), CACHE_DIR_NAME)
+    else:
+        return InvOperErr('No memory backed directory to decrypt secrets into, set XDG_RUNTIME_DIR'), None
+    if fs.name != 'os':
+        fs.mkdir(root, parents=True, exist_ok=True)
+        return None, root
+    for path in (root.parent, root):
+        try:
+            os.mkdir(str(path), 0o700)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            return IncDataErr('Could not create the decrypt cache `{}`: {}'.format(path, e)), None
+        # Eg. /dev/shm is shared by all users
+        st = os.lstat(str(path))
+        if not os.path.isdir(str(path)) or os.path.islink(str(path)) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            return IncDataErr('Decrypt cache `{}` is not a directory private to the user'.format(path)), None
+    return None, root
+
+def digest(fs, content_path) -> str:
+    """Returns the sha256 of the encrypted content, naming its decrypted copy."""
+    from confs.materialize import join
+    h = hashlib.sha256()
+    for rel in _files(fs, Path(content_path)):
+        h.update('{}\0{}\n'.format(rel, hashlib.sha256(fs.read_bytes(join(Path(content_path), rel))).hexdigest()).encode())
+    return h.hexdigest()
+
+def entry_name(target, content_path, dest=None) -> str:
+    """Returns the name of the entry of the decrypt cache of target, for its destination (or dest) and content."""
+    from confs import index
+    dest = hashlib.sha256(index.normpath(dest or target.target).encode()).hexdigest()[:16]
+    return '{}-{}'.format(dest, digest(target.config.fs, content_path))
+
+def decrypted(target, content_path, dest=None):
+    """
+    Returns (err, path) of the decrypted copy of the content of target,
+    decrypting it if not cached, for its destination or the link dest.
+    """
+    from confs import materialize
+    fs = target.config.fs
+    if not fs.lexists(content_path):
+        return InvOperErr('Content `{}` of secret `{}` does not exist'.format(content_path, target.name)), None
+    err, root = cache_root(target.config)
+    if err:
+        return err, None
+    path = Path(root, entry_name(target, content_path, dest))
+    if fs.lexists(path):
+        return None, path
+
+    err, key = load_key(target.config)
+    if err:
+        return err, None
+    tmp_path = Path('{}.{}{}'.format(path, os.getpid(), materialize.TMP_SUFFIX))
+    if fs.lexists(tmp_path):
+        materialize.remove(fs, tmp_path)
+    for rel in materialize.walk(fs, Path(content_path)):
+        src, dst = materialize.join(Path(content_path), rel), materialize.join(tmp_path, rel)
+        if materialize.is_dir(fs, src):
+            _mkdir_private(fs, dst)
+        elif fs.is_symlink(src):
+            fs.symlink(dst, fs.readlink(src))
+        else:
+            err, data = decrypt(key, fs.read_bytes(src), src)
+            if err:
+                if fs.lexists(tmp_path):
+                    materialize.remove(fs, tmp_path)
+                return err, None
+            _write_private(fs, dst, data)
+    try:
+        fs.rename(tmp_path, path)
+    except OSError:
+        if not fs.lexists(path):
+            raise
+        # Decrypted concurrently (the same content, a directory can not be renamed over)
+        materialize.remove(fs, tmp_path)
+    return None, path
+
+def _mkdir_private(fs, path):
+    if fs.name == 'os':
+        os.mkdir(str(path), 0o700)
+    else:
+        fs.mkdir(path)
+
+def _write_private(fs, path, data):
+    if fs.name != 'os':
+        fs.write_bytes(path, data)
+        return
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_CLOEXEC, 0o600)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+def _cached(target):
+    """Returns the entry of the decrypt cache the destination of target links to, or None."""
+    fs = target.config.fs
+    if not fs.is_symlink(target.target):
+        return None
+    err, root = cache_root(target.config)
+    link = Path(str(fs.readlink(target.target)))
+    return link if not err and link.parent == root else None
+
+def install(target, content_path, force=False) -> Err:
+    fs = target.config.fs
+    dest = Path(target.target).absolute()
+    if fs.exists(dest) and not fs.is_symlink(dest):
+        return ExpSymlinkErr('Target dest path `{}` already exists but is not a symlink.'.format(dest))
+    err, path = decrypted(target, content_path)
+    if err:
+        return err
+    if fs.is_symlink(dest):
+        if Path(str(fs.readlink(dest))) == path:
+            return None
+        previous = _cached(target)
+        fs.unlink(dest)
+        if previous and previous != path:
+            purge(target.config, previous)
+    fs.symlink(dest, path)
+    return None
+
+def is_installed(target, content_path) -> bool:
+    fs = target.config.fs
+    cached = _cached(target)
+    return bool(cached) and fs.lexists(cached) and fs.lexists(content_path) and cached.name == entry_name(target, content_path)
+
+def uninstall(target, content_path, force=False) -> Err:
+    cached = _cached(target)
+    if not cached:
+        return InvOperErr('Target `{}` is not installed!'.format(target.path))
+    target.config.fs.unlink(target.target)
+    purge(target.config, cached)
+    return None
+
+def purge(config, path):
+    """Removes the decrypted copy path from the decrypt cache."""
+    from confs import materialize
+    if config.fs.lexists(path):
+        materialize.remove(config.fs, path)
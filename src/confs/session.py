@@ -0,0 +1,937 @@
+#!/bin/env python3
+"""
+Embeddable API for driving confs from Python.
+
+A Session keeps the loaded model cached between calls, so a process can
+run many operations without reloading the tree or forking `confs`:
+
+    from confs.session import Session, ConfsError
+
+    with Session(confs_path='/home/user/.confs') as session:
+        session.install('vim/testing')
+        session.install('tmux/work')
+    # The hooks of both installs are run (batched) when leaving the block
+
+Writes made through a session update the cached model in place. A type
+is only dropped from the cache (and reloaded on next use) when one of
+its writes fails half way, or when refresh() is called because the tree
+was changed by someone else.
+
+Errors are raised as ConfsError (or one of its subclasses), carrying the
+confslib Err in the err attribute, instead of exiting the process.
+
+A session may also drive a union of repositories (see confs.union), by
+giving confs_path as a list of paths or a string of paths separated by
+`:`. Writes to the alts of the lower repositories raise ConfsError.
+
+A session locks each type it loads (shared) or writes (exclusive) until
+release() is called or the block is left, so other processes cannot
+change the types it has cached (see confs.locks).
+
+Writes of several steps (install, uninstall, add and migrate) are
+journaled (see confs.journal): if one fails, the steps it made are
+rolled back, and a write interrupted by the death of its process is
+rolled back by the next session locking the type, or by recover().
+"""
+
+import os
+import time
+from pathlib import Path
+
+from confs.confslib import *
+from confs.hooks import Hooks
+from confs.locks import Locks
+
+class ConfsError(Exception):
+    """Raised when an operation fails. err is the underlying confslib Err, if any."""
+    def __init__(self, err, identifier=None):
+        self.err = err
+        self.identifier = identifier
+        super().__init__(str(err))
+
+    @property
+    def kind(self):
+        """The name of the Err class, eg. ExpSymlinkErr."""
+        return type(self.err).__name__ if isinstance(self.err, Err) else None
+
+class NotFoundError(ConfsError):
+    """Raised when a type, alt or target does not exist."""
+    pass
+
+class ExistsError(ConfsError):
+    """Raised when creating a type, alt or target which already exists."""
+    pass
+
+class ConflictError(ConfsError):
+    """Raised when a destination is already declared by a target of another type."""
+    pass
+
+class DriftError(ConfsError):
+    """Raised when an installed copy was modified in place. changes lists (relpath, change)."""
+    def __init__(self, err, identifier=None, target=None, changes=()):
+        super().__init__(err, identifier)
+        self.target = target
+        self.changes = list(changes)
+
+class Result:
+    """The outcome of an operation acting on several targets."""
+    def __init__(self, identifier):
+        self.identifier = identifier
+        self.uninstalled = None # The identifier of the alt uninstalled first, if any
+        self.done = []          # Names of the targets acted on
+        self.skipped = []       # Names of the targets which needed no action
+        self.failed = {}        # Target name -> Err
+
+    def __repr__(self):
+        return '<Result identifier="{}" done="{}" skipped="{}" failed="{}">'.format(
+            self.identifier, self.done, self.skipped, self.failed)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+def _has_magic(pattern):
+    return any(c in pattern for c in '*?[')
+
+def _glob(pattern):
+    """
+    Returns the paths matching pattern like glob.glob, except that the
+    wildcards match hidden files too (include_hidden, which glob only has
+    since Python 3.11).
+    """
+    import fnmatch
+    paths = [os.sep if pattern.startswith(os.sep) else '']
+    parts = [part for part in pattern.split(os.sep) if part]
+    for i, part in enumerate(parts):
+        matched = []
+        for base in paths:
+            if not _has_magic(part):
+                matched.append(os.path.join(base, part))
+                continue
+            try:
+                names = os.listdir(base or os.curdir)
+            except OSError:
+                continue
+            matched += [os.path.join(base, name) for name in fnmatch.filter(names, part)]
+        # Only directories before a separator, like glob
+        last = i == len(parts) - 1 and not pattern.endswith(os.sep)
+        paths = [path for path in matched if (os.path.lexists(path) if last else os.path.isdir(path))]
+    return paths
+
+def expand_paths(patterns):
+    """
+    Returns the absolute paths of patterns, expanding ~ and glob patterns
+    (including hidden files), without duplicates. Patterns matching
+    nothing are kept as they are, so they can be reported as missing.
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        pattern = os.path.expanduser(str(pattern))
+        matches = []
+        if _has_magic(pattern):
+            matches = sorted(_glob(pattern))
+        for path in matches or [pattern]:
+            path = Path(path).absolute()
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+def split_identifier(identifier, alt_optional=False):
+    """Splits an identifier into (typename, altname), raising ConfsError if invalid."""
+    split = identifier.split('/')
+    if len(split) > 2 or not split[0]:
+        raise ConfsError(InvTypenameErr('Identifier `{}` is invalid! It cannot contain a `/`!'.format(identifier)), identifier)
+    if len(split) == 1:
+        if not alt_optional:
+            raise ConfsError(InvAltNameErr('Alt identifier `{}` is missing alt name!'.format(identifier)), identifier)
+        return (split[0], None)
+    return tuple(split)
+
+class Session:
+    def __init__(self, config: Config = None, confs_path=None, hooks=True, logfile=None, fs=None):
+        if config is None:
+            config = Config(confs_path=confs_path or Config.confs_path,
+                            fs=fs if fs is not None else Config.fs)
+            err = config.load_settings()
+            if err:
+                raise ConfsError(err)
+        self.config = config
+        self.hooks = Hooks(config, enabled=hooks) # Hooks fired by writes, see run_hooks()
+        self.logfile = logfile                    # Where to log each (un)installed target
+        self._confs = {}                          # Typename -> loaded ConfType
+        self._typenames = None                    # Sorted names of all types, once listed
+        self.locks = Locks(config)                # The locks held on the loaded and written types
+
+    def __repr__(self):
+        return '<Session confs_path="{}" loaded="{}">'.format(self.config.confs_path, sorted(self._confs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Hooks may run confs themselves
+        self.release()
+        self.run_hooks()
+        return False
+
+    def release(self):
+        """Releases the locks of the session, dropping the types it cached."""
+        self.locks.release()
+        self.refresh()
+
+    def _lock(self, typename, exclusive=False):
+        """
+        Locks typename, dropping its cached model if the lock was converted,
+        and rolling back a write of it interrupted by the death of its process.
+        """
+        from confs import journal
+        held = self.locks.held.get(typename)
+        # The journal of a live write is gone once its exclusive lock is released
+        interrupted = not (held and held.exclusive) and journal.exists(self.config, typename)
+        err, converted = self.locks.acquire(typename, exclusive=exclusive or interrupted)
+        if err or converted:
+            self._confs.pop(typename, None)
+        if err:
+            raise ConfsError(err, typename)
+        if interrupted and journal.exists(self.config, typename):
+            self._roll_back(typename)
+
+    def _roll_back(self, typename):
+        """Rolls back the interrupted write of typename, see confs.journal."""
+        from confs import journal
+        errs, interrupted = journal.recover(self.config, typename)
+        self._confs.pop(typename, None)
+        description = interrupted.description if interrupted else typename
+        if errs:
+            raise ConfsError(IncDataErr('Could not roll back the interrupted `{}`, see `confs recover`: {}'.format(
+                description, '; '.join(str(e) for e in errs))), typename)
+        log('Rolled back the interrupted `{}`'.format(description), warning=True)
+
+    def _journal(self, typename, operation, identifier=None):
+        """Returns the Journal of a write, rolling it back if the block raises, see confs.journal."""
+        from confs.journal import Journal
+        return Journal(self.config, typename, operation, identifier)
+
+    def _linker(self, targets):
+        """Returns the Linker of targets, opening their destination directories once, see confs.linker."""
+        from confs.linker import Linker
+        return Linker(self.config, targets)
+
+    def _lock_write(self, identifier):
+        self._lock(split_identifier(identifier, alt_optional=True)[0], exclusive=True)
+
+    def _writable(self, alt, identifier):
+        """Raises ConfsError if alt is in a lower repository of a union, which is never written to."""
+        if alt.read_only:
+            raise ConfsError(InvOperErr('Alt `{}` is in the read-only repository `{}`'.format(
+                identifier, Path(alt.path).parent.parent)), identifier)
+
+    def run_hooks(self):
+        """Runs the hooks fired since the last call once, returning their HookResults."""
+        return self.hooks.run()
+
+    def refresh(self, typename=None):
+        """Drops the cached model of typename (or all types) after external changes."""
+        if typename is None:
+            self._confs = {}
+            self._typenames = None
+        else:
+            self._confs.pop(typename, None)
+
+    def _failed(self, typename, err, identifier=None):
+        """Drops the possibly half written type and returns the exception to raise."""
+        self._confs.pop(typename, None)
+        return ConfsError(err, identifier or typename)
+
+    # Reads
+
+    @property
+    def fs(self):
+        """The filesystem backend of the session, see confs.fs."""
+        return self.config.fs
+
+    def typenames(self):
+        if self._typenames is None and self.config.lower_paths:
+            from confs import union
+            self._typenames = union.typenames(self.config)
+        elif self._typenames is None:
+            self._typenames = sorted(p.stem for p in self.fs.iterdir(self.config.confs_path)
+                                     if self.fs.is_dir(p) and p.stem not in self.config.excluded_conf_types)
+        return self._typenames
+
+    def load(self, typename=None):
+        """Returns the ConfType typename, or a list of all types if typename is None."""
+        if typename is None:
+            return [self.load(name) for name in self.typenames()]
+
+        conf = self._confs.get(typename)
+        if conf is None:
+            self._lock(typename)
+            path = Path(self.config.confs_path, typename)
+            if not any(self.fs.is_dir(Path(repo, typename)) for repo in self.config.repos()):
+                raise NotFoundError(InvTypenameErr('No such type: `{}`'.format(typename)), typename)
+            err, conf = ConfType.from_conf_path(path=path, config=self.config)
+            if err:
+                raise ConfsError(err, typename)
+            self._confs[typename] = conf
+        return conf
+
+    def get(self, identifier, alt_optional=False):
+        """Returns (conf, alt) for identifier, where alt is None for a typename."""
+        typename, altname = split_identifier(identifier, alt_optional=alt_optional)
+        conf = self.load(typename)
+        if not altname:
+            return conf, None
+        err, alt = conf.get_alt_by_name(altname)
+        if err:
+            raise NotFoundError(err, identifier)
+        return conf, alt
+
+    def get_target(self, identifier, name):
+        conf, alt = self.get(identifier)
+        err, target = alt.get_target_by_name(name)
+        if err:
+            raise NotFoundError(err, '{}/{}'.format(identifier, name))
+        return target
+
+    def select_targets(self, alt, names, identifier):
+        """Returns the targets of alt named in names (or all), raising if any are missing."""
+        if not names:
+            return list(alt.targets)
+        targetnames = [target.name for target in alt.targets]
+        missing = [name for name in names if name not in targetnames]
+        if missing:
+            raise NotFoundError(InvTargetNameErr('No such targets in `{}`: {}'.format(identifier, missing)), identifier)
+        return [target for target in alt.targets if target.name in names]
+
+    def show(self, identifier=None):
+        """
+        Returns a list of dicts describing all types (type, enabled, alts, installed),
+        or the targets (type, alt, name, dest, mode, installed) of identifier.
+        """
+        if identifier is None:
+            confs = self.load()
+            with self._linker([t for conf in confs if conf.enabled_alt for t in conf.enabled_alt.targets]):
+                return [{'type': conf.name,
+                         'enabled': conf.enabled_alt.name if conf.enabled_alt else None,
+                         'alts': len(conf.alts),
+                         'installed': bool(conf.enabled_alt and any(t.is_installed() for t in conf.enabled_alt.targets))}
+                        for conf in confs]
+
+        conf, alt = self.get(identifier, alt_optional=True)
+        alts = [alt] if alt else conf.alts
+        with self._linker([t for a in alts for t in a.targets]):
+            return [{'type': conf.name, 'alt': a.name, 'name': t.name, 'dest': t.target,
+                     'mode': t.mode, 'installed': t.is_installed()}
+                    for a in alts for t in a.targets]
+
+    def query(self, expression='', select=None, level=None):
+        """
+        Yields a dict of the select fields (or the default fields of the level)
+        of each type, alt or target matching expression, see confs.query.
+        Uses the cached listing instead of the model when it has all the fields.
+        """
+        from confs import query, index
+        err, q = query.parse(expression)
+        if not err and level and level not in query.LEVELS:
+            err = InvQueryErr('Invalid level `{}`, expected one of: {}'.format(level, ', '.join(query.LEVELS)))
+        if not err and select:
+            err = query.check_fields(select)
+        if err:
+            raise ConfsError(err, expression)
+
+        level = query.level_of(q.fields + list(select or []), level)
+        select = list(select or query.DEFAULT_FIELDS[level])
+        if self.fs.name == 'os' and not self._confs and query.is_indexed(q.fields + select):
+            rows = query.index_rows(index.load(self.config), level)
+        else:
+            rows = query.model_rows(self.load(), level)
+        return query.run(q, rows, select)
+
+    def which(self, path):
+        """
+        Returns a list of dicts (type, alt, target, dest, enabled, kind) of the
+        targets owning path: the targets with the longest destination equal to
+        or containing path (kind dest), or the target whose content contains
+        path (kind content).
+        """
+        from confs import index
+        path = index.normpath(path)
+        owners = []
+        for root in (index.normpath(repo) for repo in self.config.repos()):
+            if not path.startswith(root + os.sep):
+                continue
+            parts = path[len(root) + 1:].split(os.sep)
+            if len(parts) >= 3 and parts[0] not in self.config.excluded_conf_types \
+               and parts[1] not in self.config.excluded_alts \
+               and parts[2] not in (self.config.targets_dir_name, self.config.alt_meta_name):
+                dest, kind = os.path.join(root, *parts[:3]), 'content'
+                owners = [(Path(parts[0]).stem, Path(parts[1]).stem, Path(parts[2]).stem)]
+            break
+        if not owners:
+            dest, owners = index.load_dests(self.config).lookup(path)
+            kind = 'dest'
+
+        if self.fs.name == 'os':
+            enabled_alt = index.load(self.config).enabled_alt
+        else:
+            enabled_alt = lambda typename: getattr(self.load(typename).enabled_alt, 'name', None)
+        return [{'type': t, 'alt': a, 'target': n, 'dest': dest, 'enabled': enabled_alt(t) == a, 'kind': kind}
+                for t, a, n in owners]
+
+    def grep(self, pattern, identifiers=None, ignore_case=False, fixed=False, files_only=False):
+        """
+        Returns the list of search.Match of the lines of the content of the
+        alts matching the regular expression (or fixed string) pattern, in
+        the types or alts of identifiers, else in all alts (see confs.search).
+        """
+        from confs import search
+        filters = [split_identifier(identifier, alt_optional=True) for identifier in identifiers or ()]
+        err, matches = search.search(self.config, pattern, ignore_case=ignore_case, fixed=fixed,
+                                     filters=filters, files_only=files_only)
+        if err:
+            raise ConfsError(err)
+        return matches
+
+    def events(self, since=0, follow=False):
+        """
+        Returns the events (dicts) of the change feed after the sequence
+        number since, or with follow an endless iterator also yielding each
+        new event as it is appended (see confs.events).
+        """
+        from confs import events
+        if self.fs.name != 'os':
+            raise ConfsError(InvOperErr('Trees on an in-memory filesystem have no change feed'))
+        if follow:
+            return events.follow(self.config, since=since)
+        return events.read(self.config, since=since)
+
+    # Writes
+
+    def create(self, identifier):
+        """
+        Creates a type and/or alt, the alt defaults to `default`.
+        Returns (created_type, conf, alt).
+        """
+        typename, altname = split_identifier(identifier, alt_optional=True)
+        self._lock(typename, exclusive=True)
+        exists = typename in self.typenames()
+        if exists and not altname:
+            raise ExistsError(InvTypenameErr('Conf type `{}` already exists!'.format(typename)), identifier)
+
+        conf = None
+        if exists:
+            try:
+                conf = self.load(typename)
+            except ConfsError:
+                # Fall back to (re)creating the type
+                pass
+        if conf and conf.get_alt_by_name(altname)[1]:
+            raise ExistsError(InvAltNameErr('Alt `{}` already exists!'.format(identifier)), identifier)
+
+        altname = altname or 'default'
+        if not conf:
+            conf = ConfType(name=typename, config=self.config, path=Path(self.config.confs_path, typename))
+        err, alt = conf.create_alt(altname, write_now=False)
+        if err:
+            raise self._failed(typename, err, identifier)
+        if not conf.enabled_alt:
+            conf.enabled_alt = alt
+
+        err = conf.save()
+        if err:
+            raise self._failed(typename, err, identifier)
+        self._confs[typename] = conf
+        if not exists:
+            self._typenames = None
+        return (not exists, conf, alt)
+
+    def enable(self, identifier):
+        """Sets the enabled symlink of the type to the alt identifier, returning the alt."""
+        self._lock_write(identifier)
+        conf, alt = self._activate(identifier)
+        err = conf.enable_alt_by_name(alt.name, write_now=True)
+        if err:
+            raise self._failed(conf.name, err, identifier)
+        self.hooks.fire('enable', conf, alt)
+        return alt
+
+    def _activate(self, identifier):
+        """
+        Returns (conf, alt) of the alt identifier which is about to be
+        enabled, unpacking it if packed and recording that it was used.
+        """
+        from confs import pack
+        conf, alt = self.get(identifier)
+        if alt.read_only:
+            # Used as it is, as the repository is never written to
+            if alt.packed:
+                raise ConfsError(InvOperErr('Alt `{}` is packed in the read-only repository `{}`'.format(
+                    identifier, Path(alt.path).parent.parent)), identifier)
+            return conf, alt
+        if alt.packed:
+            err = pack.unpack(self.config, alt.path)
+            if err:
+                raise self._failed(conf.name, err, identifier)
+            verbose('Unpacked `{}`'.format(identifier))
+            # Reloaded, as the layers of the alt are resolved from its content
+            self.refresh(conf.name)
+            conf, alt = self.get(identifier)
+        err = pack.touch(alt)
+        if err:
+            raise self._failed(conf.name, err, identifier)
+        return conf, alt
+
+    def check_drift(self, target, force=False, on_drift=None):
+        """
+        Raises DriftError if the installed copy of target was modified in place,
+        unless force is set or on_drift(target) returns True (eg. after syncing it).
+        """
+        if force or not target.is_materialized():
+            return
+        changes = target.drift()
+        if not changes or (on_drift and on_drift(target)):
+            return
+        raise DriftError(DriftErr('Installed copy `{}` was modified in place'.format(target.target)),
+                         target.name, target=target, changes=changes)
+
+    def install(self, identifier, targets=None, force=False, on_drift=None):
+        """
+        Uninstalls the enabled alt of the type, enables the alt identifier
+        and installs all, or only the named, targets of it.
+        """
+        self._lock_write(identifier)
+        conf, alt = self._activate(identifier)
+        selected = self.select_targets(alt, targets, identifier)
+        result = Result(identifier)
+
+        # NOTE: Uninstalls regardless of whether its also the one to be installed.
+        old = conf.enabled_alt
+        if old:
+            for target in old.targets:
+                self.check_drift(target, force=force, on_drift=on_drift)
+
+        with self._linker((old.targets if old else []) + selected), self._journal(conf.name, 'install', identifier) as journal:
+            installed = [t for t in old.targets if t.is_installed()] if old else []
+            # The symlinks the new alt would recreate as they are (eg. of the
+            # targets of a common parent) are left in place
+            kept = {} # The name of the new target -> the name of the old one
+            if old:
+                # Reinstalled secrets are kept too, instead of being decrypted again
+                links = {(Path(t.target).absolute(), t.content_path(), t.mode): t.name for t in installed
+                         if t.mode == 'secret' or (t.mode == 'symlink' and old is not alt)}
+                for t in selected:
+                    key = (Path(t.target).absolute(), t.content_path(), t.mode)
+                    if key in links:
+                        kept[t.name] = links[key]
+            installed = [t for t in installed if t.name not in kept.values()]
+            uninstalling = [journal.plan_target('uninstall', t) for t in installed]
+            enabling = journal.plan_enable(conf, alt)
+            # Destinations freed by the uninstall count as fresh
+            freed = set(Path(t.target).absolute() for t in installed)
+            installing = [None if t.name in kept else
+                          journal.plan_target('install', t, fresh=Path(t.target).absolute() in freed or not self.fs.lexists(t.target))
+                          for t in selected]
+            err = journal.start()
+            if err:
+                raise self._failed(conf.name, err, identifier)
+
+            if old:
+                err = journal.run(uninstalling, lambda: old.uninstall(logfile=self.logfile, force=force, keep=set(kept.values())))
+                if err:
+                    raise self._failed(conf.name, err, '{}/{}'.format(conf.name, old.name))
+                result.uninstalled = '{}/{}'.format(conf.name, old.name)
+                self.hooks.fire('uninstall', conf, old)
+
+            err = journal.run(enabling, lambda: conf.enable_alt_by_name(alt.name, write_now=True))
+            if err:
+                raise self._failed(conf.name, err, identifier)
+            self.hooks.fire('enable', conf, alt)
+
+            for target, step in zip(selected, installing):
+                if step is None:
+                    result.done.append(target.name)
+                    continue
+                if self.logfile:
+                    print('Installing target: `{}` --> `{}`'.format(target.name, target.target), file=self.logfile)
+                err = journal.run(step, lambda: target.install(force=force))
+                if err:
+                    result.failed[target.name] = err
+                else:
+                    result.done.append(target.name)
+        self.hooks.fire('install', conf, alt)
+        return result
+
+    def uninstall(self, typename, targets=None, force=False, on_drift=None):
+        """Uninstalls all, or only the named, targets of the enabled alt of typename."""
+        self._lock_write(typename)
+        conf = self.load(typename)
+        if not conf.enabled_alt:
+            raise ConfsError(InvOperErr('Conf type `{}` is not installed!'.format(typename)), typename)
+        alt = conf.enabled_alt
+        identifier = '{}/{}'.format(typename, alt.name)
+        result = Result(identifier)
+
+        selected = self.select_targets(alt, targets, identifier)
+        with self._linker(selected):
+            uninstalling = []
+            for target in selected:
+                if not target.is_installed():
+                    result.skipped.append(target.name)
+                    continue
+                try:
+                    self.check_drift(target, force=force, on_drift=on_drift)
+                except DriftError as e:
+                    result.failed[target.name] = e.err
+                    continue
+                uninstalling.append(target)
+
+            with self._journal(typename, 'uninstall', identifier) as journal:
+                steps = [journal.plan_target('uninstall', target) for target in uninstalling]
+                err = journal.start()
+                if err:
+                    raise self._failed(typename, err, identifier)
+                for target, step in zip(uninstalling, steps):
+                    if self.logfile:
+                        print('Uninstalling target: `{}` --> `{}`'.format(target.name, target.target), file=self.logfile)
+                    err = journal.run(step, lambda: target.uninstall(force=force))
+                    if err:
+                        result.failed[target.name] = err
+                    else:
+                        result.done.append(target.name)
+        self.hooks.fire('uninstall', conf, alt)
+        return result
+
+    def add(self, identifier, name, dest, is_file=False, mode='symlink'):
+        """
+        Adds the target name, installing to dest, to the alt identifier
+        and creates its (empty) content. Returns the Target.
+        """
+        self._lock_write(identifier)
+        conf, alt = self.get(identifier)
+        self._writable(alt, identifier)
+        existing = alt.get_target_by_name(name)[1]
+        if existing and not existing.inherited:
+            raise ExistsError(InvTargetNameErr('Target `{}` already exists in `{}`'.format(name, identifier)), identifier)
+
+        err, target = alt.add_target(name, Path(dest).absolute(), write_now=False, mode=mode)
+        if isinstance(err, DestConflictErr):
+            raise ConflictError(err, identifier)
+        if err:
+            raise self._failed(conf.name, err, identifier)
+
+        key = None
+        if mode == 'secret':
+            from confs import secret
+            err, key = secret.load_key(self.config, create=True)
+            if err:
+                alt.targets.remove(target)
+                raise ConfsError(err, identifier)
+
+        content_path = Path(alt.path, name).absolute()
+        with self._journal(conf.name, 'add', '{}/{}'.format(identifier, name)) as journal:
+            saving = journal.plan_alt(alt)
+            # Existing content fails below, and is never removed
+            creating = [] if self.fs.lexists(content_path) else [journal.plan('create', path=str(content_path), dir=not is_file)]
+            err = journal.start()
+            if err:
+                raise self._failed(conf.name, err, identifier)
+            err = journal.run(saving, alt.save)
+            if err:
+                raise self._failed(conf.name, err, identifier)
+            journal.run(creating, lambda: self.fs.touch(content_path) if is_file else self.fs.mkdir(content_path))
+        if key:
+            # The (empty) content is encrypted like the rest of the secret
+            err = secret.encrypt_content(self.config, content_path, key)
+            if err:
+                raise self._failed(conf.name, err, identifier)
+        alt.contents.append(content_path)
+        return target
+
+    def migrate(self, identifier, paths, jobs=None):
+        """
+        Moves each of paths (which may be glob patterns) into a new target
+        of the alt identifier, replacing it with a symlink to its new location.
+
+        The whole batch is validated before anything is moved, the paths
+        are moved in parallel (up to jobs, by default config.jobs) and the
+        alt is written once. If any step fails, the whole batch is rolled back.
+        """
+        self._lock_write(identifier)
+        from confs import index
+        conf, alt = self.get(identifier)
+        self._writable(alt, identifier)
+        fs = self.fs
+
+        # Validate all paths, and the batch against itself
+        batch = [] # [(source path, content path, Target)]
+        names = set(t.name for t in alt.targets)
+        batch_dests = index.Dests()
+        try:
+            for mpath in expand_paths(paths):
+                name = mpath.stem
+                contents_path = Path(alt.path, name).absolute()
+                if not fs.lexists(mpath):
+                    raise NotFoundError(InvTargetPathErr('Path `{}` does not exist'.format(mpath)), identifier)
+                if name in names:
+                    raise ExistsError(InvTargetNameErr('Target `{}` already exists in `{}`'.format(name, identifier)), identifier)
+                if fs.lexists(contents_path):
+                    raise ExistsError(InvTargetNameErr('Content `{}` already exists'.format(contents_path)), identifier)
+                conflicts = batch_dests.conflicts(mpath, conf.name, alt.name, name)
+                if conflicts:
+                    raise ConflictError(DestConflictErr('Destination `{}` conflicts with `{}` of the same batch'.format(
+                        mpath, conflicts[0][0])), identifier)
+                batch_dests.add(mpath, conf.name, alt.name, name)
+                names.add(name)
+
+                err, target = alt.add_target(name, mpath, write_now=False)
+                if isinstance(err, DestConflictErr):
+                    raise ConflictError(err, '{}/{}'.format(identifier, name))
+                elif err:
+                    raise ConfsError(err, '{}/{}'.format(identifier, name))
+                batch.append((mpath, contents_path, target))
+        except ConfsError:
+            # Nothing was written yet
+            for _, _, target in batch:
+                alt.targets.remove(target)
+            raise
+
+        if not batch:
+            return Result(identifier)
+
+        with self._linker([target for _, _, target in batch]), self._journal(conf.name, 'migrate', identifier) as journal:
+            steps = [(journal.plan('move', src=str(mpath), dst=str(contents_path)),
+                      journal.plan_target('install', target, fresh=True)) for mpath, contents_path, target in batch]
+            saving = journal.plan_alt(alt)
+            err = journal.start()
+            if err:
+                raise self._failed(conf.name, err, identifier)
+
+            def move(entry, entry_steps):
+                """Moves one path and links it back, returning an Err."""
+                mpath, contents_path, target = entry
+                def rename():
+                    try:
+                        fs.rename(mpath, contents_path)
+                    except OSError as e:
+                        return InvOperErr('Could not move `{}` to `{}`: {}'.format(mpath, contents_path, e))
+                    return None
+                def link():
+                    try:
+                        return target.install()
+                    except OSError as e:
+                        return InvOperErr('Could not link `{}` to `{}`: {}'.format(mpath, contents_path, e))
+                return journal.run(entry_steps[0], rename) or journal.run(entry_steps[1], link)
+
+            jobs = min(jobs or self.config.jobs, len(batch))
+            if jobs > 1 and fs.name == 'os':
+                from concurrent.futures import ThreadPoolExecutor
+                with ThreadPoolExecutor(max_workers=jobs) as pool:
+                    errs = list(pool.map(move, batch, steps))
+            else:
+                errs = [move(entry, entry_steps) for entry, entry_steps in zip(batch, steps)]
+
+            errs = [err for err in errs if err]
+            err = errs[0] if errs else journal.run(saving, alt.save)
+            if err:
+                # Rolls back the whole batch
+                raise self._failed(conf.name, err, identifier)
+
+        result = Result(identifier)
+        for mpath, contents_path, _ in batch:
+            alt.contents.append(contents_path)
+            result.done.append(str(mpath))
+        return result
+
+    def recover(self, typenames=None, forward=False):
+        """
+        Rolls back (or forward) the writes of typenames (or of all types)
+        interrupted by the death of their process, see confs.journal.
+        Returns [(typename, description, errs)] where errs are the Errs of
+        the steps which could not be recovered, in which case the journal
+        is kept to recover again.
+        """
+        from confs import journal
+        typenames = list(typenames or journal.pending(self.config))
+        for typename in typenames:
+            if not journal.exists(self.config, typename):
+                raise NotFoundError(InvOperErr('No interrupted write of `{}` to recover'.format(typename)), typename)
+        recovered = []
+        for typename in typenames:
+            # Not _lock(), which would roll it back
+            err, _ = self.locks.acquire(typename, exclusive=True)
+            self._confs.pop(typename, None)
+            if err:
+                raise ConfsError(err, typename)
+            if not journal.exists(self.config, typename):
+                # Recovered by another process while waiting for the lock
+                continue
+            errs, interrupted = journal.recover(self.config, typename, forward=forward)
+            recovered.append((typename, interrupted.description if interrupted else typename, errs))
+        return recovered
+
+    def set_mode(self, identifier, name, mode):
+        """Sets how the target name of the alt identifier is installed."""
+        self._lock_write(identifier)
+        from confs import index
+        from confs.materialize import MODES
+        if mode not in MODES:
+            raise ConfsError(InvOperErr('Invalid mode `{}`, expected one of: {}'.format(mode, ', '.join(MODES))), identifier)
+        target = self.get_target(identifier, name)
+        self._writable(target.alt, identifier)
+        if mode == target.mode:
+            return target
+        if target.is_installed():
+            raise ConfsError(InvOperErr('Target `{}` is installed, uninstall it before changing its mode'.format(name)), identifier)
+        # Only stow targets may share destinations, so leaving stow may conflict
+        conflicts = index.load_dests(self.config).conflicts(
+            target.target, target.alt.typename, target.alt.name, target.name, mode=mode)
+        if conflicts:
+            dest, owner = conflicts[0]
+            raise ConflictError(DestConflictErr('Destination `{}` conflicts with `{}` of `{}`'.format(
+                target.target, dest, '/'.join(owner))), identifier)
+        if 'secret' in (mode, target.mode):
+            err = self._convert_secret(target, encrypt=mode == 'secret')
+            if err:
+                raise ConfsError(err, identifier)
+        target.mode = mode
+        err = target.alt.save_meta()
+        if err:
+            raise self._failed(identifier.split('/')[0], err, identifier)
+        target.update_dests(old_dest=target.target, new_dest=target.target)
+        return target
+
+    def _convert_secret(self, target, encrypt):
+        """Encrypts (or decrypts) the content of target in place, when its mode is set to (or from) secret."""
+        from confs import secret
+        if target.inherited:
+            return InvOperErr('Target `{}` is inherited from `{}`, its mode can only be changed there'.format(
+                target.name, Path(target.path).parent.parent))
+        err, key = secret.load_key(self.config, create=encrypt)
+        if err:
+            return err
+        if encrypt:
+            return secret.encrypt_content(self.config, target.content_path(), key)
+        return secret.decrypt_content(self.config, target.content_path(), key)
+
+    def set_parents(self, identifier, parents):
+        """
+        Sets the alts (altname or typename/altname) the alt identifier
+        inherits from, see confs.layers. Returns the alt.
+        """
+        self._lock_write(identifier)
+        from confs import layers
+        conf, alt = self.get(identifier)
+        self._writable(alt, identifier)
+        if alt is conf.enabled_alt and any(t.is_installed() for t in alt.targets):
+            raise ConfsError(InvOperErr('Alt `{}` is installed, uninstall it before changing its parents'.format(identifier)), identifier)
+        old_parents = alt.parents
+        alt.parents = list(parents)
+        err, chain = layers.chain(alt, {a.name: a for a in conf.alts})
+        packed = [a for a in chain or [] if a.packed]
+        if not err and packed:
+            err = InvOperErr('Parent `{}/{}` is packed, unpack it first'.format(packed[0].typename, packed[0].name))
+        if err:
+            alt.parents = old_parents
+            raise ConfsError(err, identifier)
+        err = alt.save_meta()
+        if err:
+            raise self._failed(conf.name, err, identifier)
+        # The inherited targets are resolved when the type is loaded again
+        self.refresh(conf.name)
+        return self.get(identifier)[1]
+
+    def overlay(self, identifier, home=None):
+        """
+        Returns the Overlay of the alt identifier over the home directory, to
+        run a command with it instead of installing it, see confs.overlay.
+        """
+        from confs import overlay
+        self._lock_write(identifier)
+        conf, alt = self._activate(identifier)
+        err, result = overlay.prepare(conf, alt, home=home)
+        if err:
+            raise ConfsError(err, identifier)
+        return result
+
+    def children(self, typename, altname):
+        """Returns the identifiers of the alts (of all types) inheriting directly from typename/altname."""
+        from confs import layers
+        return ['{}/{}'.format(conf.name, alt.name) for conf in self.load() for alt in conf.alts
+                if (typename, altname) in layers.parents_of(alt)]
+
+    def pack(self, identifier):
+        """Packs the content of the inactive alt identifier into an archive, see confs.pack. Returns the alt."""
+        self._lock_write(identifier)
+        from confs import pack
+        conf, alt = self.get(identifier)
+        self._writable(alt, identifier)
+        if alt is conf.enabled_alt:
+            raise ConfsError(InvOperErr('Alt `{}` is enabled, only inactive alts can be packed'.format(identifier)), identifier)
+        if alt.packed:
+            raise ConfsError(InvOperErr('Alt `{}` is already packed'.format(identifier)), identifier)
+        children = self.children(conf.name, alt.name)
+        if children:
+            raise ConfsError(InvOperErr('Alt `{}` is a parent of `{}`, it cannot be packed'.format(
+                identifier, '`, `'.join(children))), identifier)
+        err = pack.pack(self.config, alt.path)
+        if err:
+            raise self._failed(conf.name, err, identifier)
+        alt.packed = True
+        return alt
+
+    def unpack(self, identifier):
+        """Unpacks the content of the packed alt identifier. Returns the alt."""
+        self._lock_write(identifier)
+        from confs import pack
+        conf, alt = self.get(identifier)
+        self._writable(alt, identifier)
+        if not alt.packed:
+            raise ConfsError(InvOperErr('Alt `{}` is not packed'.format(identifier)), identifier)
+        err = pack.unpack(self.config, alt.path)
+        if err:
+            raise self._failed(conf.name, err, identifier)
+        self.refresh(conf.name)
+        return self.get(identifier)[1]
+
+    def unused(self, days, now=None):
+        """
+        Returns the identifiers of the inactive alts which could be packed
+        and were not enabled or installed (or else changed) for days.
+        """
+        from confs import pack, layers
+        now = now if now is not None else time.time()
+        confs = self.load()
+        parents = set(parent for conf in confs for alt in conf.alts for parent in layers.parents_of(alt))
+        return ['{}/{}'.format(conf.name, alt.name) for conf in confs for alt in conf.alts
+                if alt is not conf.enabled_alt and not alt.packed and not alt.read_only
+                and (conf.name, alt.name) not in parents
+                and now - pack.last_used(self.config, alt) > days * 86400
+                and pack.content_names(self.config, alt.path)]
+
+    def sync(self, identifier, targets=None):
+        """
+        Copies in place edits of the installed copies of the targets of
+        identifier (the enabled alt for a typename) back into their content.
+        Returns a dict of target name -> list of synced (relpath, change).
+        """
+        self._lock_write(identifier)
+        conf, alt = self.get(identifier, alt_optional=True)
+        if not alt:
+            if not conf.enabled_alt:
+                raise ConfsError(InvOperErr('Conf type `{}` has no enabled alt!'.format(conf.name)), identifier)
+            alt = conf.enabled_alt
+        self._writable(alt, identifier)
+
+        synced = {}
+        for target in self.select_targets(alt, targets, identifier):
+            changes = target.drift()
+            if not changes:
+                continue
+            err = target.sync_back()
+            if err:
+                raise ConfsError(err, '{}/{}'.format(identifier, target.name))
+            synced[target.name] = changes
+        return synced
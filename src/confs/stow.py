@@ -0,0 +1,230 @@
+#!/bin/env python3
+"""
+Stow-style installation of targets, letting several types share a
+destination directory (eg. ~/.config or ~/.local/bin).
+
+Instead of one symlink for the whole content, the content directory is
+mirrored into the destination: every entry of the content gets its own
+symlink, except that a directory which only this target needs is
+folded into a single symlink to the content directory. When another
+stow target later needs to put files into a folded directory, the
+directory is unfolded: the symlink is replaced by a real directory
+containing a symlink per entry of the folded content, and both targets
+are merged into it. Uninstalling folds directories left containing only
+the symlinks of a single other target back into one symlink, and
+removes the directories which became empty.
+
+Installs and uninstalls first plan the operations by walking the
+content and the destination in lockstep, only descending into
+directories both have, and only then apply them, so a conflict leaves
+the destination untouched and entries which are already in place cost
+no writes.
+
+Only symlinks into the content of other stow targets (as recorded by the
+destination index, see confs.index.Dests) are unfolded. Any other
+symlink in the way is replaced, like for symlinked targets, and files
+and directories in the way are conflicts.
+"""
+
+import os
+from pathlib import Path
+
+from confs import index
+from confs.confslib import ExpSymlinkErr, InvOperErr, link_to
+
+class Tree:
+    """Looks up the destination tree and the owners of its symlinks."""
+    def __init__(self, config):
+        self.config = config
+        self.fs = config.fs
+        self.roots = [index.normpath(repo) for repo in config.repos()]
+        self.dests = index.load_dests(config)
+
+    def state(self, path: Path):
+        """Returns (kind, link) of path, where kind is missing, link, dir or file."""
+        fs = self.fs
+        if fs.is_symlink(path):
+            return 'link', self.link(path)
+        if not fs.lexists(path):
+            return 'missing', None
+        return ('dir' if fs.is_dir(path) else 'file'), None
+
+    def link(self, path: Path) -> Path:
+        """Returns the absolute, normalized path the symlink path points to."""
+        return Path(os.path.normpath(os.path.join(os.path.dirname(str(path)), str(self.fs.readlink(path)))))
+
+    def is_dir(self, path: Path) -> bool:
+        """Returns True if path is a directory, and not a symlink to one."""
+        return self.fs.is_dir(path) and not self.fs.is_symlink(path)
+
+    def owner(self, path: Path):
+        """
+        Returns (type, alt, target, depth) if path is inside the content of
+        a stow target, where depth is 0 for the content itself, else None.
+        """
+        path = index.normpath(path)
+        root = next((root for root in self.roots if path.startswith(root + os.sep)), None)
+        if root is None:
+            return None
+        parts = os.path.relpath(path, root).split(os.sep)
+        if len(parts) < 3:
+            return None
+        owner = tuple(index._stem(p) for p in parts[:3])
+        if self.dests.modes.get(owner) != 'stow':
+            return None
+        return owner + (len(parts) - 3,)
+
+def plan_install(tree, src: Path, dst: Path, ops: list, state=None, force=False):
+    """
+    Appends the operations merging the content src into dst to ops, where
+    state overrides the state of dst (when its parent is to be unfolded).
+    Returns an error if dst cannot be merged.
+    """
+    fs = tree.fs
+    kind, link = state or tree.state(dst)
+    if kind == 'missing':
+        ops.append(('link', dst, src))
+        return None
+    if kind == 'link':
+        if link == src:
+            return None
+        other = tree.owner(link)
+        if other is None:
+            # Not managed by a stow target, replaced like a symlinked target would
+            ops.append(('relink', dst, src))
+            return None
+        if not (tree.is_dir(src) and tree.is_dir(link)):
+            if force:
+                ops.append(('relink', dst, src))
+                return None
+            return ExpSymlinkErr('Destination `{}` is already installed by `{}`'.format(dst, '/'.join(other[:3])))
+        names = sorted(fs.listdir(link))
+        children = {name: ('link', Path(link, name)) for name in names}
+        # Entries also in src are unfolded (or conflict) further down, so only link the others
+        ops.append(('unfold', dst, link, [name for name in names if not fs.lexists(Path(src, name))]))
+    elif kind == 'dir' and tree.is_dir(src):
+        children = None
+        # Remove the symlinks of entries since removed from the content
+        for name in sorted(fs.listdir(dst)):
+            path = Path(dst, name)
+            if fs.is_symlink(path) and tree.link(path) == Path(src, name) and not fs.lexists(Path(src, name)):
+                ops.append(('unlink', path))
+    else:
+        return ExpSymlinkErr('Target dest path `{}` already exists but is not a symlink.'.format(dst))
+
+    for name in sorted(fs.listdir(src)):
+        child_state = children.get(name, ('missing', None)) if children is not None else None
+        err = plan_install(tree, Path(src, name), Path(dst, name), ops, state=child_state, force=force)
+        if err:
+            return err
+    return None
+
+def plan_uninstall(tree, src: Path, dst: Path, ops: list, top=True):
+    """
+    Appends the operations removing the symlinks of src from dst to ops,
+    followed by folding the directories they were removed from.
+    """
+    fs = tree.fs
+    kind, link = tree.state(dst)
+    if kind == 'link':
+        if link == src:
+            ops.append(('unlink', dst))
+        return
+    if kind != 'dir' or not tree.is_dir(src):
+        return
+    count = len(ops)
+    for name in sorted(fs.listdir(dst)):
+        path = Path(dst, name)
+        if fs.is_symlink(path):
+            if tree.link(path) == Path(src, name):
+                ops.append(('unlink', path))
+        elif tree.is_dir(path) and tree.is_dir(Path(src, name)):
+            plan_uninstall(tree, Path(src, name), path, ops, top=False)
+    if len(ops) > count:
+        ops.append(('fold', dst, top))
+
+def fold(tree, path: Path, top: bool):
+    """
+    Removes the directory path if it is empty, or replaces it with a symlink
+    if it only contains the symlinks to the entries of another stow target.
+    The destination itself (top) is never removed, and only folded into the
+    content of a target installed at the same destination.
+    """
+    fs = tree.fs
+    names = fs.listdir(path)
+    if not names:
+        if not top:
+            fs.rmdir(path)
+        return
+    links = []
+    for name in names:
+        if not fs.is_symlink(Path(path, name)):
+            return
+        links.append(tree.link(Path(path, name)))
+    parent = links[0].parent
+    if any(link != Path(parent, name) for link, name in zip(links, names)):
+        return
+    owner = tree.owner(parent)
+    if owner is None or (top and owner[3] != 0):
+        return
+    for name in names:
+        fs.unlink(Path(path, name))
+    fs.rmdir(path)
+    fs.symlink(path, link_to(tree.config, path, parent))
+
+def apply(tree, ops):
+    fs = tree.fs
+    for op in ops:
+        if op[0] == 'link':
+            fs.symlink(op[1], link_to(tree.config, op[1], op[2]))
+        elif op[0] == 'relink':
+            if fs.lexists(op[1]):
+                fs.unlink(op[1])
+            fs.symlink(op[1], link_to(tree.config, op[1], op[2]))
+        elif op[0] == 'unlink':
+            fs.unlink(op[1])
+        elif op[0] == 'unfold':
+            _, path, other, names = op
+            if fs.is_symlink(path):
+                fs.unlink(path)
+            fs.mkdir(path)
+            for name in names:
+                fs.symlink(Path(path, name), link_to(tree.config, Path(path, name), Path(other, name)))
+        elif op[0] == 'fold':
+            fold(tree, op[1], op[2])
+
+def install(target, content_path: Path, force=False):
+    """
+    Merges content_path into the destination of target, unfolding the
+    directories of other stow targets as needed. With force, the entries
+    of other stow targets in the way are replaced.
+    """
+    tree = Tree(target.config)
+    ops = []
+    err = plan_install(tree, Path(content_path).absolute(), Path(target.target).absolute(), ops, force=force)
+    if err:
+        return err
+    apply(tree, ops)
+    return None
+
+def installed(tree, src: Path, dst: Path) -> bool:
+    kind, link = tree.state(dst)
+    if kind == 'link':
+        return link == src
+    if kind == 'dir' and tree.is_dir(src):
+        return all(installed(tree, Path(src, name), Path(dst, name)) for name in tree.fs.listdir(src))
+    return False
+
+def is_installed(target, content_path: Path) -> bool:
+    """Returns True if every entry of content_path is linked into the destination of target."""
+    return installed(Tree(target.config), Path(content_path).absolute(), Path(target.target).absolute())
+
+def uninstall(target, content_path: Path, force=False):
+    """Removes the symlinks of target from its destination, folding the directories it shared."""
+    tree = Tree(target.config)
+    ops = []
+    plan_uninstall(tree, Path(content_path).absolute(), Path(target.target).absolute(), ops)
+    if not ops:
+        return InvOperErr('Target `{}` is not installed!'.format(target.path))
+    apply(tree, ops)
+    return None
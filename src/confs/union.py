@@ -0,0 +1,213 @@
+#!/bin/env python3
+"""
+Union of several confs repositories, eg. a team repository shared
+read-only on a network mount below a personal one:
+
+    confs --path ~/.confs:/mnt/team/confs show
+
+The repositories are given by precedence, separated by `:`. The first
+one (confs_path) is the top repository, which all writes go to, and the
+lower ones are only read.
+
+Types and alts are merged by name: a type is made of the alts of all
+repositories containing it, where an alt of a higher repository
+overrides the alt of the same name in the ones below, and the enabled
+alt is the one of the highest repository with an `enabled` symlink for
+the type. Enabling an alt (of any repository) writes the `enabled`
+symlink of the type in the top repository, and new alts are created
+there too, so the lower repositories are never changed. Changing the
+targets or metadata of an alt of a lower repository, or packing it, is
+refused: create an alt in the top repository inheriting from it instead
+(see confs.layers).
+
+The listing and destination index (see confs.index) of each lower
+repository are cached in the cache directory of the top repository, as
+the lower ones may not be writable:
+
+    <confs_path>/.cache/repos/<hash of the path>/{listing,dests}
+
+As confs does not invalidate them when someone else changes a lower
+repository (eg. by a git pull), they are only validated by the hash of
+the mtimes of the directories of the repository they were built from
+(see index.stamp), like the caches of the top repository, with a few
+stats per alt instead of reading every target, once per config.
+"""
+
+import os
+import hashlib
+from pathlib import Path
+
+from confs import index
+from confs.confslib import InvTypenameErr, MkLinkErr
+
+REPOS_DIR_NAME = 'repos' # The directory (in the cache directory) containing the caches of lower repositories
+
+def lower(config):
+    """Returns the paths of the lower repositories of config which exist, by precedence."""
+    return [Path(p) for p in config.lower_paths if config.fs.is_dir(p)]
+
+def typenames(config):
+    """Returns the sorted names of the types of all repositories."""
+    fs = config.fs
+    names = set()
+    for repo in [Path(config.confs_path)] + lower(config):
+        if not fs.is_dir(repo):
+            continue
+        names.update(p.stem for p in fs.iterdir(repo)
+                     if fs.is_dir(p) and p.stem not in config.excluded_conf_types)
+    return sorted(names)
+
+def load_type(config, typename):
+    """Returns (err, ConfType) of typename, merged from all repositories containing it."""
+    from confs.confslib import ConfType
+    fs = config.fs
+    alts = {}
+    enabled = None
+    found = False
+    # Lowest first, so the higher repositories override
+    for repo in reversed([Path(config.confs_path)] + lower(config)):
+        path = Path(repo, typename)
+        if not fs.is_dir(path):
+            continue
+        found = True
+        err, repo_alts, repo_enabled = ConfType.load_alts(path, config, require_enabled=False)
+        if err:
+            return err, None
+        alts.update((alt.name, alt) for alt in repo_alts)
+        enabled = repo_enabled or enabled
+    if not found:
+        return InvTypenameErr('No such type: `{}`'.format(typename)), None
+    if enabled is None:
+        return MkLinkErr('Enabled symlink of `{}` not found in any repository'.format(typename)), None
+
+    path = Path(config.confs_path, typename)
+    err, conf = ConfType.from_alts(typename, sorted(alts.values(), key=lambda alt: alt.name), enabled,
+                                   config=config, path=path)
+    if err:
+        return err, None
+    # The type is only written to the top repository
+    conf.saved = fs.is_dir(path)
+    return None, conf
+
+# The cached indexes of lower repositories
+
+def cache_dir(config, repo) -> str:
+    key = hashlib.sha1(index.normpath(repo).encode()).hexdigest()[:12]
+    return os.path.join(str(config.confs_path), config.cache_dir_name, REPOS_DIR_NAME, key)
+
+def stamp(config, repo, listing) -> str:
+    """Returns the stamp (see index.stamp) of the directories of repo which listing was built from."""
+    return index.stamp(repo, listing, config.targets_dir_name, config.alt_meta_name)
+
+def _read(path, version):
+    """Returns (stamp, rows) of the cache file at path, or (None, None) if missing or of another version."""
+    try:
+        with open(path) as f:
+            header = f.readline().rstrip('\n').split('\t')
+            if len(header) != 2 or header[0] != version:
+                return None, None
+            return header[1], [line.rstrip('\n').split('\t') for line in f if line.strip()]
+    except (OSError, ValueError):
+        return None, None
+
+def _write(path, version, stamp, text):
+    """Atomically writes a cache file, ignoring write errors."""
+    tmp_path = '{}.{}'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            f.write('{}\t{}\n'.format(version, stamp))
+            f.write(text)
+            f.write('\n')
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+def repo_listing(config, repo):
+    """Returns (listing, stamp) of the lower repository repo, rebuilding and caching it if stale."""
+    key = index.normpath(repo)
+    if key in config.repo_listings:
+        return config.repo_listings[key]
+    path = os.path.join(cache_dir(config, repo), index.LISTING_NAME)
+    cached, rows = _read(path, index.LISTING_VERSION)
+    listing = index.Listing(rows) if rows is not None else None
+    current = stamp(config, repo, listing) if listing else None
+    if current is None or current != cached:
+        listing = index.build(config, root=repo)
+        current = stamp(config, repo, listing)
+        _write(path, index.LISTING_VERSION, current, listing.dump())
+    config.repo_listings[key] = (listing, current)
+    return listing, current
+
+def _rows(dests):
+    """Returns the rows (dest, type, alt, target, mode) of dests."""
+    return [(dest,) + owner + (dests.modes.get(owner, 'symlink'),)
+            for dest, owners in dests.owners.items() for owner in owners]
+
+def repo_dests(config, repo):
+    """
+    Returns the rows (dest, type, alt, target, mode) of the destinations of
+    the lower repository repo, cached as long as its listing is unchanged.
+    """
+    if config.fs.name != 'os':
+        return _rows(index.build_dests(config, root=repo))
+    _, current = repo_listing(config, repo)
+    path = os.path.join(cache_dir(config, repo), index.DESTS_NAME)
+    cached, rows = _read(path, index.DESTS_VERSION)
+    if rows is not None and cached == current:
+        return [row for row in rows if len(row) == 5]
+    dests = index.build_dests(config, root=repo)
+    _write(path, index.DESTS_VERSION, current, dests.dump())
+    return _rows(dests)
+
+def _enabled(config, repo, typename):
+    """Returns the name of the alt the enabled symlink of typename in repo points to, if any."""
+    try:
+        link = os.readlink(os.path.join(str(repo), typename, config.enabled_link_name))
+    except OSError:
+        return None
+    return index._stem(os.path.basename(link.rstrip('/')))
+
+def load_listing(config):
+    """Returns the Listing of the union, merged from the listings of its repositories."""
+    repos = [(Path(config.confs_path), index.load_repo(config))]
+    repos += [(repo, repo_listing(config, repo)[0]) for repo in lower(config)]
+    alts = {}    # typename -> altname -> targets
+    enabled = {} # typename -> enabled altname
+    for repo, listing in repos:
+        for row in listing.rows:
+            type_alts = alts.setdefault(row[0], {})
+            if len(row) > 1 and row[1] not in type_alts:
+                type_alts[row[1]] = row[3:]
+            if len(row) > 2 and row[2] == '*':
+                enabled.setdefault(row[0], row[1])
+        # The enabled symlink may point to an alt of another repository
+        for typename in listing.types():
+            if typename not in enabled:
+                name = _enabled(config, repo, typename)
+                if name:
+                    enabled[typename] = name
+
+    rows = []
+    for typename in sorted(alts):
+        type_alts = alts[typename]
+        rows.extend([typename, altname, '*' if enabled.get(typename) == altname else ''] + type_alts[altname]
+                    for altname in sorted(type_alts))
+        if not type_alts:
+            rows.append([typename])
+    return index.Listing(rows)
+
+def load_dests(config):
+    """Returns the Dests of the union, where the targets of overridden alts are left out."""
+    dests = index.Dests()
+    seen = set() # (typename, altname) of the higher repositories
+    for i, repo in enumerate([Path(config.confs_path)] + lower(config)):
+        rows = _rows(index.load_repo_dests(config)) if i == 0 else repo_dests(config, repo)
+        for row in rows:
+            if (row[1], row[2]) not in seen:
+                dests.add(*row)
+        seen.update((row[1], row[2]) for row in rows)
+    return dests
@@ -0,0 +1,92 @@
+#!/bin/env python3
+"""
+Tests of the cipher of the secret mode (see confs.secret): known answers
+pinning the key derivation, the key stream and the file format, round
+trips, and the rejection of modified files.
+
+Usage:
+    PYTHONPATH=src python -m unittest discover tests
+"""
+
+import hmac
+import hashlib
+import unittest
+
+from confs import secret
+
+KEY = bytes(range(32))
+NONCE = bytes(range(100, 116))
+PLAIN = b'machine example.com login me password hunter2\n'
+
+ENC_KEY = 'ec173e8562a0de86198718b8d47e32f6eeb0705b305d7528a78f9636213916ff'
+MAC_KEY = 'c57308af2d0c512ecc428621b2465df724a55312d6fdcb90b1c7a56a6b55919d'
+# The first 40 bytes of the key stream of NONCE, a block and a part of the next one
+STREAM = 'e434e74451784fb562c9060838462c08ad805d51e505333fd2aa68dc7c73a52f2b69d1c79bb90f90'
+# PLAIN encrypted with KEY and NONCE
+BLOB = ('636f6e66732d736563726574310a6465666768696a6b6c6d6e6f707172738955842c38162a9507b16765482a49'
+        '26ceef3071896a5456bc8a05b95c03c45c581ebeb5ff9967e528f482f8092053cbf43316719d22c42c15928a58ce'
+        'ccdabff24722e242f1c25411262207266d')
+
+class KnownAnswers(unittest.TestCase):
+    def test_keys(self):
+        enc_key, mac_key = secret._keys(KEY)
+        self.assertEqual(enc_key.hex(), ENC_KEY)
+        self.assertEqual(mac_key.hex(), MAC_KEY)
+
+    def test_stream(self):
+        enc_key = bytes.fromhex(ENC_KEY)
+        self.assertEqual(secret._xor_stream(enc_key, NONCE, bytes(40)).hex(), STREAM)
+        # A block is HMAC-SHA256 of the nonce and the big endian counter
+        block = hmac.new(enc_key, NONCE + (1).to_bytes(8, 'big'), hashlib.sha256).digest()
+        self.assertEqual(STREAM[64:], block[:8].hex())
+
+    def test_decrypt(self):
+        err, data = secret.decrypt(KEY, bytes.fromhex(BLOB))
+        self.assertIsNone(err)
+        self.assertEqual(data, PLAIN)
+
+    def test_format(self):
+        blob = bytes.fromhex(BLOB)
+        self.assertTrue(secret.is_encrypted(blob))
+        self.assertEqual(blob[len(secret.MAGIC):len(secret.MAGIC) + secret.NONCE_SIZE], NONCE)
+        self.assertEqual(len(blob), len(secret.MAGIC) + secret.NONCE_SIZE + len(PLAIN) + secret.TAG_SIZE)
+
+class RoundTrip(unittest.TestCase):
+    def test_sizes(self):
+        for size in (0, 1, secret.BLOCK_SIZE - 1, secret.BLOCK_SIZE, secret.BLOCK_SIZE + 1, 4096 + 7):
+            data = bytes(i % 251 for i in range(size))
+            err, result = secret.decrypt(KEY, secret.encrypt(KEY, data))
+            self.assertIsNone(err)
+            self.assertEqual(result, data)
+
+    def test_nonce(self):
+        # The same data encrypts differently each time
+        self.assertNotEqual(secret.encrypt(KEY, PLAIN), secret.encrypt(KEY, PLAIN))
+
+class Tampering(unittest.TestCase):
+    def assertRejected(self, blob, key=KEY):
+        err, data = secret.decrypt(key, blob)
+        self.assertIsNotNone(err)
+        self.assertIsNone(data)
+
+    def test_flipped_bytes(self):
+        blob = bytes.fromhex(BLOB)
+        # Each byte of the magic, the nonce, the ciphertext and the tag
+        for i in range(len(blob)):
+            flipped = bytearray(blob)
+            flipped[i] ^= 0x01
+            self.assertRejected(bytes(flipped))
+
+    def test_truncated(self):
+        blob = bytes.fromhex(BLOB)
+        self.assertRejected(blob[:-1])
+        self.assertRejected(blob[:len(secret.MAGIC) + secret.NONCE_SIZE + secret.TAG_SIZE - 1])
+
+    def test_other_key(self):
+        self.assertRejected(bytes.fromhex(BLOB), key=bytes(32))
+
+    def test_not_encrypted(self):
+        self.assertRejected(PLAIN)
+
+if __name__ == '__main__':
+    unittest.main()